@@ -0,0 +1,96 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+from . import harness
+from . import suite  # noqa: F401 (registers benchmarks)
+import rich
+import rich.table
+import rich_click as click
+import sys
+
+
+@click.group()
+def main():
+    """
+    towl benchmarks
+    """
+
+
+@click.option(
+    "--compare",
+    "baseline",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Baseline JSON to compare with",
+)
+@click.option("--tolerance", type=float, default=harness.DEFAULT_TOLERANCE)
+@click.option("-k", "select", help="Run only benchmarks with this in name")
+@click.option("--cache-dir", default=harness.DEFAULT_CACHE_DIR)
+@click.option(
+    "--sizes",
+    default="1e5",
+    help="Comma separated trace sizes (log lines), e.g. 1e5,1e6,1e7",
+)
+@click.option("-o", "--output", default="bench_output.json", help="Results JSON")
+@main.command()
+def run(output, sizes, cache_dir, select, tolerance, baseline):
+    """
+    Run benchmarks and store results as JSON.
+    """
+    sizes = [int(float(x)) for x in sizes.split(",")]
+    results = harness.run_suite(sizes, cache_dir=cache_dir, select=select)
+    harness.save_results(results, output)
+    if baseline is not None:
+        _compare(harness.load_results(baseline), results, tolerance)
+
+
+@click.option("--tolerance", type=float, default=harness.DEFAULT_TOLERANCE)
+@click.argument("current", type=click.Path(exists=True, dir_okay=False))
+@click.argument("baseline", type=click.Path(exists=True, dir_okay=False))
+@main.command()
+def compare(baseline, current, tolerance):
+    """
+    Compare results against a baseline, fails on regressions.
+    """
+    _compare(harness.load_results(baseline), harness.load_results(current), tolerance)
+
+
+def _compare(baseline, current, tolerance):
+    comparisons = harness.compare_results(baseline, current)
+    table = rich.table.Table("size", "benchmark", "baseline", "current", "ratio")
+    for x in comparisons:
+        if x.ratio > 1 + tolerance:
+            style = "bold red"
+        elif x.ratio < 1 - tolerance:
+            style = "bold green"
+        else:
+            style = None
+        table.add_row(
+            x.size,
+            x.name,
+            f"{x.baseline:.4f}s",
+            f"{x.current:.4f}s",
+            f"{x.ratio:.2f}",
+            style=style,
+        )
+    rich.print(table)
+    regressions = harness.regressions(comparisons, tolerance)
+    if len(regressions) > 0:
+        rich.print(f"[bold red]{len(regressions)} regression(s)[/]")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+"""
+Minimal benchmark harness.
+
+Benchmarks are registered with `benchmark` and run against a `Trace`:
+a generated towl log of given size together with the database built
+from it. Timings are stored as JSON, so a later run can be compared
+against a baseline.
+"""
+
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+import datetime
+import importlib.metadata
+import json
+import os
+import platform
+import shutil
+import statistics
+import time
+
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.2
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), ".cache")
+
+
+class Trace:
+    """
+    Generated log with `size` lines and the database created from it.
+    Both are cached in `cache_dir` and reused by later runs.
+    """
+
+    def __init__(self, size: int, cache_dir: str = DEFAULT_CACHE_DIR, seed: int = 0):
+        self.size = size
+        self.directory = os.path.join(cache_dir, f"{size}-{seed}")
+        self.log_path = os.path.join(self.directory, "towl.log.gz")
+        self.db_path = os.path.join(self.directory, "db")
+        self._seed = seed
+        self._scenario = None
+
+    def prepare(self):
+        from towl.db.events.log_generator import generate_log
+        from towl.db.creator import create_from_log_file
+
+        os.makedirs(self.directory, exist_ok=True)
+        if not os.path.exists(self.log_path):
+            tmp = self.log_path + ".tmp.gz"
+            generate_log(tmp, events=self.size, seed=self._seed)
+            os.rename(tmp, self.log_path)
+        if not os.path.exists(os.path.join(self.db_path, "towl.db")):
+            shutil.rmtree(self.db_path, ignore_errors=True)
+            create_from_log_file(self.log_path, self.db_path)
+
+    @property
+    def scenario(self):
+        from towl.user.data import Scenario
+
+        if self._scenario is None:
+            self._scenario = Scenario(self.db_path)
+        return self._scenario
+
+    @property
+    def view(self):
+        return self.scenario.make_global_view()
+
+
+class Benchmark(NamedTuple):
+    name: str
+    run: Callable[[Any], Any]
+    setup: Optional[Callable[[Trace], Any]]
+    repeat: int
+
+
+BENCHMARKS: List[Benchmark] = []
+
+
+def benchmark(
+    name: str,
+    *,
+    setup: Optional[Callable[[Trace], Any]] = None,
+    repeat: int = DEFAULT_REPEAT,
+):
+    """
+    Registers benchmark. The decorated function gets the result of `setup`
+    (or the `Trace` itself without it), only the function is timed.
+    """
+
+    def decorator(fn):
+        BENCHMARKS.append(Benchmark(name, fn, setup, repeat))
+        return fn
+
+    return decorator
+
+
+def run_benchmark(bench: Benchmark, trace: Trace) -> Dict[str, Any]:
+    times = []
+    for _ in range(bench.repeat):
+        arg = trace if bench.setup is None else bench.setup(trace)
+        start = time.perf_counter()
+        bench.run(arg)
+        times.append(time.perf_counter() - start)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "repeat": bench.repeat,
+        "events_per_second": trace.size / min(times) if min(times) > 0 else None,
+    }
+
+
+def _version(package: str) -> Optional[str]:
+    try:
+        return importlib.metadata.version(package)
+    except importlib.metadata.PackageNotFoundError:
+        return None
+
+
+def run_suite(
+    sizes: List[int],
+    *,
+    cache_dir: str = DEFAULT_CACHE_DIR,
+    select: Optional[str] = None,
+    progress: Callable[[str], None] = print,
+) -> Dict[str, Any]:
+    """
+    Runs registered benchmarks (those with `select` in name, if given) for
+    every trace size and returns JSON-serializable results.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    for size in sizes:
+        trace = Trace(size, cache_dir)
+        progress(f"preparing trace of {size} lines")
+        trace.prepare()
+        results[str(size)] = {}
+        for bench in BENCHMARKS:
+            if select is not None and select not in bench.name:
+                continue
+            progress(f"[{size}] {bench.name}")
+            results[str(size)][bench.name] = run_benchmark(bench, trace)
+    return {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "node": platform.node(),
+            "towl_db_version": _version("towl-db"),
+            "towl_user_version": _version("towl-user"),
+        },
+        "results": results,
+    }
+
+
+def save_results(results: Dict[str, Any], path: str):
+    with open(path, "w") as fd:
+        json.dump(results, fd, indent=2)
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    with open(path) as fd:
+        return json.load(fd)
+
+
+class Comparison(NamedTuple):
+    size: str
+    name: str
+    baseline: float
+    current: float
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline > 0 else float("inf")
+
+
+def compare_results(
+    baseline: Dict[str, Any], current: Dict[str, Any]
+) -> List[Comparison]:
+    "Pairs minimal times of benchmarks present in both results"
+    xs = []
+    for size, benches in current["results"].items():
+        for name, result in benches.items():
+            base = baseline["results"].get(size, {}).get(name)
+            if base is not None:
+                xs.append(Comparison(size, name, base["min"], result["min"]))
+    return xs
+
+
+def regressions(
+    comparisons: List[Comparison], tolerance: float = DEFAULT_TOLERANCE
+) -> List[Comparison]:
+    return [x for x in comparisons if x.ratio > 1 + tolerance]
@@ -0,0 +1,200 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+"""
+Benchmarks of towl ingest and queries.
+"""
+
+from .harness import benchmark, Trace
+import os
+import shutil
+import tempfile
+
+
+@benchmark("events.read_events_file")
+def read_events_file(trace: Trace):
+    from towl.db.events import read_events_file
+
+    for _ in read_events_file(trace.log_path):
+        pass
+
+
+@benchmark("creator.ingest", repeat=1)
+def ingest(trace: Trace):
+    from towl.db.creator import create_from_log_file
+
+    output = tempfile.mkdtemp()
+    try:
+        create_from_log_file(trace.log_path, output, overwrite=True)
+    finally:
+        shutil.rmtree(output)
+
+
+def _memory_map_buffers(trace: Trace):
+    from towl.db.events.log_generator import CachingAllocator
+    from towl.db.store import model
+    import random
+
+    rng = random.Random(0)
+    allocator = CachingAllocator()
+    buffers = []
+    for ident in range(min(trace.size, 100000)):
+        if len(allocator.live) > 1000 and rng.random() < 0.5:
+            allocator.free(allocator.choice(rng))
+        size = rng.randint(1, 4096) * 1024
+        buffers.append(
+            model.DataBuffer(
+                ident=ident,
+                addr=allocator.malloc(size),
+                size=size,
+                meta=model.DataBufferMeta(unknown=False, alloc_frames=[]),
+                stream=0,
+                event_malloc=None,
+                event_free=None,
+                event_first_launch=None,
+                event_last_launch=None,
+            )
+        )
+    return buffers
+
+
+@benchmark("creator.memory_map", setup=_memory_map_buffers)
+def memory_map(buffers):
+    from towl.db.creator.devmem_manager import MemoryMap
+
+    memory_map = MemoryMap()
+    live = []
+    for buffer in buffers:
+        memory_map.map_buffer(buffer)
+        memory_map.lookup(buffer.addr + buffer.size // 2)
+        live.append(buffer)
+        if len(live) > 1000:
+            memory_map.unmap_buffer(live.pop(0))
+
+
+def _facade(trace: Trace):
+    scenario = trace.scenario
+    return scenario._db, scenario.global_event_timerange
+
+
+FACADE_QUERIES = {
+    "query_events": lambda db, tr: db.query_events(tr),
+    "query_recipe_launch_by_launch_ident": lambda db, tr: (
+        db.query_recipe_launch_by_launch_ident(1)
+    ),
+    "query_recipe_launches_by_launch_idents": lambda db, tr: (
+        db.query_recipe_launches_by_launch_idents(list(range(1, 101)))
+    ),
+    "query_devmem_summary": lambda db, tr: db.query_devmem_summary(tr, None),
+    "query_allocator_usage": lambda db, tr: db.query_allocator_usage(tr),
+    "query_series_level": lambda db, tr: db.query_series_level("used", tr, 0),
+    "query_devmem_bufs_full": lambda db, tr: db.query_devmem_bufs_full(tr),
+    "query_launches": lambda db, tr: db.query_launches(tr),
+    "query_buffers_allocs": lambda db, tr: db.query_buffers_allocs(tr),
+    "query_live_buffers": lambda db, tr: db.query_live_buffers(
+        (tr.begin + tr.end) // 2
+    ),
+    "query_buffers_meta": lambda db, tr: db.query_buffers_meta(list(range(1, 1001))),
+    "query_buffers_attribution": lambda db, tr: db.query_buffers_attribution(
+        list(range(1, 1001))
+    ),
+    "query_launches_full": lambda db, tr: db.query_launches_full(tr),
+    "query_code_calls": lambda db, tr: db.query_code_calls(tr, -1),
+    "query_code_spans": lambda db, tr: db.query_code_spans(),
+    "query_code_marks": lambda db, tr: db.query_code_marks(),
+    "query_python_log_full": lambda db, tr: db.query_python_log_full(
+        tr, map_basename=False
+    ),
+    "query_python_log_full_by_mark_id": lambda db, tr: (
+        db.query_python_log_full_by_mark_id(1, map_basename=False)
+    ),
+}
+
+
+def _register_facade_query(name, query):
+    @benchmark(f"facade.{name}", setup=_facade)
+    def run(arg):
+        query(*arg)
+
+
+for name, query in FACADE_QUERIES.items():
+    _register_facade_query(name, query)
+
+
+def _facade_launch_event(trace: Trace):
+    db, timerange = _facade(trace)
+    # the launch has to exist, so its event is looked up once
+    return db, int(db.query_launches(timerange).index[0])
+
+
+@benchmark("facade.query_recipe_launch_by_event_ident", setup=_facade_launch_event)
+def query_recipe_launch_by_event_ident(arg):
+    db, event_ident = arg
+    db.query_recipe_launch_by_event_ident(event_ident)
+
+
+@benchmark("lib.find_hills", setup=lambda t: t.view.query_memory_usage()["used"])
+def find_hills(series):
+    from towl.user.lib.zigzag import find_hills
+
+    find_hills(series, threshold=1024**3)
+
+
+@benchmark("lib.analyze_zombie", setup=lambda t: t.view)
+def analyze_zombie(view):
+    from towl.user.lib.zombie import analyze_zombie
+
+    analyze_zombie(view, min_size=0, min_zombie=0)
+
+
+@benchmark("lib.build_cudamemviz", setup=lambda t: t.view, repeat=1)
+def build_cudamemviz(view):
+    from towl.user.lib.cudamemviz import build_cudamemviz
+
+    build_cudamemviz(view)
+
+
+@benchmark("lib.dump_cudamemviz", setup=lambda t: t.view, repeat=1)
+def dump_cudamemviz(view):
+    from towl.user.lib.cudamemviz import dump_cudamemviz
+
+    output = tempfile.mkdtemp()
+    try:
+        dump_cudamemviz(view, os.path.join(output, "snapshot.pickle"), None)
+    finally:
+        shutil.rmtree(output)
+
+
+@benchmark("cudamemviz.render_html", setup=lambda t: t.view, repeat=1)
+def render_html(view):
+    from towl.user.cudamemviz.viewer import render_html
+
+    output = tempfile.mkdtemp()
+    try:
+        render_html(view, os.path.join(output, "memory.html"))
+    finally:
+        shutil.rmtree(output)
+
+
+@benchmark("view.peak_attribution", setup=lambda t: t.view)
+def peak_attribution(view):
+    view.peak_attribution()
+
+
+@benchmark("code.calls", setup=lambda t: t.scenario)
+def python_code_calls(scenario):
+    # `calls` is cached per object, so every run makes a fresh one
+    scenario.python_code().calls
@@ -17,10 +17,12 @@
 from .main_cli import main_cli
 from . import create
 
-# from . import maintain
+from . import maintain
+from . import dev
 
 __all__ = [
     "create",
+    "dev",
     "maintain",
     "main_cli",
 ]
@@ -19,6 +19,20 @@ import rich_click as click
 from typing import Optional
 
 
+def _make_window(from_time, to_time, from_line, to_line, kinds):
+    from towl.db.events import EventWindow, EventKind, parse_timestamp
+
+    def time(text):
+        return None if text is None else parse_timestamp(text)
+
+    if kinds is not None:
+        kinds = frozenset(EventKind(kind.strip()) for kind in kinds.split(","))
+    window = EventWindow(time(from_time), time(to_time), from_line, to_line, kinds)
+    if window == EventWindow():
+        return None
+    return window
+
+
 @main_cli.group(name="create")
 def cli_create():
     """
@@ -31,15 +45,71 @@ def cli_create():
 @click.option("--overwrite/--no-overwrite", "-f/-F", help="overwrite output directory")
 @click.option("--copy/--no-copy", "-c/-C", help="copy input log file")
 @click.option("--title", help="extra title", type=str)
+@click.option(
+    "--wal/--no-wal", help="write in WAL mode, database can be read while created"
+)
+@click.option(
+    "--materialize/--no-materialize",
+    help="store per-kind event tables clustered by event (faster queries, bigger file)",
+)
+@click.option("--profile/--no-profile", help="report per-stage timings of the creation")
+@click.option(
+    "--profile-json",
+    help="write the profile report as JSON into given file",
+    type=click.Path(dir_okay=False),
+)
+@click.option("--from-time", help="skip events before HH:MM:SS[.ffffff]")
+@click.option("--to-time", help="skip events from HH:MM:SS[.ffffff] on")
+@click.option("--from-line", type=int, help="skip lines before this one (from 1)")
+@click.option("--to-line", type=int, help="skip lines after this one")
+@click.option(
+    "--kinds",
+    help="comma separated event kinds to read, e.g. devmem.malloc,devmem.free",
+)
 @cli_create.command()
-def from_log_file(path, output, overwrite, copy, title: Optional[str]):
+def from_log_file(
+    path,
+    output,
+    overwrite,
+    copy,
+    title: Optional[str],
+    wal,
+    materialize,
+    profile,
+    profile_json: Optional[str],
+    from_time: Optional[str],
+    to_time: Optional[str],
+    from_line: Optional[int],
+    to_line: Optional[int],
+    kinds: Optional[str],
+):
     """
     Create database from towl_log file.
+
+    Window options limit the database to a part of the log. Buffers
+    allocated before the window are created at its start.
     """
     from towl.db.creator import Creator
 
-    with Creator.make(output, overwrite=overwrite, copy=copy) as cr:
-        cr.read_file(path)
+    window = _make_window(from_time, to_time, from_line, to_line, kinds)
+    profile = profile or profile_json is not None
+    with Creator.make(
+        output,
+        overwrite=overwrite,
+        copy=copy,
+        wal=wal,
+        materialize=materialize,
+        profile=profile,
+    ) as cr:
+        cr.read_file(path, window)
+
+    if profile:
+        cr.profile.show()
+    if profile_json is not None:
+        import json
+
+        with open(profile_json, "w") as f:
+            json.dump(cr.profile.report(), f, indent=2)
 
 
 @click.argument("path")
@@ -63,10 +133,22 @@ def from_habana_logs(output, overwrite, copy):
     raise NotImplemented()
 
 
+@click.argument("path")
 @click.option("--output", "-o", help="output directory")
 @click.option("--overwrite/--no-overwrite", "-f/-F", help="overwrite output directory")
-def from_cudamemviz(output, overwrite, copy):
+@click.option("--device", "-d", help="device index", default=0, type=int)
+@click.option(
+    "--wal/--no-wal", help="write in WAL mode, database can be read while created"
+)
+@cli_create.command()
+def from_cudamemviz(path, output, overwrite, device, wal):
     """
     Create database from cudamemviz Snapshot pickled file
     """
-    raise NotImplemented()
+    from towl.db.creator import create_from_cudamemviz
+
+    skipped = create_from_cudamemviz(
+        path, output, overwrite=overwrite, device=device, wal=wal
+    )
+    for action, count in sorted(skipped.items()):
+        click.echo(f"Skipped {count} '{action}' entries")
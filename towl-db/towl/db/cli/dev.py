@@ -0,0 +1,55 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+from .main_cli import main_cli
+import rich_click as click
+
+
+@main_cli.group(name="dev")
+def cli_dev():
+    """
+    Tools for towl development
+    """
+
+
+@click.option("--seed", type=int, default=0, help="Random seed")
+@click.option("--threads", type=int, default=1, help="Number of threads")
+@click.option("--recipes", type=int, default=50, help="Number of distinct recipes")
+@click.option(
+    "--live-buffers",
+    type=int,
+    default=1000,
+    help="Number of buffers alive at once (roughly)",
+)
+@click.option("-n", "--events", type=int, default=100000, help="Number of log lines")
+@click.argument("output")
+@cli_dev.command(name="gen-log")
+def gen_log(output, events, live_buffers, recipes, threads, seed):
+    """
+    Generate synthetic towl log for scale testing.
+
+    Output is compressed when OUTPUT ends with .gz or .xz.
+    """
+    from towl.db.events.log_generator import generate_log
+
+    generate_log(
+        output,
+        events=events,
+        live_buffers=live_buffers,
+        recipes=recipes,
+        threads=threads,
+        seed=seed,
+    )
@@ -38,3 +38,20 @@ def recreate(path):
     a
     """
     pass
+
+
+@click.argument("path", default=".")
+@cli_maintain.command()
+def materialize(path):
+    """
+    Store per-kind event tables clustered by event.
+
+    Range queries over memory, launches and python log get faster at
+    the cost of a bigger database file.
+    """
+    import os
+    from towl.db.store import Database
+
+    with Database(os.path.join(path, "towl.db")) as db:
+        if not db.materialize():
+            click.echo("Database is already materialized")
@@ -20,11 +20,18 @@ from . import devmem_manager
 from . import recipe_manager
 from . import devmem_reactor
 from . import recipe_reactor
+from . import series_levels
+from . import ingest_profile
+from . import snapshot_importer
 
 from .base import Creator
 from .base import create_from_log_file
+from .base import create_from_cudamemviz
+from .ingest_profile import IngestProfile
 
 __all__ = [
     "Creator",
     "create_from_log_file",
+    "create_from_cudamemviz",
+    "IngestProfile",
 ]
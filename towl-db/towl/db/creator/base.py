@@ -14,7 +14,7 @@
 # limitations under the License.
 ################################################################################
 
-from towl.db.events import read_events_file, Event, EventKind
+from towl.db.events import read_events_file, Event, EventKind, EventWindow
 from towl.db.store import Database
 import os
 import shutil
@@ -24,16 +24,39 @@ from .event_writer import EventWriter
 from .devmem_manager import DevMemManager
 from .recipe_manager import RecipeManager
 from .python_reactor import PythonReactor
+from .series_levels import SeriesLevelsBuilder
+from .ingest_profile import IngestProfile
+from .snapshot_importer import SnapshotImporter
+from towl.db.utils.file import smart_open
+from typing import Dict, Optional
+import contextlib
+import pickle
+
+
+WAL_CHECKPOINT_EVERY_N_COMMITS = 100
 
 
 class Creator:
-    def __init__(self, output_path: str, copy: bool):
+    def __init__(
+        self,
+        output_path: str,
+        copy: bool,
+        *,
+        wal: bool = False,
+        materialize: bool = False,
+        profile: bool = False,
+    ):
         self._output_path = output_path
         if os.path.exists(output_path):
             raise RuntimeError(f"Already exist: {output_path}")
         os.makedirs(output_path)
-        self._db = Database.create(os.path.join(output_path, "towl.db"))
+        self._db = Database.create(
+            os.path.join(output_path, "towl.db"), wal=wal, profile=profile
+        )
+        self._commits = 0
         self._copy_logs = copy
+        self._materialize = materialize
+        self._profile = IngestProfile(self._db) if profile else None
 
         self._event_writer = EventWriter(self._db)
         self._devmem_manager = DevMemManager(
@@ -75,33 +98,118 @@ class Creator:
     def __exit__(self, *args):
         self.close()
 
+    @property
+    def profile(self) -> Optional[IngestProfile]:
+        "Ingest timings, None unless created with `profile=True`"
+        return self._profile
+
     def close(self):
         print("Finishing")
-        self._devmem_manager.finish()
-        self._db.close()
+        with self._phase("finish"):
+            self._devmem_manager.finish()
+            self._db.commit()
+            SeriesLevelsBuilder(self._db).build()
+        if self._materialize:
+            with self._phase("materialize"):
+                self._db.materialize()
+        with self._phase("close"):
+            self._db.close()
+        if self._profile is not None:
+            self._profile.finish()
 
-    def read_file(self, path):
+    def read_file(self, path, window: Optional[EventWindow] = None):
+        """
+        Reads events from the log, only those inside `window` if given.
+        Buffers allocated before the window are created at its start.
+        """
         COMMIT_EVERY_N_STEPS = 100  # 0000
-        for i, event in enumerate(read_events_file(path)):
+        events = read_events_file(path, window)
+        if self._profile is not None:
+            events = self._profile.timed_events(events)
+        for i, event in enumerate(events):
             self._react(event)
             if i % COMMIT_EVERY_N_STEPS == 0:
                 # print("commit")
-                self._db.commit()
+                self._commit()
+        self._commit()
+
+    def read_cudamemviz(self, path: str, device: int = 0) -> Dict[str, int]:
+        """
+        Imports device traces of PyTorch CUDA memory snapshot pickled in `path`,
+        see `SnapshotImporter`. Returns counts of skipped entries by action.
+        """
+        COMMIT_EVERY_N_TRACES = 10000
+        with smart_open(path, "rb") as fd:
+            snapshot = pickle.load(fd)
+        device_traces = snapshot["device_traces"]
+        if len(device_traces) <= device:
+            raise RuntimeError(f"No device {device} in CUDA Snapshot traces")
+        traces = device_traces[device]
+        del snapshot, device_traces
+
+        importer = SnapshotImporter(self._devmem_manager)
+        importer.allocate_preexisting(traces)
+        with self._db.bulk():
+            for index in range(len(traces)):
+                # entries are released once imported, the snapshot is not
+                # held next to the database rows
+                trace, traces[index] = traces[index], None
+                importer.react(index, trace)
+                if index % COMMIT_EVERY_N_TRACES == 0:
+                    self._devmem_manager.release_freed()
+                    self._commit()
+            self._commit()
+        return dict(importer.skipped)
+
+    def _phase(self, name: str):
+        if self._profile is None:
+            return contextlib.nullcontext()
+        return self._profile.phase(name)
+
+    def _commit(self):
+        with self._phase("commit"):
+            self._commit_events()
+
+    def _commit_events(self):
+        # Commits happen only between events. In WAL mode readers may look at
+        # the database at any commit, so deferred buffer updates are written
+        # first and every committed event is complete.
+        if not self._db.is_wal:
+            self._db.commit()
+            return
+
+        self._devmem_manager.flush()
         self._db.commit()
+        self._commits += 1
+        if self._commits % WAL_CHECKPOINT_EVERY_N_COMMITS == 0:
+            self._db.checkpoint_wal()
 
     def _react(self, event: Event):
         handler = self._dispatch.get(event.kind, None)
         if handler is None:
             raise RuntimeError(f"Unsupported event: {event}")
-        handler(event)
+        if self._profile is None:
+            handler(event)
+        else:
+            self._profile.react(handler, event)
 
     @staticmethod
-    def make(path, *, overwrite: bool, copy: bool) -> "Creator":
+    def make(
+        path,
+        *,
+        overwrite: bool,
+        copy: bool,
+        wal: bool = False,
+        materialize: bool = False,
+        profile: bool = False,
+    ) -> "Creator":
         if overwrite:
             if os.path.exists(path):
                 shutil.rmtree(path)
 
-        return Creator(path, copy=copy)
+        return Creator(
+            path, copy=copy, wal=wal, materialize=materialize, profile=profile
+        )
 
 
 def create_from_log_file(
@@ -110,11 +218,32 @@ def create_from_log_file(
     *,
     overwrite: bool = False,
     do_nothing_if_exists: bool = False,
+    wal: bool = False,
+    materialize: bool = False,
+    window: Optional[EventWindow] = None,
 ):
     """
     Create database
     """
     if os.path.exists(output) and do_nothing_if_exists:
         return
-    with Creator.make(output, overwrite=overwrite, copy=True) as cr:
-        cr.read_file(path)
+    with Creator.make(
+        output, overwrite=overwrite, copy=True, wal=wal, materialize=materialize
+    ) as cr:
+        cr.read_file(path, window)
+
+
+def create_from_cudamemviz(
+    path: str,
+    output: str,
+    *,
+    overwrite: bool = False,
+    device: int = 0,
+    wal: bool = False,
+) -> Dict[str, int]:
+    """
+    Create database from PyTorch CUDA memory snapshot, returns counts of
+    skipped entries by action
+    """
+    with Creator.make(output, overwrite=overwrite, copy=False, wal=wal) as cr:
+        return cr.read_cudamemviz(path, device)
@@ -23,7 +23,7 @@ from towl.db.utils.typechecked import typechecked
 from .event_writer import EventWriter
 from datetime import datetime
 import bisect
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 from intervaltree import IntervalTree
 
 
@@ -52,9 +52,18 @@ class MemoryMap:
             f"internal error: inconsistent data: len(xs)={len(xs)}")
 
 
+DEFAULT_CHECKPOINT_INTERVAL = 10000
+
+
 @typechecked
 class DevMemManager:
-    def __init__(self, db: Database, event_writer: EventWriter):
+    def __init__(
+        self,
+        db: Database,
+        event_writer: EventWriter,
+        *,
+        checkpoint_interval: int = DEFAULT_CHECKPOINT_INTERVAL,
+    ):
         self._live_buffers: Dict[int, model.DataBuffer] = {}
         self._get_buffer_by_addr_primary_key = PrimaryKeyGenerator()
         self._get_operation_primary_key = PrimaryKeyGenerator()
@@ -66,6 +75,13 @@ class DevMemManager:
 
         self._needs_meta_update = set()
 
+        self._checkpoint_interval = checkpoint_interval
+        self._next_checkpoint = checkpoint_interval
+
+        self._live_bytes = 0
+        self._unknown_bytes = 0
+        self._unknown_count = 0
+
     def malloc(
         self,
         timestamp: datetime,
@@ -75,8 +91,11 @@ class DevMemManager:
         stream: int,
         *,
         unknown=False,
+        alloc_frames: Optional[List[List[model.FrameInfo]]] = None,
     ):
-        meta = model.DataBufferMeta(unknown=unknown, alloc_frames=[])
+        self._maybe_checkpoint()
+        alloc_frames = [] if alloc_frames is None else list(alloc_frames)
+        meta = model.DataBufferMeta(unknown=unknown, alloc_frames=alloc_frames)
         buffer = model.DataBuffer(
             ident=self._get_buffer_by_addr_primary_key(),
             addr=addr,
@@ -90,7 +109,11 @@ class DevMemManager:
         )
         self._all_buffers[buffer.ident] = buffer
         self._memory_map.map_buffer(buffer)
+        replaced = self._live_buffers.get(buffer.addr, None)
+        if replaced is not None:
+            self._account(replaced, -1)
         self._live_buffers[buffer.addr] = buffer
+        self._account(buffer, 1)
         self._db.insert_data_buffer(buffer)
 
         op = model.DevMemBufEvent(
@@ -110,6 +133,7 @@ class DevMemManager:
 
         buffer.event_malloc = event_entity.ident
         self.update_buffer_events(buffer)
+        self._record_usage(event_entity.ident)
 
         return buffer
 
@@ -127,6 +151,7 @@ class DevMemManager:
             logging.warn(f"Freeing unknown buffer: 0x{addr:x}")
             return
 
+        self._maybe_checkpoint()
         buffer = self.get_buffer_by_addr(addr)
         self._memory_map.unmap_buffer(buffer)
 
@@ -147,20 +172,73 @@ class DevMemManager:
         buffer.event_free = event_entity.ident
         self.update_buffer_events(buffer)
         del self._live_buffers[buffer.addr]
+        self._account(buffer, -1)
+        self._record_usage(event_entity.ident)
 
         return buffer
 
+    def _account(self, buffer: model.DataBuffer, sign: int):
+        self._live_bytes += sign * buffer.size
+        if buffer.meta.unknown:
+            self._unknown_bytes += sign * buffer.size
+            self._unknown_count += sign
+
+    def _record_usage(self, event_ident: int):
+        usage = model.DevMemUsage(
+            event_ident=event_ident,
+            live_bytes=self._live_bytes,
+            live_count=len(self._live_buffers),
+            unknown_bytes=self._unknown_bytes,
+            unknown_count=self._unknown_count,
+        )
+        self._db.insert_devmem_usage(usage)
+
+    def _maybe_checkpoint(self):
+        # Live set changes only on devmem events, so the live set seen before
+        # the first devmem event past a boundary is the live set at that boundary.
+        event_ident = self._event_writer.next_ident
+        if event_ident < self._next_checkpoint:
+            return
+
+        boundary = event_ident - event_ident % self._checkpoint_interval
+        checkpoint = model.DevMemCheckpoint(
+            event_ident=boundary,
+            idents=sorted(buffer.ident for buffer in self._live_buffers.values()),
+        )
+        self._db.insert_devmem_checkpoint(checkpoint)
+        self._next_checkpoint = boundary + self._checkpoint_interval
+
     def update_buffer_events(self, buffer: model.DataBuffer):
         self._needs_meta_update.add(buffer.ident)
 
     def update_buffer_meta(self, buffer: model.DataBuffer):
         self._needs_meta_update.add(buffer.ident)
 
-    def finish(self):
+    def flush(self):
         for buffer_ident in self._needs_meta_update:
             buffer = self.get_buffer_by_id(buffer_ident)
             self._db.update_data_buffer_meta(buffer)
             self._db.update_data_buffer_events(buffer)
+        self._needs_meta_update.clear()
+
+    def release_freed(self):
+        """
+        Writes pending updates of freed buffers and forgets them, they do not
+        change any more. Keeps memory bounded by live buffers on long inputs.
+        """
+        freed = [
+            ident
+            for ident in self._needs_meta_update
+            if self._all_buffers[ident].event_free is not None
+        ]
+        for ident in freed:
+            buffer = self._all_buffers.pop(ident)
+            self._db.update_data_buffer_meta(buffer)
+            self._db.update_data_buffer_events(buffer)
+            self._needs_meta_update.discard(ident)
+
+    def finish(self):
+        self.flush()
 
     def record_status(
         self,
@@ -27,6 +27,10 @@ class EventWriter:
         self._primary_key_generator = PrimaryKeyGenerator()
         self._db = db
 
+    @property
+    def next_ident(self) -> int:
+        return self._primary_key_generator.next_value
+
     def add(self, timestamp: datetime, tid: int, kind: model.EventKind, reference: int):
         entity = model.Event(
             ident=self._primary_key_generator(),
@@ -0,0 +1,169 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+
+from towl.db.store import Database
+from collections import defaultdict
+from typing import Dict, Iterator, Optional
+import contextlib
+import resource
+import time
+
+
+class _Counters:
+    __slots__ = ["count", "parse_time", "reactor_time", "sql_time"]
+
+    def __init__(self):
+        self.count = 0
+        self.parse_time = 0.0
+        self.reactor_time = 0.0
+        self.sql_time = 0.0
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class IngestProfile:
+    """
+    Collects per-stage timings of database creation:
+
+    * parse - reading and parsing of log lines, per event kind
+    * reactor - time spent in reactor handlers excluding SQL, per event kind
+      and per handler
+    * sql - time spent executing statements, per event kind and per handler
+
+    Commits and finishing (flushing buffers, downsampling levels, ...) are
+    reported as separate phases.
+    """
+
+    def __init__(self, db: Database):
+        if db.profiler is None:
+            raise RuntimeError("Database has to be created with profile=True")
+        self._profiler = db.profiler
+        self._kinds: Dict[str, _Counters] = defaultdict(_Counters)
+        self._handlers: Dict[str, _Counters] = defaultdict(_Counters)
+        self._phases: Dict[str, _Counters] = defaultdict(_Counters)
+        self._begin = time.perf_counter()
+        self._end: Optional[float] = None
+
+    def timed_events(self, events: Iterator) -> Iterator:
+        "Yields `events` measuring how long it takes to produce each of them"
+        events = iter(events)
+        while True:
+            begin = time.perf_counter()
+            try:
+                event = next(events)
+            except StopIteration:
+                return
+            self._kinds[event.kind.value].parse_time += time.perf_counter() - begin
+            yield event
+
+    def react(self, handler, event):
+        "Calls `handler(event)` accounting its time to the event kind and handler"
+        sql_begin = self._profiler.total_time
+        begin = time.perf_counter()
+        handler(event)
+        elapsed = time.perf_counter() - begin
+        sql = self._profiler.total_time - sql_begin
+
+        name = f"{type(handler.__self__).__name__}.{handler.__name__}"
+        for counters in [self._kinds[event.kind.value], self._handlers[name]]:
+            counters.count += 1
+            counters.reactor_time += elapsed - sql
+            counters.sql_time += sql
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        sql_begin = self._profiler.total_time
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - begin
+            sql = self._profiler.total_time - sql_begin
+            counters = self._phases[name]
+            counters.count += 1
+            counters.reactor_time += elapsed - sql
+            counters.sql_time += sql
+
+    def finish(self):
+        self._end = time.perf_counter()
+
+    def report(self) -> dict:
+        "Returns the report as a JSON serializable dictionary"
+        end = self._end if self._end is not None else time.perf_counter()
+        wall_time = end - self._begin
+        events = sum(counters.count for counters in self._kinds.values())
+        # ru_maxrss is in kilobytes on Linux
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+        return {
+            "towl_db_version": _towl_db_version(),
+            "events": events,
+            "wall_time": wall_time,
+            "events_per_second": events / wall_time if wall_time > 0 else None,
+            "peak_rss_bytes": peak_rss,
+            "kinds": _to_dicts(self._kinds),
+            "handlers": _to_dicts(self._handlers),
+            "phases": _to_dicts(self._phases),
+        }
+
+    def show(self):
+        from rich.console import Console
+        from rich.table import Table
+
+        report = self.report()
+        table = Table(title="Ingest profile")
+        for column in ["", "count", "parse [s]", "reactor [s]", "sql [s]"]:
+            table.add_column(column, justify="left" if column == "" else "right")
+
+        def add_rows(group: str):
+            for name, counters in sorted(report[group].items()):
+                parse = f"{counters['parse_time']:.3f}" if group == "kinds" else "-"
+                table.add_row(
+                    name,
+                    str(counters["count"]),
+                    parse,
+                    f"{counters['reactor_time']:.3f}",
+                    f"{counters['sql_time']:.3f}",
+                )
+
+        add_rows("kinds")
+        table.add_section()
+        add_rows("handlers")
+        table.add_section()
+        add_rows("phases")
+
+        console = Console()
+        console.print(table)
+        console.print(
+            f"{report['events']} events in {report['wall_time']:.2f}s"
+            f" ({report['events_per_second'] or 0:.0f} events/s),"
+            f" peak RSS {report['peak_rss_bytes'] / 1024**2:.1f} MiB"
+        )
+
+
+def _to_dicts(counters: Dict[str, _Counters]) -> dict:
+    return {name: c.to_dict() for name, c in counters.items()}
+
+
+def _towl_db_version() -> Optional[str]:
+    import importlib.metadata
+
+    try:
+        return importlib.metadata.version("towl-db")
+    except importlib.metadata.PackageNotFoundError:
+        return None
@@ -14,12 +14,17 @@
 # limitations under the License.
 ################################################################################
 
-import itertools
-
 
 class PrimaryKeyGenerator:
     def __init__(self, initial_value=0):
-        self._it = iter(itertools.count(initial_value))
+        self._next_value = initial_value
 
     def __call__(self):
-        return next(self._it)
+        value = self._next_value
+        self._next_value += 1
+        return value
+
+    @property
+    def next_value(self):
+        "The value which will be returned by the next call"
+        return self._next_value
@@ -19,7 +19,7 @@ from .recipe_manager import RecipeManager
 from towl.db.events import Event_PythonGeneric, Event_PythonTowlCmd
 from towl.db.store import model
 from towl.db.store import Database
-from typing import List, Any, Optional, Dict
+from typing import Dict, List, NamedTuple, Optional
 from .primary_key_generator import PrimaryKeyGenerator
 from .event_writer import EventWriter
 from datetime import datetime
@@ -42,19 +42,10 @@ class ScriptLogPayload(msgspec.Struct):
     frame: FrameInfo
 
 
-class FrameVariables(msgspec.Struct):
-    frame: FrameInfo
-    memory: Dict[str, Any]
-
-
-class FrameLogContent(msgspec.Struct):
-    stack: List[FrameVariables]
-
-
 class FrameLogPayload(msgspec.Struct):
     message: str
     frame: FrameInfo
-    stack: List[FrameVariables]
+    stack: List[model.FrameVariables]
 
 
 class MarkCodePayload(msgspec.Struct):
@@ -63,6 +54,11 @@ class MarkCodePayload(msgspec.Struct):
     mark_id: int
 
 
+class OpenSpan(NamedTuple):
+    mark_id: int
+    begin_event: int
+
+
 class PythonReactor:
     def __init__(
         self,
@@ -74,6 +70,7 @@ class PythonReactor:
         self._get_primary_key = PrimaryKeyGenerator()
         self._db = db
         self._event_writer = event_writer
+        self._open_spans: Dict[int, List[OpenSpan]] = {}
 
     def react_python_generic(self, event: Event_PythonGeneric):
         pass
@@ -126,12 +123,14 @@ class PythonReactor:
             mark_id=payload.mark_id,
         )
         self._db.insert_event_python(entity)
-        self._event_writer.add(
+        event = self._event_writer.add(
             timestamp,
             tid,
             model.EventKind.PYTHON_LOG,
             entity.ident,
         )
+        stack = self._open_spans.setdefault(tid, [])
+        stack.append(OpenSpan(payload.mark_id, event.ident))
 
     def _handle_mark_code_exit(
         self, timestamp: datetime, tid: int, payload: MarkCodePayload
@@ -147,12 +146,35 @@ class PythonReactor:
             mark_id=payload.mark_id,
         )
         self._db.insert_event_python(entity)
-        self._event_writer.add(
+        event = self._event_writer.add(
             timestamp,
             tid,
             model.EventKind.PYTHON_LOG,
             entity.ident,
         )
+        self._close_span(tid, payload.mark_id, event.ident)
+
+    def _close_span(self, tid: int, mark_id: int, end_event: int):
+        stack = self._open_spans.get(tid, [])
+        marks = [span.mark_id for span in stack]
+        if mark_id not in marks:
+            # entered before the log (or the window) started
+            return
+        # spans entered later and never exited are dropped
+        index = len(marks) - 1 - marks[::-1].index(mark_id)
+        span = stack[index]
+        del stack[index:]
+        parent = stack[-1].mark_id if len(stack) > 0 else None
+        self._db.insert_code_span(
+            model.CodeSpan(
+                mark_id=mark_id,
+                begin_event=span.begin_event,
+                end_event=end_event,
+                depth=len(stack),
+                parent=parent,
+                tid=tid,
+            )
+        )
 
     def _handle_scriptlog(
         self,
@@ -189,10 +211,10 @@ class PythonReactor:
             memory = {}
             for k, v in fvars.memory.items():
                 memory[k] = self._devmem_manager.get_buffer_by_addr(v).ident
-            new_fvars = FrameVariables(frame=fvars.frame, memory=memory)
+            new_fvars = model.FrameVariables(frame=fvars.frame, memory=memory)
             stack.append(new_fvars)
 
-        content = msgspec.json.encode(FrameLogContent(stack=stack))
+        content = model.FrameLogContent(stack=stack)
         entity = model.PythonLogEvent(
             ident=self._get_primary_key(),
             command="frame-log",
@@ -23,6 +23,8 @@ from towl.db.utils.typechecked import typechecked
 from .event_writer import EventWriter
 from datetime import datetime
 from .devmem_manager import DevMemManager
+import hashlib
+import msgspec
 
 
 @typechecked
@@ -36,6 +38,8 @@ class RecipeManager:
         self._get_launch_primary_key = PrimaryKeyGenerator()
         self._launched_recipes: List[model.DataRecipeLaunch] = []
         self._devmem_manager = devmem_manager
+        self._get_layout_primary_key = PrimaryKeyGenerator()
+        self._layouts: Dict[bytes, int] = {}
 
     def publish_launch(
         self,
@@ -57,6 +61,7 @@ class RecipeManager:
             event_launch=None,
             event_finished=None,
             recipe_name=recipe_name,
+            layout_ident=self._get_layout_ident(launch_buffers),
         )
 
         self._db.insert_data_launch(entity)
@@ -78,6 +83,28 @@ class RecipeManager:
                 buffer.event_first_launch = event_entity.ident
             self._devmem_manager.update_buffer_events(buffer)
 
+    def _get_layout_ident(
+        self, launch_buffers: List[model.DataRecipeLaunchBuffer]
+    ) -> int:
+        # Training loops repeat the same launches with fresh buffers, so every
+        # distinct layout (buffers without their idents) is stored once and
+        # launches only refer to it together with their buffer idents.
+        key = [(buf.index, buf.offset, buf.synapse_name) for buf in launch_buffers]
+        digest = hashlib.blake2b(msgspec.msgpack.encode(key), digest_size=16).digest()
+
+        layout_ident = self._layouts.get(digest, None)
+        if layout_ident is None:
+            layout = model.DataLaunchLayout(
+                ident=self._get_layout_primary_key(),
+                digest=digest,
+                buffers=launch_buffers,
+            )
+            self._db.insert_launch_layout(layout)
+            layout_ident = layout.ident
+            self._layouts[digest] = layout_ident
+
+        return layout_ident
+
     def finish_launch(
         self,
         timestamp: datetime,
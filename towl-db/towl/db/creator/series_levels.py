@@ -0,0 +1,111 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+from towl.db.store import Database
+import towl.db.store.model as model
+from typing import List, Optional
+
+
+class SeriesLevels:
+    """
+    Min/max/last downsampling of a single series. Values are pushed in
+    event order; level `n + 1` is aggregated from finished buckets of level `n`.
+    """
+
+    def __init__(self, series: str, emit):
+        self._series = series
+        self._emit = emit
+        self._current: List[Optional[list]] = [None] * model.SERIES_LEVELS_COUNT
+
+    def push(self, event_ident: int, value: int):
+        bucket = event_ident // model.SERIES_LEVELS_BASE_WIDTH
+        self._push(0, bucket, value, value, value)
+
+    def _push(self, level: int, bucket: int, vmin: int, vmax: int, vlast: int):
+        if level == model.SERIES_LEVELS_COUNT:
+            return
+        current = self._current[level]
+        if current is not None and current[0] == bucket:
+            current[1] = min(current[1], vmin)
+            current[2] = max(current[2], vmax)
+            current[3] = vlast
+            return
+        if current is not None:
+            self._flush(level, current)
+        self._current[level] = [bucket, vmin, vmax, vlast]
+
+    def _flush(self, level: int, current: list):
+        bucket, vmin, vmax, vlast = current
+        self._emit(
+            model.SeriesLevelBucket(
+                series=self._series,
+                level=level,
+                bucket=bucket,
+                min=vmin,
+                max=vmax,
+                last=vlast,
+            )
+        )
+        self._push(level + 1, bucket // model.SERIES_LEVELS_FACTOR, vmin, vmax, vlast)
+
+    def finish(self):
+        for level in range(model.SERIES_LEVELS_COUNT):
+            current, self._current[level] = self._current[level], None
+            if current is not None:
+                self._flush(level, current)
+
+
+class SeriesLevelsBuilder:
+    """
+    Post-ingest step writing downsampling levels of memory series,
+    see `towl.db.store.model.series_level_width`.
+    """
+
+    INSERT_BATCH_SIZE = 10000
+
+    def __init__(self, db: Database):
+        self._db = db
+        self._pending: List[model.SeriesLevelBucket] = []
+
+    def _emit(self, bucket: model.SeriesLevelBucket):
+        self._pending.append(bucket)
+        if len(self._pending) >= self.INSERT_BATCH_SIZE:
+            self._flush()
+
+    def _flush(self):
+        self._db.insert_series_levels(self._pending)
+        self._pending = []
+
+    def build(self):
+        end = self._db.query_number_of_events()
+
+        used = SeriesLevels("used", self._emit)
+        workspace = SeriesLevels("workspace", self._emit)
+        persistent = SeriesLevels("persistent", self._emit)
+        for row in self._db.query_devmem_summary(0, end, None):
+            event_ident, used_value, workspace_value, persistent_value, _ = row
+            used.push(event_ident, used_value)
+            workspace.push(event_ident, workspace_value)
+            persistent.push(event_ident, persistent_value)
+
+        live_bytes = SeriesLevels("live_bytes", self._emit)
+        for event_ident, live_bytes_value, *_ in self._db.query_allocator_usage(0, end):
+            live_bytes.push(event_ident, live_bytes_value)
+
+        for series in [used, workspace, persistent, live_bytes]:
+            series.finish()
+        self._flush()
+        self._db.commit()
@@ -0,0 +1,101 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+
+from .devmem_manager import DevMemManager
+from towl.db.store import model
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+# TID of all imported events, snapshots do not record threads
+SNAPSHOT_TID = 0
+
+
+class SnapshotImporter:
+    """
+    Imports device traces of PyTorch CUDA memory snapshot
+    (`torch.cuda.memory._snapshot()`) through `DevMemManager`.
+
+    `alloc` and `free_completed` entries become buffers, their frames are
+    attached as allocation stack (every distinct stack is kept once).
+    Buffers freed without being allocated in the trace are created as
+    unknown buffers at its start.
+    """
+
+    def __init__(self, devmem_manager: DevMemManager):
+        self._devmem_manager = devmem_manager
+        self._stacks: Dict[Tuple, List[model.FrameInfo]] = {}
+        self.skipped: Counter = Counter()
+
+    def timestamp(self, index: int, trace: dict) -> datetime:
+        # entries without `time_us` (older PyTorch) are a microsecond apart
+        time_us = trace.get("time_us", index)
+        return datetime.fromtimestamp(time_us / 1e6)
+
+    def allocate_preexisting(self, traces: List[dict]):
+        live = set()
+        preexisting = []
+        for trace in traces:
+            action = trace["action"]
+            if action == "alloc":
+                live.add(trace["addr"])
+            elif action == "free_completed":
+                if trace["addr"] in live:
+                    live.discard(trace["addr"])
+                else:
+                    preexisting.append(trace)
+
+        timestamp = self.timestamp(0, traces[0] if len(traces) > 0 else {})
+        for trace in preexisting:
+            self._devmem_manager.malloc(
+                timestamp,
+                SNAPSHOT_TID,
+                trace["addr"],
+                trace["size"],
+                trace["stream"],
+                unknown=True,
+            )
+
+    def _stack(self, frames: List[dict]) -> List[model.FrameInfo]:
+        key = tuple((f["filename"], f["line"], f["name"]) for f in frames)
+        stack = self._stacks.get(key, None)
+        if stack is None:
+            stack = [
+                model.FrameInfo(filename=filename, line=line, funcname=name)
+                for filename, line, name in key
+            ]
+            self._stacks[key] = stack
+        return stack
+
+    def react(self, index: int, trace: dict):
+        action = trace["action"]
+        if action == "alloc":
+            frames = trace["frames"]
+            self._devmem_manager.malloc(
+                self.timestamp(index, trace),
+                SNAPSHOT_TID,
+                trace["addr"],
+                trace["size"],
+                trace["stream"],
+                alloc_frames=[self._stack(frames)] if len(frames) > 0 else [],
+            )
+        elif action == "free_completed":
+            self._devmem_manager.free(
+                self.timestamp(index, trace), SNAPSHOT_TID, trace["addr"]
+            )
+        else:
+            self.skipped[action] += 1
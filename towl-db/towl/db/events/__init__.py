@@ -15,7 +15,8 @@
 ################################################################################
 
 from .event_reader import read_events_file
-from .data import Event, EventKind
+from .log_reader import parse_timestamp
+from .data import Event, EventKind, EventWindow
 from .data import Event_DevMemFree, Event_DevMemMalloc, Event_DevMemSummary
 from .data import Event_RecipeLaunch, Event_RecipeLaunchBuf, Event_RecipeFinished
 from .data import Event_PythonGeneric, Event_PythonTowlCmd
@@ -14,7 +14,7 @@
 # limitations under the License.
 ################################################################################
 
-from typing import NamedTuple, Optional, Any
+from typing import NamedTuple, Optional, Any, FrozenSet
 from datetime import datetime
 from enum import Enum
 from towl.db.store import model
@@ -39,6 +39,25 @@ class EventKind(Enum):
     PYTHON_TOWLCMD = "python_towlcmd"
 
 
+TIMESTAMP_FORMAT = "%H:%M:%S.%f"
+
+
+class EventWindow(NamedTuple):
+    """
+    Part of the log to read.
+
+    Lines are numbered from 1 and both line bounds are inclusive, time
+    bounds are `from_time <= timestamp < to_time`. When `kinds` is given
+    only those events are read inside the window.
+    """
+
+    from_time: Optional[datetime] = None
+    to_time: Optional[datetime] = None
+    from_line: Optional[int] = None
+    to_line: Optional[int] = None
+    kinds: Optional[FrozenSet[EventKind]] = None
+
+
 class Event:
     def __init__(self, kind: EventKind, tid: int, timestamp: datetime):
         self.kind = kind
@@ -14,20 +14,22 @@
 # limitations under the License.
 ################################################################################
 
-from .log_reader import read_log_file
-from .data import Event
+from .log_reader import read_log_file, LogReader
+from .file_reader import read_lines
+from .data import Event, EventWindow, TIMESTAMP_FORMAT
 from .data import Event, EventKind, Event_DevMemMalloc, LogEntry
 from .data import Event_DevMemMalloc, Event_DevMemFree, Event_DevMemSummary
 from .data import Event_RecipeLaunch, Event_RecipeFinished, Event_RecipeLaunchBuf
 from .data import Event_PythonGeneric, Event_PythonTowlCmd
-from typing import Generator, Any
+from typing import Generator, Any, Dict, List, Optional
 from .data import TowlCommand
 import msgspec
 
 
 class EventReader:
-    def __init__(self, path: str):
+    def __init__(self, path: str, window: Optional[EventWindow] = None):
         self._path = path
+        self._window = window
         self._dispatch = {
             EventKind.DEVMEM_MALLOC.value: self._parse_devmem_malloc,
             EventKind.DEVMEM_FREE.value: self._parse_devmem_free,
@@ -135,12 +137,94 @@ class EventReader:
         )
 
     def read_events(self) -> Generator[Event, Any, Any]:
+        if self._window is not None:
+            yield from self._read_window_events(self._window)
+            return
+
         for log_entry in read_log_file(self._path):
             event_kind, content = log_entry.content.split(" ", maxsplit=1)
             parser = self._dispatch.get(event_kind, None)
             if parser is not None:
                 yield from parser(log_entry, content)
 
+    def _read_window_events(self, window: EventWindow) -> Generator[Event, Any, Any]:
+        # Lines outside of the window are not parsed, except allocations
+        # before it: buffers still live at the window start are replayed
+        # there as regular mallocs, followed by allocation points attached
+        # to them.
+        def time_key(t):
+            return None if t is None else t.strftime(TIMESTAMP_FORMAT)
+
+        from_time, to_time = time_key(window.from_time), time_key(window.to_time)
+        dispatch = self._dispatch
+        if window.kinds is not None:
+            kinds = {kind.value for kind in window.kinds}
+            if EventKind.RECIPE_LAUNCH.value in kinds:
+                kinds.add(EventKind.RECIPE_LAUNCH_BUF.value)
+            if EventKind.PYTHON_TOWLCMD.value in kinds:
+                kinds.add(EventKind.PYTHON_GENERIC.value)
+            dispatch = {k: v for k, v in dispatch.items() if k in kinds}
+        carry = EventKind.DEVMEM_MALLOC.value in dispatch
+        carry_attach = EventKind.PYTHON_GENERIC.value in dispatch
+        # malloc of every live buffer followed by its allocation points
+        live: Optional[Dict[int, List[Event]]] = {}
+
+        log_reader = LogReader(self._path)
+        for lineno, line in enumerate(read_lines(self._path), 1):
+            timestamp = line[1:16]
+            if window.to_line is not None and lineno > window.to_line:
+                break
+            if to_time is not None and timestamp >= to_time:
+                break
+            if (window.from_line is not None and lineno < window.from_line) or (
+                from_time is not None and timestamp < from_time
+            ):
+                if carry and live is not None:
+                    self._carry(log_reader, lineno, line, live, carry_attach)
+                continue
+
+            if live:
+                log_entry = log_reader.parse_line(lineno - 1, line)
+                for events in live.values():
+                    for event in events:
+                        event.timestamp = log_entry.timestamp
+                        yield event
+            live = None
+
+            parser = dispatch.get(line.split(" ", maxsplit=2)[1], None)
+            if parser is not None:
+                log_entry = log_reader.parse_line(lineno - 1, line)
+                _, content = log_entry.content.split(" ", maxsplit=1)
+                yield from parser(log_entry, content)
 
-def read_events_file(path: str):
-    yield from EventReader(path).read_events()
+    def _carry(
+        self,
+        log_reader: LogReader,
+        lineno: int,
+        line: str,
+        live: Dict[int, List[Event]],
+        carry_attach: bool,
+    ):
+        _, event_kind, content = line.split(" ", maxsplit=2)
+        if event_kind == EventKind.DEVMEM_MALLOC.value:
+            log_entry = log_reader.parse_line(lineno - 1, line)
+            for event in self._parse_devmem_malloc(log_entry, content):
+                live.pop(event.addr, None)
+                live[event.addr] = [event]
+        elif event_kind == EventKind.DEVMEM_FREE.value:
+            live.pop(int(content.split(" ")[0], 16), None)
+        elif (
+            carry_attach
+            and event_kind == EventKind.PYTHON_GENERIC.value
+            and "attach-allocation-point" in content
+        ):
+            # allocation points are attached to the start of a live buffer
+            log_entry = log_reader.parse_line(lineno - 1, line)
+            for event in self._parse_python_generic(log_entry, content):
+                events = live.get(event.payload["addr"], None)
+                if event.command == "attach-allocation-point" and events is not None:
+                    events.append(event)
+
+
+def read_events_file(path: str, window: Optional[EventWindow] = None):
+    yield from EventReader(path, window).read_events()
@@ -0,0 +1,285 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+
+from towl.db.utils.file import smart_open
+from typing import Dict, List, NamedTuple, Optional, TextIO, Tuple
+import json
+import random
+
+ALLOCATION_GRANULARITY = 512
+POOL_BASE_ADDR = 0x1000_0000_0000
+MAX_RECIPES_IN_FLIGHT = 8
+
+
+class CachingAllocator:
+    """
+    Address pattern of a caching allocator: freed blocks are kept in bins
+    per size and handed out again to allocations of the same size before
+    the pool grows.
+    """
+
+    def __init__(self, base: int = POOL_BASE_ADDR):
+        self._top = base
+        self._bins: Dict[int, List[int]] = {}
+        self._live: Dict[int, int] = {}
+        self._used = 0
+        self._addrs: List[int] = []
+        self._index: Dict[int, int] = {}
+
+    @property
+    def live(self) -> Dict[int, int]:
+        return self._live
+
+    @property
+    def used(self) -> int:
+        return self._used
+
+    def malloc(self, size: int) -> int:
+        size = -(-size // ALLOCATION_GRANULARITY) * ALLOCATION_GRANULARITY
+        cached = self._bins.get(size)
+        if cached:
+            addr = cached.pop()
+        else:
+            addr = self._top
+            self._top += size
+        self._live[addr] = size
+        self._used += size
+        self._index[addr] = len(self._addrs)
+        self._addrs.append(addr)
+        return addr
+
+    def free(self, addr: int):
+        size = self._live.pop(addr)
+        self._used -= size
+        self._bins.setdefault(size, []).append(addr)
+        # swap-remove keeps picking random live buffer O(1)
+        index = self._index.pop(addr)
+        last = self._addrs.pop()
+        if last != addr:
+            self._addrs[index] = last
+            self._index[last] = index
+
+    def choice(self, rng: random.Random) -> int:
+        return self._addrs[rng.randrange(len(self._addrs))]
+
+
+class Recipe(NamedTuple):
+    handle: int
+    name: str
+    workspace: int
+    synapse_names: List[str]
+    # tensors sit at the same offset of their buffers in every launch
+    offsets: List[int]
+
+
+class LogGenerator:
+    """
+    Writes synthetic towl log in the format parsed by `EventReader`.
+
+    * `events` - number of log lines to write (roughly, blocks like a recipe
+      launch with its buffers are never split)
+    * `live_buffers` - size of the live set the allocator oscillates around
+    * `recipes` - number of distinct recipes launched
+    * `threads` - number of threads the lines are spread over
+    """
+
+    def __init__(
+        self,
+        *,
+        events: int,
+        live_buffers: int = 1000,
+        recipes: int = 50,
+        threads: int = 1,
+        seed: int = 0,
+    ):
+        self._events = events
+        self._live_buffers = live_buffers
+        self._threads = [0x1000 + i for i in range(threads)]
+        self._random = random.Random(seed)
+        self._allocator = CachingAllocator()
+        self._recipes = [self._make_recipe(i) for i in range(recipes)]
+        self._sizes = [self._make_size() for _ in range(64)]
+        self._in_flight: List[Recipe] = []
+        self._marks: Dict[int, List[int]] = {tid: [] for tid in self._threads}
+        self._next_mark_id = 1
+        self._time_us = 0
+        self._written = 0
+        self._fd: Optional[TextIO] = None
+
+    def _make_recipe(self, i: int) -> Recipe:
+        nbuffers = self._random.randint(1, 8)
+        return Recipe(
+            handle=0x7F00_0000_0000 + i * 0x1000,
+            name=f"recipe_{i}",
+            workspace=self._random.choice([0, 1, 4, 16, 64]) * 1024**2,
+            synapse_names=[f"tensor_{i}_{j}" for j in range(nbuffers)],
+            offsets=[
+                self._random.choice([0, 0, 0, 1, 8]) * ALLOCATION_GRANULARITY
+                for _ in range(nbuffers)
+            ],
+        )
+
+    def _make_size(self) -> int:
+        # few large buffers and many small ones
+        if self._random.random() < 0.1:
+            return self._random.randint(16, 512) * 1024**2
+        return self._random.randint(1, 4096) * 1024
+
+    def write(self, path: str):
+        with smart_open(path, "wt") as fd:
+            self._fd = fd
+            while self._written < self._events:
+                self._step()
+            self._drain()
+            self._fd = None
+
+    def _line(self, tid: int, content: str):
+        self._time_us += self._random.randint(1, 200)
+        seconds, us = divmod(self._time_us, 1000000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        timestamp = f"{hours % 24:02}:{minutes:02}:{seconds:02}.{us:06}"
+        self._fd.write(f"[{timestamp}][TOWL][info][tid:{tid:X}] {content}\n")
+        self._written += 1
+
+    def _command(self, tid: int, command: str, payload: dict):
+        text = json.dumps({"command": command, "payload": payload})
+        self._line(tid, f"python TOWL-CMD: {text}")
+
+    def _frame(self, funcname: str) -> dict:
+        return {"filename": "/model/train.py", "funcname": funcname, "line": 1}
+
+    def _step(self):
+        tid = self._random.choice(self._threads)
+        live = len(self._allocator.live)
+        r = self._random.random()
+        if r < 0.5 or live < 8:
+            # allocations prevail below the target live set, frees above it
+            if live == 0 or self._random.random() < self._live_buffers / (2 * live):
+                self._malloc(tid)
+            else:
+                self._free(tid)
+        elif r < 0.8:
+            if len(self._in_flight) < MAX_RECIPES_IN_FLIGHT:
+                self._launch(tid)
+            else:
+                self._finish_launch(tid)
+        elif r < 0.85:
+            self._summary(tid)
+        elif r < 0.93:
+            self._mark(tid)
+        elif r < 0.97:
+            self._command(
+                tid, "script-log", {"message": "step", "frame": self._frame("step")}
+            )
+        else:
+            self._frame_log(tid)
+
+    def _malloc(self, tid: int):
+        size = self._random.choice(self._sizes)
+        addr = self._allocator.malloc(size)
+        self._line(tid, f"devmem.malloc 0x{addr:x} size {size} stream 0")
+        if self._random.random() < 0.3:
+            frames = [self._frame(f"layer_{self._random.randint(0, 9)}")]
+            payload = {"addr": addr, "frames": frames}
+            self._command(tid, "attach-allocation-point", payload)
+
+    def _free(self, tid: int):
+        addr = self._allocator.choice(self._random)
+        self._allocator.free(addr)
+        self._line(tid, f"devmem.free 0x{addr:x}")
+
+    def _launch(self, tid: int):
+        recipe = self._random.choice(self._recipes)
+        nbuffers = len(recipe.synapse_names)
+        if len(self._allocator.live) < nbuffers:
+            return self._malloc(tid)
+
+        self._line(
+            tid,
+            f"recipe.launch workspace {recipe.workspace} handle 0x{recipe.handle:x}"
+            f" nbuffers {nbuffers} name {recipe.name}",
+        )
+        for index in range(nbuffers):
+            addr = self._allocator.choice(self._random)
+            size = self._allocator.live[addr]
+            offset = min(recipe.offsets[index], size - ALLOCATION_GRANULARITY)
+            self._line(
+                tid,
+                f"recipe.launch.buf {index} tensor_id {index} type 0"
+                f" device_addr 0x{addr:x} handle_addr 0x{addr + offset:x}"
+                f" name {recipe.synapse_names[index]}",
+            )
+        self._in_flight.append(recipe)
+
+    def _finish_launch(self, tid: int):
+        if len(self._in_flight) == 0:
+            return self._summary(tid)
+        # recipes finish in the launch order
+        recipe = self._in_flight.pop(0)
+        self._line(tid, f"recipe.finished 0x{recipe.handle:x}")
+
+    def _summary(self, tid: int):
+        used = self._allocator.used
+        workspace = max((r.workspace for r in self._in_flight), default=0)
+        self._line(
+            tid,
+            f"devmem.summary used {used} workspace {workspace}"
+            f" persistent {used - workspace} tag step",
+        )
+
+    def _mark(self, tid: int, exit: bool = False):
+        marks = self._marks[tid]
+        if len(marks) > 0 and (exit or len(marks) >= 8 or self._random.random() < 0.5):
+            mark_id = marks.pop()
+            command = "mark-code-exit"
+        else:
+            mark_id = self._next_mark_id
+            self._next_mark_id += 1
+            marks.append(mark_id)
+            command = "mark-code-enter"
+        payload = {
+            "message": f"mark_{mark_id}",
+            "frame": self._frame(f"block_{mark_id % 10}"),
+            "mark_id": mark_id,
+        }
+        self._command(tid, command, payload)
+
+    def _frame_log(self, tid: int):
+        if len(self._allocator.live) == 0:
+            return self._malloc(tid)
+        variables = [self._allocator.choice(self._random) for _ in range(3)]
+        stack = [
+            {
+                "frame": self._frame("forward"),
+                "memory": {f"x{i}": addr for i, addr in enumerate(variables)},
+            }
+        ]
+        payload = {"message": "frame", "frame": self._frame("forward"), "stack": stack}
+        self._command(tid, "frame-log", payload)
+
+    def _drain(self):
+        while len(self._in_flight) > 0:
+            self._finish_launch(self._threads[0])
+        for tid, marks in self._marks.items():
+            while len(marks) > 0:
+                self._mark(tid, exit=True)
+
+
+def generate_log(path: str, *, events: int, **kwargs):
+    "Writes synthetic towl log into `path` (.gz and .xz are compressed)"
+    LogGenerator(events=events, **kwargs).write(path)
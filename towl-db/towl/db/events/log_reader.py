@@ -17,7 +17,7 @@
 from .file_reader import read_lines
 from typing import NamedTuple, Optional
 from datetime import datetime
-from .data import LogEntry
+from .data import LogEntry, TIMESTAMP_FORMAT
 
 
 class Prefix(NamedTuple):
@@ -30,7 +30,7 @@ class LogReader:
         self._path = path
 
     def _parse_date(self, s):
-        return datetime.strptime(s, "%H:%M:%S.%f")
+        return datetime.strptime(s, TIMESTAMP_FORMAT)
 
     def _parse_prefix(self, text: str):
         columns = text.split("]")
@@ -46,6 +46,9 @@ class LogReader:
 
     def _handle_line(self, p):
         lineno, line = p
+        return self.parse_line(lineno, line)
+
+    def parse_line(self, lineno: int, line: str) -> LogEntry:
         s_prefix, s_content = line.split(" ", maxsplit=1)
         prefix = self._parse_prefix(s_prefix)
         return LogEntry(
@@ -59,5 +62,12 @@ class LogReader:
         yield from map(self._handle_line, enumerate(read_lines(self._path)))
 
 
+def parse_timestamp(text: str) -> datetime:
+    "Parses log timestamp, fraction of seconds is optional"
+    if "." not in text:
+        text += ".0"
+    return datetime.strptime(text, TIMESTAMP_FORMAT)
+
+
 def read_log_file(path: str):
     yield from LogReader(path).read_log_entries()
@@ -17,3 +17,4 @@
 from . import db
 from . import sql
 from .db import Database
+from .profiler import QueryProfiler
@@ -15,27 +15,252 @@
 ################################################################################
 
 import sqlite3
+import contextlib
+import functools
 import os
+import base64
+import threading
+import itertools
+import urllib.parse
+import weakref
 from . import sql
+from .profiler import QueryProfiler, DEFAULT_SLOW_QUERY_THRESHOLD
 from towl.db.store import model
-import json
 from typeguard import typechecked
-from typing import Optional
+from typing import Dict, Optional, List
 import msgspec
 
+DEFAULT_BULK_SIZE = 10000
+
+
+def _is_insert(query: str) -> bool:
+    return query.lstrip().upper().startswith("INSERT")
+
+
+def _encode_idents(idents: List[int]) -> bytes:
+    # sorted idents are stored as deltas, so most of them fit into a single byte
+    deltas = [b - a for a, b in zip([0] + idents, idents)]
+    return msgspec.msgpack.encode(deltas)
+
+
+def _decode_idents(data: bytes) -> List[int]:
+    idents = []
+    ident = 0
+    for delta in msgspec.msgpack.decode(data, type=List[int]):
+        ident += delta
+        idents.append(ident)
+    return idents
+
+
+class _ThreadConnection:
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+
+def _release(database_ref, db: sqlite3.Connection):
+    # the finalizer must not keep the database alive
+    database = database_ref()
+    if database is None:
+        db.close()
+    else:
+        database._release(db)
+
+
+def _thread_connection(database_ref) -> sqlite3.Connection:
+    # the profiler must not keep the database alive either
+    database = database_ref()
+    if database is None:
+        raise RuntimeError("Database is gone")
+    return database._db
+
 
 class Database:
-    def __init__(self, path: str):
+    """
+    Database connection.
+
+    With `read_only=True` the database is opened with `mode=ro` and every
+    thread gets its own connection, so queries issued from different threads
+    (e.g. from `concurrent.futures.ThreadPoolExecutor`) do not block each other.
+    The connection of a thread is closed when the thread ends.
+
+    With `profile=True` every statement is timed, see `profiler`.
+
+    Inside `bulk()` inserts and updates are queued and written in batches.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        read_only: bool = False,
+        profile: bool = False,
+        slow_query_threshold: float = DEFAULT_SLOW_QUERY_THRESHOLD,
+    ):
         if not os.path.exists(path):
             raise FileNotFoundError(f"Not found database: {path}")
 
-        self._db = sqlite3.connect(path)
+        self._path = path
+        self._read_only = read_only
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._closed = False
+        self._wal = False
+        self._profiler = None
+        if profile:
+            connection = functools.partial(_thread_connection, weakref.ref(self))
+            self._profiler = QueryProfiler(slow_query_threshold, connection)
+        self._pending: Optional[Dict[str, list]] = None
+        self._write_order: Dict[str, int] = {}
+        self._bulk_size = DEFAULT_BULK_SIZE
+
+        self._tables = set(row[0] for row in self._execute(sql.Opening.list_tables))
+
+        (self._version,) = self._execute(sql.Opening.read_version).fetchone()
+        if self._version >= model.BINARY_META_VERSION:
+            decoder = msgspec.msgpack.Decoder
+        else:
+            decoder = msgspec.json.Decoder
+        self._buffer_meta_decoder = decoder(model.DataBufferMeta)
+        self._launch_meta_decoder = decoder(model.DataRecipeLaunchMeta)
+        self._framelog_decoder = decoder(model.FrameLogContent)
+
+    @property
+    def profiler(self) -> Optional[QueryProfiler]:
+        "Collected query timings, None unless opened with `profile=True`"
+        return self._profiler
+
+    def _execute(self, query: str, params=()):
+        if self._pending:
+            self._flush_pending()
+        if self._profiler is None:
+            return self._db.execute(query, params)
+        return self._profiler.execute(self._db, query, params)
+
+    def _executemany(self, query: str, rows):
+        if self._pending:
+            self._flush_pending()
+        return self._run_many(query, rows)
+
+    def _run_many(self, query: str, rows):
+        if self._profiler is None:
+            return self._db.executemany(query, rows)
+        return self._profiler.executemany(self._db, query, rows)
+
+    def _write(self, query: str, row: dict):
+        self._write_order.setdefault(query, len(self._write_order))
+        if self._pending is None:
+            self._execute(query, row)
+            return
+        rows = self._pending.setdefault(query, [])
+        rows.append(row)
+        if len(rows) >= self._bulk_size:
+            self._flush_pending()
+
+    def _flush_pending(self):
+        # Rows are grouped by query, rows of a query keep their order. Updates
+        # refer to rows inserted before, so all inserts go first. A row refers
+        # to rows of other tables written before it, so inserts go in order of
+        # the first write of their query, which satisfies the foreign keys.
+        pending, self._pending = self._pending, {}
+        queries = sorted(
+            pending,
+            key=lambda query: (not _is_insert(query), self._write_order[query]),
+        )
+        for query in queries:
+            self._run_many(query, pending[query])
+
+    @contextlib.contextmanager
+    def bulk(self, batch_size: int = DEFAULT_BULK_SIZE):
+        """
+        Queues inserts and updates inside the context and writes them with
+        `executemany` in batches of `batch_size` rows. Other statements and
+        `commit` write the queue first, so reads see all previous writes.
+        """
+        if self._pending is not None:
+            yield
+            return
+        self._pending, self._bulk_size = {}, batch_size
+        try:
+            yield
+        finally:
+            self._flush_pending()
+            self._pending = None
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def decode_buffer_meta(self, data) -> model.DataBufferMeta:
+        "Decodes `meta` column of `data_buffers` stored by this database version"
+        return self._buffer_meta_decoder.decode(data)
+
+    def decode_launch_meta(self, data) -> model.DataRecipeLaunchMeta:
+        "Decodes `meta` column of `data_launches` stored by this database version"
+        return self._launch_meta_decoder.decode(data)
+
+    def decode_framelog_content(self, data) -> Optional[model.FrameLogContent]:
+        "Decodes `content` column of `events_pythonlog`, None for other commands"
+        if data is None:
+            return None
+        if self._version < model.BINARY_META_VERSION and not data.startswith("{"):
+            # older versions stored base64 of the JSON bytes
+            data = base64.b64decode(data)
+        return self._framelog_decoder.decode(data)
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError(f"Database is closed: {self._path}")
+        if not self._read_only and len(self._connections) > 0:
+            return self._connections[0]
+        local = getattr(self._local, "connection", None)
+        if local is None:
+            local = _ThreadConnection(self._connect())
+            if self._read_only:
+                # thread locals are dropped when the thread ends, so do its
+                # connection, pools of short lived threads do not pile them
+                weakref.finalize(local, _release, weakref.ref(self), local.db)
+            self._local.connection = local
+        return local.db
+
+    def _release(self, db: sqlite3.Connection):
+        with self._connections_lock:
+            if db not in self._connections:
+                return
+            self._connections.remove(db)
+        db.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._read_only:
+            path = urllib.parse.quote(os.path.abspath(self._path))
+            db = sqlite3.connect(
+                f"file:{path}?mode=ro", uri=True, check_same_thread=False
+            )
+            db.executescript(sql.Opening.configure_read_only)
+        else:
+            db = sqlite3.connect(self._path)
+            db.executescript(sql.Opening.configure)
+        db.commit()
 
-        self._db.executescript(sql.Opening.configure)
-        self._db.commit()
+        with self._connections_lock:
+            self._connections.append(db)
+        return db
 
     @staticmethod
-    def create(path: str):
+    def create(path: str, *, wal: bool = False, profile: bool = False):
+        """
+        Creates new database in `path`.
+
+        By default the database is written without a journal, which is the
+        fastest, but nobody can read it until it is closed. With `wal=True`
+        it is written in WAL mode: readers opened in the meantime see every
+        committed prefix of events. The WAL is folded back into the database
+        on `close`, which leaves a regular single-file database, unless
+        a reader is still attached: then the database stays in WAL mode.
+
+        With `profile=True` statements are timed, see `profiler`.
+        """
         if os.path.exists(path):
             raise RuntimeError(f"Database already exists: {path}")
 
@@ -50,18 +275,98 @@ class Database:
             db.close()
             os.remove(path)
             raise
-        db = Database(path)
-        db._db.executescript(sql.Opening.xconfigure)
+        db = Database(path, profile=profile)
+        if wal:
+            db._db.executescript(sql.Opening.xconfigure_wal)
+            db._wal = True
+        else:
+            db._db.executescript(sql.Opening.xconfigure)
         return db
 
+    @property
+    def is_wal(self) -> bool:
+        return self._wal
+
+    @property
+    def is_materialized(self) -> bool:
+        return self.has_table("mat_devmem_buf")
+
+    def materialize(self) -> bool:
+        """
+        Copies the per-kind views (devmem_buf, devmem_summary, launches and
+        pythonlog) into `WITHOUT ROWID` tables clustered by `event_ident`
+        and redefines the views over them, so range queries read consecutive
+        pages without joins.
+
+        Has to be called once the database is complete. Returns False if
+        the database is already materialized.
+        """
+        if self.is_materialized:
+            return False
+
+        for kind in sql.Materialization.kinds:
+            self._materialize_kind(kind)
+
+        self.commit()
+        return True
+
+    def _materialize_kind(self, kind: str):
+        M = sql.Materialization
+        cursor = self._execute(M.query_columns.format(kind=kind))
+        names = [d[0] for d in cursor.description if d[0] != "event_ident"]
+        stored = [name for name in names if kind != "devmem_buf" or name != "meta"]
+        columns = ", ".join(f'"{name}"' for name in stored)
+
+        self._execute(M.create_table.format(kind=kind, columns=columns))
+        self._execute(M.fill_table.format(kind=kind, columns=columns))
+        self._execute(M.drop_view.format(kind=kind))
+        if kind == "devmem_buf":
+            qualified = ", ".join(
+                "data_buffers.meta" if name == "meta" else f'mat_devmem_buf."{name}"'
+                for name in names
+            )
+            self._execute(M.create_view_devmem_buf.format(columns=qualified))
+        else:
+            self._execute(M.create_view.format(kind=kind, columns=columns))
+        self._tables.add(f"mat_{kind}")
+
     def commit(self):
+        if self._pending:
+            self._flush_pending()
         self._db.commit()
 
+    def checkpoint_wal(self):
+        """
+        Copies committed pages from the WAL into the database without
+        waiting for readers.
+        """
+        if self._wal:
+            self._execute(sql.Opening.wal_checkpoint).fetchall()
+
     def close(self):
-        if self._db is not None:
-            self.commit()
-            self._db.close()
-            self._db = None
+        if self._closed:
+            return
+        try:
+            if not self._read_only:
+                self.commit()
+            if self._wal:
+                self._finish_wal()
+        finally:
+            with self._connections_lock:
+                connections, self._connections = self._connections, []
+            for db in connections:
+                db.close()
+            self._closed = True
+
+    def _finish_wal(self):
+        # leaving WAL mode needs an exclusive lock, attached readers keep
+        # the database in WAL mode with the WAL checkpointed as far as possible
+        try:
+            self._db.executescript(sql.Opening.wal_finish)
+        except sqlite3.OperationalError as error:
+            if "locked" not in str(error) and "busy" not in str(error):
+                raise
+            self._db.execute(sql.Opening.wal_checkpoint).fetchall()
 
     def __enter__(self):
         return self
@@ -70,27 +375,29 @@ class Database:
         self.close()
 
     def insert_event_devmem_summary(self, d: model.DeviceMemoryShortSummaryEvent):
-        self._db.execute(sql.EventsInserting.insert_devmem_summary, d._asdict())
+        self._write(sql.EventsInserting.insert_devmem_summary, d._asdict())
 
     def insert_event_devmem_buf(self, d: model.DevMemBufEvent):
-        self._db.execute(sql.EventsInserting.insert_devmem_buf, d._asdict())
+        self._write(sql.EventsInserting.insert_devmem_buf, d._asdict())
 
     def insert_event(self, d: model.Event):
         row = d._asdict()
         # row["kind"] = int(d.kind.value)
         row["timestamp"] = d.timestamp
-        self._db.execute(sql.EventsInserting.insert_event, row)
+        self._write(sql.EventsInserting.insert_event, row)
 
     def insert_event_python(self, d: model.PythonLogEvent):
         row = msgspec.to_builtins(d)
-        self._db.execute(sql.Python.insert_python, row)
+        if d.content is not None:
+            row["content"] = msgspec.msgpack.encode(d.content)
+        self._write(sql.Python.insert_python, row)
 
     def query_python_log(self, begin: int, end: int):
         params = {
             "begin": begin,
             "end": end,
         }
-        cursor = self._db.execute(sql.Python.query_python_log, params)
+        cursor = self._execute(sql.Python.query_python_log, params)
         cursor.row_factory = sqlite3.Row
 
         return cursor
@@ -99,17 +406,217 @@ class Database:
         params = {
             "mark_id": mark_id,
         }
-        cursor = self._db.execute(sql.Python.query_python_log_by_mark_id, params)
+        cursor = self._execute(sql.Python.query_python_log_by_mark_id, params)
         cursor.row_factory = sqlite3.Row
 
         return cursor
 
+    def query_code_marks(self):
+        "Returns enter and exit events of all marks"
+        cursor = self._execute(sql.Python.query_marks)
+        return cursor
+
+    def insert_code_span(self, d: model.CodeSpan):
+        self._write(sql.CodeSpans.insert_span, d._asdict())
+
+    def has_code_spans(self) -> bool:
+        return self.has_table("code_spans")
+
+    def query_code_spans_top(self, begin: int, end: int, mark_id: int):
+        """
+        Returns rows `(mark_id, begin_event, end_event)` of spans inside
+        `[begin; end)` which are not nested in another span inside of it
+        (nor in the span `mark_id`), ordered by begin.
+        """
+        params = dict(begin=begin, end=end, mark_id=mark_id)
+        return self._execute(sql.CodeSpans.query_top_spans, params)
+
+    def query_code_spans(self) -> List[model.CodeSpan]:
+        "Returns all code spans ordered by begin"
+        if not self.has_code_spans():
+            return self._replay_code_spans()
+        cursor = self._execute(sql.CodeSpans.query_spans)
+        return [model.CodeSpan(*row) for row in cursor]
+
+    def _replay_code_spans(self) -> List[model.CodeSpan]:
+        # databases created before the code_spans table existed,
+        # marks are paired the same way as in `PythonReactor`
+        spans = []
+        stacks: Dict[int, list] = {}
+        cursor = self._execute(sql.CodeSpans.query_marks_replay)
+        for event_ident, command, mark_id, tid in cursor:
+            stack = stacks.setdefault(tid, [])
+            if command == "mark-code-enter":
+                stack.append((mark_id, event_ident))
+                continue
+            marks = [m for m, _ in stack]
+            if mark_id not in marks:
+                continue
+            index = len(marks) - 1 - marks[::-1].index(mark_id)
+            begin_event = stack[index][1]
+            del stack[index:]
+            parent = stack[-1][0] if len(stack) > 0 else None
+            span = model.CodeSpan(
+                mark_id, begin_event, event_ident, len(stack), parent, tid
+            )
+            spans.append(span)
+        spans.sort(key=lambda span: span.begin_event)
+        return spans
+
+    def has_table(self, name: str) -> bool:
+        return name in self._tables
+
+    def insert_devmem_checkpoint(self, d: model.DevMemCheckpoint):
+        row = {
+            "event_ident": d.event_ident,
+            "count": len(d.idents),
+            "idents": _encode_idents(d.idents),
+        }
+        self._write(sql.Checkpoints.insert_checkpoint, row)
+
+    def query_devmem_checkpoint(
+        self, event_ident: int
+    ) -> Optional[model.DevMemCheckpoint]:
+        if not self.has_table("devmem_checkpoints"):
+            return None
+        cursor = self._execute(
+            sql.Checkpoints.query_nearest_checkpoint, dict(event_ident=event_ident)
+        )
+        for event_ident, idents in cursor:
+            return model.DevMemCheckpoint(
+                event_ident=event_ident, idents=_decode_idents(idents)
+            )
+        return None
+
+    def query_live_buffer_idents(self, event_ident: int) -> List[int]:
+        """
+        Returns sorted idents of buffers which are live right after the event
+        `event_ident`. Starts from the nearest checkpoint and replays the rest.
+
+        An allocation at the address of a live buffer implicitly frees it,
+        like `DevMemManager` does during creation.
+        """
+        checkpoint = self.query_devmem_checkpoint(event_ident)
+        live: Dict[int, int] = {}  # addr -> ident
+        if checkpoint is None:
+            begin = 0
+        else:
+            begin = checkpoint.event_ident
+            for ident, addr, *_ in self.query_buffers_by_idents(checkpoint.idents):
+                live[addr] = ident
+
+        cursor = self._execute(
+            sql.Checkpoints.query_devmem_buf_tail,
+            dict(begin=begin, end=event_ident + 1),
+        )
+        for _, is_allocation, ident, addr in cursor:
+            if is_allocation:
+                live[addr] = ident
+            elif live.get(addr, None) == ident:
+                del live[addr]
+
+        return sorted(live.values())
+
+    def insert_devmem_usage(self, d: model.DevMemUsage):
+        self._write(sql.Usage.insert_usage, d._asdict())
+
+    def query_allocator_usage(self, begin: int, end: int):
+        if not self.has_table("devmem_usage"):
+            return self._replay_allocator_usage(begin, end)
+        return self._execute(sql.Usage.query_usage, dict(begin=begin, end=end))
+
+    def iter_allocator_usage(self, begin: int, end: int, chunk_size: int):
+        if not self.has_table("devmem_usage"):
+            return self._chunked(self._replay_allocator_usage(begin, end), chunk_size)
+        return self._iter_pages(sql.Usage.query_usage, {}, begin, end, chunk_size)
+
+    @staticmethod
+    def _chunked(rows, chunk_size: int):
+        if chunk_size <= 0:
+            raise ValueError(f"Invalid chunk size: {chunk_size}")
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if len(chunk) == 0:
+                return
+            yield chunk
+
+    def _replay_allocator_usage(self, begin: int, end: int):
+        # databases created before the devmem_usage table existed, an allocation
+        # at the address of a live buffer implicitly frees it
+        live_bytes, live_count, unknown_bytes, unknown_count = 0, 0, 0, 0
+        live: Dict[int, tuple] = {}  # addr -> (size, unknown)
+        cursor = self._execute(sql.Usage.query_devmem_bufs_replay, dict(end=end))
+        for event_ident, is_allocation, addr, size, unknown in cursor:
+            changes = []
+            if addr in live:
+                changes.append((-1,) + live.pop(addr))
+            if is_allocation:
+                live[addr] = (size, unknown)
+                changes.append((1, size, unknown))
+            for sign, size, unknown in changes:
+                live_bytes += sign * size
+                live_count += sign
+                if unknown:
+                    unknown_bytes += sign * size
+                    unknown_count += sign
+            if begin <= event_ident:
+                yield event_ident, live_bytes, live_count, unknown_bytes, unknown_count
+
+    def insert_series_levels(self, buckets: List[model.SeriesLevelBucket]):
+        self._executemany(sql.SeriesLevels.insert_level, buckets)
+
+    def has_series_levels(self) -> bool:
+        """
+        Levels are built when the database is closed, so a database which is
+        still being written has none yet.
+        """
+        if not self.has_table("series_levels"):
+            return False
+        return bool(self._execute(sql.SeriesLevels.has_levels).fetchone()[0])
+
+    def query_series_level(self, series: str, level: int, begin: int, end: int):
+        """
+        Returns rows `(bucket, min, max, last)` of given downsampling level
+        covering events `[begin; end)`, or None if the database has no levels.
+        """
+        if not self.has_series_levels():
+            return None
+        width = model.series_level_width(level)
+        params = dict(
+            series=series,
+            level=level,
+            begin=begin // width,
+            end=(end - 1) // width,
+        )
+        return self._execute(sql.SeriesLevels.query_level, params)
+
+    def query_buffers_by_idents(self, idents: List[int]):
+        params = {
+            "idents": msgspec.json.encode(idents).decode(),
+        }
+        return self._execute(sql.Buffers.query_buffers_by_idents, params)
+
+    def query_buffers_attribution_by_idents(self, idents: List[int]):
+        """
+        Returns `(ident, meta, synapse_name)` of given buffers, the synapse name
+        comes from the first launch of the buffer (None if never launched).
+        """
+        params = {
+            "idents": msgspec.json.encode(idents).decode(),
+        }
+        if self.has_table("launch_layouts"):
+            query = sql.Buffers.query_buffers_attribution_by_idents
+        else:
+            query = sql.Buffers.query_buffers_attribution_by_idents_legacy
+        return self._execute(query, params)
+
     def insert_data_buffer(self, d: model.DataBuffer):
         row = msgspec.to_builtins(d)
-        row["meta"] = msgspec.json.encode(d.meta).decode()
+        row["meta"] = msgspec.msgpack.encode(d.meta)
         row["unknown"] = d.meta.unknown
         row["addr"] = row["addr"] // 2
-        self._db.execute(sql.Buffers.insert_buffer, row)
+        self._write(sql.Buffers.insert_buffer, row)
 
     def update_data_buffer_events(self, d: model.DataBuffer):
         row = {
@@ -120,15 +627,15 @@ class Database:
             "event_last_launch": d.event_last_launch,
         }
 
-        self._db.execute(sql.Buffers.update_buffer_events, row)
+        self._write(sql.Buffers.update_buffer_events, row)
 
     def update_data_buffer_meta(self, d: model.DataBuffer):
         row = {
             "ident": d.ident,
-            "meta": msgspec.json.encode(d.meta).decode(),
+            "meta": msgspec.msgpack.encode(d.meta),
         }
 
-        self._db.execute(sql.Buffers.update_buffer_meta, row)
+        self._write(sql.Buffers.update_buffer_meta, row)
 
     def update_launch_events(self, d: model.DataRecipeLaunch):
         row = {
@@ -136,52 +643,102 @@ class Database:
             "event_launch": d.event_launch,
             "event_finished": d.event_finished,
         }
-        self._db.execute(sql.Launches.update_launch_events, row)
+        self._write(sql.Launches.update_launch_events, row)
 
     def insert_data_launch(self, d: model.DataRecipeLaunch):
         row = msgspec.to_builtins(d)
         del row["buffers"]
-        row["meta"] = msgspec.json.encode(d.meta).decode()
-        self._db.execute(sql.Launches.insert_launch, row)
+        row["meta"] = msgspec.msgpack.encode(d.meta)
+        # buffers follow positions of the layout, the layout holds the rest
+        idents = [buf.buffer for buf in d.buffers]
+        row["buffer_idents"] = msgspec.json.encode(idents).decode()
+        self._write(sql.Launches.insert_launch, row)
+
+    def insert_launch_layout(self, d: model.DataLaunchLayout):
+        row = {
+            "ident": d.ident,
+            "digest": d.digest,
+            "nbuffers": len(d.buffers),
+        }
+        self._execute(sql.Launches.insert_layout, row)
 
         rows = [
-            (d.ident, buf.buffer, buf.index, buf.offset, buf.synapse_name)
-            for buf in d.buffers
+            (d.ident, position, buf.index, buf.offset, buf.synapse_name)
+            for position, buf in enumerate(d.buffers)
         ]
 
-        self._db.executemany(sql.Launches.insert_launch_buf, rows)
+        self._executemany(sql.Launches.insert_layout_buf, rows)
 
     def query_events(self, begin: int, end: int):
         params = {
             "begin": begin,
             "end": end,
         }
-        return self._db.execute(sql.Query.query_events, params)
+        return self._execute(sql.Query.query_events, params)
+
+    def _iter_pages(
+        self, query: str, params: dict, begin: int, end: int, chunk_size: int
+    ):
+        if chunk_size <= 0:
+            raise ValueError(f"Invalid chunk size: {chunk_size}")
+        query = sql.paged(query)
+        while begin < end:
+            page = dict(params, begin=begin, end=end, limit=chunk_size)
+            rows = self._execute(query, page).fetchall()
+            if len(rows) == 0:
+                return
+            yield rows
+            if len(rows) < chunk_size:
+                return
+            begin = rows[-1][0] + 1
+
+    def iter_events(self, begin: int, end: int, chunk_size: int):
+        """
+        Yields rows of `query_events` in lists of at most `chunk_size` rows.
+        """
+        return self._iter_pages(sql.Query.query_events, {}, begin, end, chunk_size)
 
     def query_number_of_events(self):
-        for r in self._db.execute(sql.Opening.count_events):
+        for r in self._execute(sql.Opening.count_events):
             return r[0]
 
     def query_devmem_summary(self, begin: int, end: int, tag: Optional[str]):
         if tag is None:
-            return self._db.execute(
+            return self._execute(
                 sql.Query.query_devmem_summary, dict(begin=begin, end=end)
             )
         else:
-            return self._db.execute(
+            return self._execute(
                 sql.Query.query_devmem_summary_tag, dict(begin=begin, end=end, tag=tag)
             )
 
+    def iter_devmem_summary(
+        self, begin: int, end: int, tag: Optional[str], chunk_size: int
+    ):
+        if tag is None:
+            query, params = sql.Query.query_devmem_summary, {}
+        else:
+            query, params = sql.Query.query_devmem_summary_tag, dict(tag=tag)
+        return self._iter_pages(query, params, begin, end, chunk_size)
+
     def query_devmem_bufs(self, begin: int, end: int):
-        return self._db.execute(sql.Query.query_devmem_bufs, dict(begin=begin, end=end))
+        return self._execute(sql.Query.query_devmem_bufs, dict(begin=begin, end=end))
+
+    def iter_devmem_bufs(self, begin: int, end: int, chunk_size: int):
+        return self._iter_pages(sql.Query.query_devmem_bufs, {}, begin, end, chunk_size)
 
     def query_devmem_bufs_full(self, begin: int, end: int):
-        return self._db.execute(
+        return self._execute(
             sql.Query.query_devmem_bufs_full, dict(begin=begin, end=end)
         )
 
+    def iter_devmem_bufs_full(self, begin: int, end: int, chunk_size: int):
+        return self._iter_pages(
+            sql.Query.query_devmem_bufs_full, {}, begin, end, chunk_size
+        )
+
     def query_buffers(self):
-        for row in self._db.execute(sql.Buffers.query_buffers):
+        for row in self._execute(sql.Buffers.query_buffers):
             (
                 ident,
                 addr,
@@ -192,7 +749,7 @@ class Database:
                 event_first_launch,
                 event_last_launch,
             ) = row
-            meta = model.DataBufferMeta(**json.loads(meta))
+            meta = self.decode_buffer_meta(meta)
             b = model.DataBuffer(
                 ident=ident,
                 addr=addr * 2,
@@ -206,10 +763,10 @@ class Database:
             yield b
 
     def query_launches(self, begin: int, end: int):
-        return self._db.execute(sql.Query.query_launches, dict(begin=begin, end=end))
+        return self._execute(sql.Query.query_launches, dict(begin=begin, end=end))
 
     def query_launch_by_event_ident(self, event_ident: int):
-        cursor = self._db.execute(
+        cursor = self._execute(
             sql.Launches.query_launch_by_event_id, dict(event_ident=event_ident)
         )
         cursor = list(cursor)
@@ -226,7 +783,7 @@ class Database:
             event_launch,
             event_finished,
         ) = cursor[0]
-        meta = json.loads(meta)
+        meta = self.decode_launch_meta(meta)
 
         return self._finish_query_launch(
             event_ident,
@@ -240,7 +797,7 @@ class Database:
         )
 
     def query_launch_by_launch_id(self, launch_ident: int):
-        cursor = self._db.execute(
+        cursor = self._execute(
             sql.Launches.query_launch_by_launch_id, dict(launch_ident=launch_ident)
         )
         cursor = list(cursor)
@@ -257,7 +814,7 @@ class Database:
             event_launch,
             event_finished,
         ) = cursor[0]
-        meta = json.loads(meta)
+        meta = self.decode_launch_meta(meta)
         return self._finish_query_launch(
             event_ident,
             ident,
@@ -273,13 +830,13 @@ class Database:
         self,
         launch_ident,
     ):
-        cursor = self._db.execute(
+        cursor = self._execute(
             sql.Launches.query_launch_bufs_by_launch_id, dict(launch_ident=launch_ident)
         )
         cursor.row_factory = sqlite3.Row
 
         for row in cursor:
-            meta = model.DataBufferMeta(**json.loads(row["meta"]))
+            meta = self.decode_buffer_meta(row["meta"])
             yield model.DataBuffer(
                 ident=row["ident"],
                 addr=row["addr"] * 2,
@@ -291,6 +848,75 @@ class Database:
                 event_last_launch=row["event_last_launch"],
             )
 
+    def query_launches_full(self, begin: int, end: int):
+        """
+        Returns launches from `[begin; end)` joined with their buffers,
+        one row per launch buffer (launches without buffers give a single row).
+        """
+        if self.has_table("launch_layouts"):
+            query = sql.Launches.query_launches_full
+        else:
+            query = sql.Launches.query_launches_full_legacy
+        return self._execute(query, dict(begin=begin, end=end))
+
+    def query_launches_by_launch_idents(self, launch_idents: List[int]):
+        """
+        Returns list of `(event_ident, model.DataRecipeLaunch)` for given
+        launch idents using a single query.
+        """
+        params = {
+            "launch_idents": msgspec.json.encode(launch_idents).decode(),
+        }
+        if self.has_table("launch_layouts"):
+            query = sql.Launches.query_launches_full_by_launch_idents
+        else:
+            query = sql.Launches.query_launches_full_by_launch_idents_legacy
+        cursor = self._execute(query, params)
+
+        launches = {}
+        for row in cursor:
+            (
+                event_ident,
+                ident,
+                workspace,
+                handle,
+                name,
+                event_launch,
+                event_finished,
+                index,
+                offset,
+                synapse_name,
+                buffer_ident,
+                *_,
+            ) = row
+            if ident not in launches:
+                launch = model.DataRecipeLaunch(
+                    ident=ident,
+                    handle=handle,
+                    workspace=workspace,
+                    buffers=[],
+                    meta=model.DataRecipeLaunchMeta(),
+                    recipe_name=name,
+                    event_finished=event_finished,
+                    event_launch=event_launch,
+                )
+                launches[ident] = (event_ident, launch)
+            if buffer_ident is not None:
+                launch_buffer = model.DataRecipeLaunchBuffer(
+                    buffer=buffer_ident,
+                    offset=offset,
+                    index=index,
+                    synapse_name=synapse_name,
+                )
+                launches[ident][1].buffers.append(launch_buffer)
+
+        result = []
+        for launch_ident in launch_idents:
+            if launch_ident not in launches:
+                raise KeyError(f"Cannot find launch with ident {launch_ident}")
+            result.append(launches[launch_ident])
+        return result
+
     def _finish_query_launch(
         self,
         event_ident: int,
@@ -303,7 +929,7 @@ class Database:
         event_finished,
     ):
         launch_buffers = []
-        cursor = self._db.execute(
+        cursor = self._execute(
             sql.Launches.query_launch_bufs_by_launch_id, dict(launch_ident=ident)
         )
         cursor.row_factory = sqlite3.Row
@@ -331,5 +957,5 @@ class Database:
 
     def cleanup(self):
         self._db.commit()
-        self._db.execute(sql.Initialization.cleanup)
+        self._execute(sql.Initialization.cleanup)
         self._db.commit()
@@ -14,12 +14,17 @@
 # limitations under the License.
 ################################################################################
 
-from typing import NamedTuple, List, Optional
+from typing import NamedTuple, List, Optional, Dict
 import enum
 from datetime import datetime
 import msgspec
 
 
+# Databases of this version and newer store meta and frame-log content
+# as msgpack, older ones as JSON text.
+BINARY_META_VERSION = 20261019
+
+
 class EventKind(enum.IntEnum):
     DEVMEM_BUF = 0
     DEVMEM_SUMMARY = 1
@@ -54,6 +59,53 @@ class DevMemBufFreeEvent(NamedTuple):
     pass
 
 
+class DevMemUsage(NamedTuple):
+    event_ident: int
+    live_bytes: int
+    live_count: int
+    unknown_bytes: int
+    unknown_count: int
+
+
+SERIES_LEVELS_BASE_WIDTH = 64
+SERIES_LEVELS_FACTOR = 4
+SERIES_LEVELS_COUNT = 12
+
+
+def series_level_width(level: int) -> int:
+    "Number of events covered by a single bucket of given downsampling level"
+    return SERIES_LEVELS_BASE_WIDTH * SERIES_LEVELS_FACTOR**level
+
+
+class SeriesLevelBucket(NamedTuple):
+    series: str
+    level: int
+    bucket: int
+    min: int
+    max: int
+    last: int
+
+
+class CodeSpan(NamedTuple):
+    """
+    Code marked with `towl.instrument`: events from `mark-code-enter` to
+    `mark-code-exit` (inclusive). `parent` is the enclosing span of the same
+    thread.
+    """
+
+    mark_id: int
+    begin_event: int
+    end_event: int
+    depth: int
+    parent: Optional[int]
+    tid: int
+
+
+class DevMemCheckpoint(NamedTuple):
+    event_ident: int
+    idents: List[int]
+
+
 class FrameInfo(msgspec.Struct):
     filename: str
     funcname: str
@@ -99,6 +151,12 @@ class DataRecipeLaunchBuffer(msgspec.Struct):
     synapse_name: str
 
 
+class DataLaunchLayout(msgspec.Struct):
+    ident: int
+    digest: bytes
+    buffers: List[DataRecipeLaunchBuffer]
+
+
 class DataRecipeLaunchMeta(NamedTuple):
     pass
 
@@ -112,12 +170,24 @@ class DataRecipeLaunch(msgspec.Struct):
     recipe_name: str
     event_launch: Optional[int]
     event_finished: Optional[int]
+    layout_ident: Optional[int] = None
 
     @property
     def name(self) -> str:
         return f"LAUNCH_{self.ident}"
 
 
+class FrameVariables(msgspec.Struct):
+    frame: FrameInfo
+    memory: Dict[str, int]
+
+
+class FrameLogContent(msgspec.Struct):
+    "Stack of frame-log event, `memory` maps variables to buffer idents"
+
+    stack: List[FrameVariables]
+
+
 class PythonLogEvent(msgspec.Struct):
     ident: int
     command: str
@@ -125,5 +195,5 @@ class PythonLogEvent(msgspec.Struct):
     funcname: Optional[str]
     filename: Optional[str]
     lineno: Optional[int]
-    content: Optional[str]
+    content: Optional[FrameLogContent]
     mark_id: Optional[int]
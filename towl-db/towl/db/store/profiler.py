@@ -0,0 +1,266 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+
+from collections import deque
+import sqlite3
+import threading
+import time
+from typing import Callable, Deque, Dict, List, NamedTuple, Optional
+
+DEFAULT_SLOW_QUERY_THRESHOLD = 0.1
+
+
+class QueryStats(NamedTuple):
+    "Aggregated timings of a single SQL statement"
+
+    query: str
+    count: int
+    rows: int
+    execute_time: float
+    fetch_time: float
+    max_time: float
+
+    @property
+    def total_time(self) -> float:
+        return self.execute_time + self.fetch_time
+
+
+class SlowQuery(NamedTuple):
+    query: str
+    params: object
+    time: float
+    rows: int
+    plan: List[str]
+
+
+class _Execution:
+    __slots__ = ["query", "params", "execute_time", "fetch_time", "rows", "finished"]
+
+    def __init__(self, query: str, params, execute_time: float):
+        self.query = query
+        self.params = params
+        self.execute_time = execute_time
+        self.fetch_time = 0.0
+        self.rows = 0
+        self.finished = False
+
+
+class ProfiledCursor:
+    """
+    Wraps `sqlite3.Cursor` and measures time spent fetching rows. The statement
+    is accounted when executed, fetch time and rows as they are fetched, so
+    cursors which are not read to the end are accounted too.
+    """
+
+    def __init__(
+        self,
+        profiler: "QueryProfiler",
+        cursor: sqlite3.Cursor,
+        execution: _Execution,
+    ):
+        self._profiler = profiler
+        self._cursor = cursor
+        self._execution = execution
+
+    @property
+    def row_factory(self):
+        return self._cursor.row_factory
+
+    @row_factory.setter
+    def row_factory(self, value):
+        self._cursor.row_factory = value
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        begin = time.perf_counter()
+        try:
+            row = next(self._cursor)
+        except StopIteration:
+            self._fetched(begin, 0, True)
+            raise
+        self._fetched(begin, 1, False)
+        return row
+
+    def fetchone(self):
+        begin = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(begin, 0 if row is None else 1, row is None)
+        return row
+
+    def fetchmany(self, size: Optional[int] = None):
+        begin = time.perf_counter()
+        if size is None:
+            size = self._cursor.arraysize
+        rows = self._cursor.fetchmany(size)
+        self._fetched(begin, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        begin = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(begin, len(rows), True)
+        return rows
+
+    def close(self):
+        self._cursor.close()
+        self._profiler._finish(self._execution)
+
+    def __del__(self):
+        self._profiler._finish(self._execution)
+
+    def _fetched(self, begin: float, rows: int, done: bool):
+        self._profiler._fetched(self._execution, time.perf_counter() - begin, rows)
+        if done:
+            self._profiler._finish(self._execution)
+
+
+class QueryProfiler:
+    """
+    Collects timings of every SQL statement executed by `Database` opened
+    with `profile=True`.
+
+    Statements which take longer than `slow_query_threshold` seconds (execution
+    and fetching together) are kept with their `EXPLAIN QUERY PLAN`. The plan
+    is asked for when slow queries are read, on the connection returned by
+    `connection` for the reading thread.
+    """
+
+    def __init__(
+        self,
+        slow_query_threshold: float = DEFAULT_SLOW_QUERY_THRESHOLD,
+        connection: Optional[Callable[[], sqlite3.Connection]] = None,
+    ):
+        self._slow_query_threshold = slow_query_threshold
+        self._connection = connection
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stats: Dict[str, List] = {}
+            self._slow_queries: List[SlowQuery] = []
+            # slow executions not explained yet, appended without the lock
+            # as cursors may be finished from `__del__`
+            self._unexplained: Deque[_Execution] = deque()
+            self._total_time = 0.0
+
+    def execute(self, db: sqlite3.Connection, query: str, params) -> ProfiledCursor:
+        begin = time.perf_counter()
+        cursor = db.execute(query, params)
+        execution = _Execution(query, params, time.perf_counter() - begin)
+        self._start(execution)
+        if cursor.description is None:
+            # statements without result (INSERT, UPDATE, ...) are done already
+            self._fetched(execution, 0.0, max(cursor.rowcount, 0))
+            self._finish(execution)
+        return ProfiledCursor(self, cursor, execution)
+
+    def executemany(self, db: sqlite3.Connection, query: str, rows) -> sqlite3.Cursor:
+        begin = time.perf_counter()
+        cursor = db.executemany(query, rows)
+        execution = _Execution(query, None, time.perf_counter() - begin)
+        self._start(execution)
+        self._fetched(execution, 0.0, max(cursor.rowcount, 0))
+        self._finish(execution)
+        return cursor
+
+    def _start(self, execution: _Execution):
+        with self._lock:
+            stats = self._stats.setdefault(execution.query, [0, 0, 0.0, 0.0, 0.0])
+            stats[0] += 1
+            stats[2] += execution.execute_time
+            stats[4] = max(stats[4], execution.execute_time)
+            self._total_time += execution.execute_time
+
+    def _fetched(self, execution: _Execution, fetch_time: float, rows: int):
+        execution.fetch_time += fetch_time
+        execution.rows += rows
+        total = execution.execute_time + execution.fetch_time
+        with self._lock:
+            stats = self._stats.setdefault(execution.query, [0, 0, 0.0, 0.0, 0.0])
+            stats[1] += rows
+            stats[3] += fetch_time
+            stats[4] = max(stats[4], total)
+            self._total_time += fetch_time
+
+    def _finish(self, execution: _Execution):
+        # cursor is exhausted, closed or dropped, only slow queries are left
+        if execution.finished:
+            return
+        execution.finished = True
+
+        total = execution.execute_time + execution.fetch_time
+        if total >= self._slow_query_threshold and execution.params is not None:
+            self._unexplained.append(execution)
+
+    def _explain(self, query: str, params) -> List[str]:
+        if self._connection is None:
+            return ["cannot explain: no connection"]
+        try:
+            db = self._connection()
+            plan = db.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        except (sqlite3.Error, RuntimeError) as e:
+            return [f"cannot explain: {e}"]
+        return [row[-1] for row in plan]
+
+    @property
+    def total_time(self) -> float:
+        "Time spent in SQLite: executing statements and fetching rows"
+        return self._total_time
+
+    @property
+    def slow_queries(self) -> List[SlowQuery]:
+        with self._lock:
+            while len(self._unexplained) > 0:
+                execution = self._unexplained.popleft()
+                slow = SlowQuery(
+                    query=execution.query,
+                    params=execution.params,
+                    time=execution.execute_time + execution.fetch_time,
+                    rows=execution.rows,
+                    plan=self._explain(execution.query, execution.params),
+                )
+                self._slow_queries.append(slow)
+            return list(self._slow_queries)
+
+    def report(self) -> List[QueryStats]:
+        "Returns statistics of all statements, the most expensive first"
+        with self._lock:
+            result = [QueryStats(query, *stats) for query, stats in self._stats.items()]
+        result.sort(key=lambda x: x.total_time, reverse=True)
+        return result
+
+    def format_report(self, top: int = 20) -> str:
+        lines = []
+        for stats in self.report()[:top]:
+            query = " ".join(stats.query.split())
+            lines.append(
+                f"{stats.total_time:10.4f}s {stats.count:8} calls {stats.rows:10} rows"
+                f"  (execute {stats.execute_time:.4f}s, fetch {stats.fetch_time:.4f}s)"
+                f"  {query}"
+            )
+        for slow in self.slow_queries:
+            query = " ".join(slow.query.split())
+            lines.append(f"SLOW {slow.time:.4f}s {slow.rows} rows: {query}")
+            for detail in slow.plan:
+                lines.append(f"    {detail}")
+        return "\n".join(lines)
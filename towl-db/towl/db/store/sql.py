@@ -42,7 +42,7 @@ class Initialization:
             ( ident INTEGER PRIMARY KEY
             , addr INTEGER NOT NULL
             , size INTEGER NOT NULL
-            , meta TEXT NOT NULL
+            , meta BLOB NOT NULL
             , unknown BOOLEAN NOT NULL
             , event_malloc INTEGER
             , event_free INTEGER
@@ -68,25 +68,38 @@ class Initialization:
             )
         ;
 
-        CREATE TABLE data_launches
+        CREATE TABLE launch_layouts
             ( ident INTEGER PRIMARY KEY
-            , workspace INTEGER NOT NULL
-            , handle INTEGER NOT NULL
-            , recipe_name TEXT NOT NULL
-            , meta TEXT NOT NULL
-            , event_launch INTEGER
-            , event_finished INTEGER
+            , digest BLOB NOT NULL
+            , nbuffers INTEGER NOT NULL
             )
         ;
 
-        CREATE TABLE data_launches_bufs
-            ( launch_ident INTEGER NOT NULL
-            , buffer_ident INTEGER NOT NULL
+        CREATE TABLE launch_layouts_bufs
+            ( layout_ident INTEGER NOT NULL
+            , position INTEGER NOT NULL
             , [index] INTEGER NOT NULL
             , offset INTEGER NOT NULL
             , synapse_name TEXT
-            , FOREIGN KEY (launch_ident) REFERENCES data_launches(ident)
-            , FOREIGN KEY (buffer_ident) REFERENCES data_buffers(ident)
+            , FOREIGN KEY (layout_ident) REFERENCES launch_layouts(ident)
+            )
+        ;
+
+        CREATE INDEX launch_layouts_bufs_layout_ident
+            ON launch_layouts_bufs(layout_ident)
+        ;
+
+        CREATE TABLE data_launches
+            ( ident INTEGER PRIMARY KEY
+            , workspace INTEGER NOT NULL
+            , handle INTEGER NOT NULL
+            , recipe_name TEXT NOT NULL
+            , meta BLOB NOT NULL
+            , event_launch INTEGER
+            , event_finished INTEGER
+            , layout_ident INTEGER
+            , buffer_idents TEXT
+            , FOREIGN KEY (layout_ident) REFERENCES launch_layouts(ident)
             )
         ;
 
@@ -104,10 +117,51 @@ class Initialization:
             , funcname TEXT
             , filename TEXT
             , lineno INT
-            , content TEXT
+            , content BLOB
             , mark_id INT
             )
         ;
+
+        CREATE TABLE devmem_checkpoints
+            ( event_ident INTEGER PRIMARY KEY
+            , count INTEGER NOT NULL
+            , idents BLOB NOT NULL
+            )
+        ;
+
+        CREATE TABLE devmem_usage
+            ( event_ident INTEGER PRIMARY KEY
+            , live_bytes INTEGER NOT NULL
+            , live_count INTEGER NOT NULL
+            , unknown_bytes INTEGER NOT NULL
+            , unknown_count INTEGER NOT NULL
+            )
+        ;
+
+        CREATE TABLE series_levels
+            ( series TEXT NOT NULL
+            , level INTEGER NOT NULL
+            , bucket INTEGER NOT NULL
+            , min INTEGER NOT NULL
+            , max INTEGER NOT NULL
+            , last INTEGER NOT NULL
+            , PRIMARY KEY (series, level, bucket)
+            ) WITHOUT ROWID
+        ;
+
+        CREATE TABLE code_spans
+            ( mark_id INTEGER PRIMARY KEY
+            , begin_event INTEGER NOT NULL
+            , end_event INTEGER NOT NULL
+            , depth INTEGER NOT NULL
+            , parent INTEGER
+            , tid INTEGER
+            )
+        ;
+
+        CREATE INDEX code_spans_begin_event
+            ON code_spans (begin_event, end_event)
+        ;
     """
 
     create_views = """
@@ -151,19 +205,23 @@ class Initialization:
 
         CREATE VIEW view_launches_bufs AS
         SELECT 
-            data_launches_bufs.launch_ident,
-            data_launches_bufs.offset,
-            data_launches_bufs.[index],
-            data_launches_bufs.synapse_name,
+            data_launches.ident AS launch_ident,
+            launch_layouts_bufs.offset,
+            launch_layouts_bufs.[index],
+            launch_layouts_bufs.synapse_name,
             data_buffers.ident,
             data_buffers.addr, data_buffers.size,
             data_buffers.unknown, data_buffers.meta,
             data_buffers.event_malloc, data_buffers.event_free,
             data_buffers.event_first_launch, data_buffers.event_last_launch
         FROM
-            data_launches_bufs
+            data_launches
+        INNER JOIN launch_layouts_bufs
+            ON launch_layouts_bufs.layout_ident = data_launches.layout_ident
+        INNER JOIN json_each(data_launches.buffer_idents) AS launch_bufs
+            ON launch_bufs.key = launch_layouts_bufs.position
         INNER JOIN data_buffers
-            ON data_buffers.ident = data_launches_bufs.buffer_ident
+            ON data_buffers.ident = launch_bufs.value
         ORDER BY [index]
         ;
 
@@ -185,7 +243,7 @@ class Initialization:
         INSERT INTO meta
             (version)
         VALUES
-            (20240206)
+            (20261019)
         ;
     """
 
@@ -219,14 +277,88 @@ class Opening:
         PRAGMA journal_mode = OFF;
     """
 
+    xconfigure_wal = """
+        PRAGMA foreign_keys = ON;
+        PRAGMA journal_mode = WAL;
+        PRAGMA synchronous = NORMAL;
+        PRAGMA wal_autocheckpoint = 0;
+    """
+
+    wal_checkpoint = """
+        PRAGMA wal_checkpoint(PASSIVE)
+    """
+
+    wal_finish = """
+        PRAGMA wal_checkpoint(TRUNCATE);
+        PRAGMA journal_mode = DELETE;
+    """
+
     configure = """
         PRAGMA foreign_keys = ON;
     """
 
+    configure_read_only = """
+        PRAGMA query_only = ON;
+        PRAGMA mmap_size = 17179869184;
+        PRAGMA cache_size = -262144;
+    """
+
     count_events = """
         SELECT COUNT(*) from events
     """
 
+    list_tables = """
+        SELECT name FROM sqlite_master WHERE type IN ('table', 'view')
+    """
+
+
+class Materialization:
+    """
+    Denormalized copies of the per-kind views, clustered by `event_ident`.
+    Columns are taken from the views, so older databases can be materialized too.
+    """
+
+    kinds = ["devmem_buf", "devmem_summary", "launches", "pythonlog"]
+
+    query_columns = """
+        SELECT * FROM view_{kind} LIMIT 0
+    """
+
+    create_table = """
+        CREATE TABLE mat_{kind}
+            ( event_ident INTEGER PRIMARY KEY
+            , {columns}
+            ) WITHOUT ROWID
+    """
+
+    fill_table = """
+        INSERT INTO mat_{kind}
+            (event_ident, {columns})
+        SELECT event_ident, {columns} FROM view_{kind}
+        ORDER BY event_ident
+    """
+
+    drop_view = """
+        DROP VIEW view_{kind}
+    """
+
+    create_view = """
+        CREATE VIEW view_{kind} AS
+        SELECT event_ident, {columns} FROM mat_{kind}
+        ORDER BY event_ident
+    """
+
+    # Buffer meta is big and rarely needed, so it is not copied. Queries which
+    # do not use it never touch data_buffers.
+    create_view_devmem_buf = """
+        CREATE VIEW view_devmem_buf AS
+        SELECT mat_devmem_buf.event_ident, {columns}
+        FROM mat_devmem_buf
+        LEFT JOIN data_buffers
+            ON data_buffers.ident = mat_devmem_buf.ident
+        ORDER BY mat_devmem_buf.event_ident
+    """
+
 
 class EventsInserting:
     insert_devmem_summary = """
@@ -275,18 +407,135 @@ class Buffers:
         WHERE ident = :ident
     """
 
+    query_buffers_by_idents = """
+        SELECT ident, addr, size,
+            event_malloc, event_free, event_first_launch, event_last_launch,
+            unknown FROM data_buffers
+        WHERE ident IN (SELECT value FROM json_each(:idents))
+        ORDER BY ident
+    """
+
+    # synapse name of a buffer is taken from the layout of its first launch
+    _select_buffers_attribution = """
+        SELECT data_buffers.ident, data_buffers.meta,
+            (
+                SELECT bufs.synapse_name
+                FROM events
+                INNER JOIN data_launches
+                    ON events.reference = data_launches.ident
+                    AND events.kind = 2
+                {bufs_join}
+                WHERE events.ident = data_buffers.event_first_launch
+                    AND {buffer_ident} = data_buffers.ident
+                LIMIT 1
+            ) AS synapse_name
+        FROM data_buffers
+        WHERE data_buffers.ident IN (SELECT value FROM json_each(:idents))
+        ORDER BY data_buffers.ident
+    """
+
+    query_buffers_attribution_by_idents = _select_buffers_attribution.format(
+        bufs_join="""
+                INNER JOIN launch_layouts_bufs AS bufs
+                    ON bufs.layout_ident = data_launches.layout_ident
+                INNER JOIN json_each(data_launches.buffer_idents) AS launch_bufs
+                    ON launch_bufs.key = bufs.position
+        """,
+        buffer_ident="launch_bufs.value",
+    )
+
+    # databases created before launch layouts were introduced
+    query_buffers_attribution_by_idents_legacy = _select_buffers_attribution.format(
+        bufs_join="""
+                INNER JOIN data_launches_bufs AS bufs
+                    ON bufs.launch_ident = data_launches.ident
+        """,
+        buffer_ident="bufs.buffer_ident",
+    )
+
+
+class Checkpoints:
+    insert_checkpoint = """
+        INSERT INTO devmem_checkpoints
+            (event_ident, count, idents)
+        VALUES
+            (:event_ident, :count, :idents)
+    """
+
+    query_nearest_checkpoint = """
+        SELECT event_ident, idents FROM devmem_checkpoints
+        WHERE event_ident <= :event_ident
+        ORDER BY event_ident DESC
+        LIMIT 1
+    """
+
+    query_devmem_buf_tail = """
+        SELECT event_ident, is_allocation, ident, addr FROM view_devmem_buf
+        WHERE :begin <= event_ident AND event_ident < :end
+        ORDER BY event_ident
+    """
+
+
+class Usage:
+    insert_usage = """
+        INSERT INTO devmem_usage
+            (event_ident, live_bytes, live_count, unknown_bytes, unknown_count)
+        VALUES
+            (:event_ident, :live_bytes, :live_count, :unknown_bytes, :unknown_count)
+    """
+
+    query_usage = """
+        SELECT event_ident, live_bytes, live_count, unknown_bytes, unknown_count
+        FROM devmem_usage
+        WHERE :begin <= event_ident AND event_ident < :end
+        ORDER BY event_ident
+    """
+
+    query_devmem_bufs_replay = """
+        SELECT event_ident, is_allocation, addr, size, unknown FROM view_devmem_buf
+        WHERE event_ident < :end
+        ORDER BY event_ident
+    """
+
+
+class SeriesLevels:
+    insert_level = """
+        INSERT INTO series_levels
+            (series, level, bucket, min, max, last)
+        VALUES
+            (?, ?, ?, ?, ?, ?)
+    """
+
+    has_levels = """
+        SELECT EXISTS (SELECT 1 FROM series_levels)
+    """
+
+    query_level = """
+        SELECT bucket, min, max, last FROM series_levels
+        WHERE series = :series AND level = :level
+            AND :begin <= bucket AND bucket <= :end
+        ORDER BY bucket
+    """
+
 
 class Launches:
     insert_launch = """
         INSERT INTO data_launches
-            (ident, workspace, handle, meta, recipe_name, event_launch, event_finished)
+            (ident, workspace, handle, meta, recipe_name, event_launch, event_finished, layout_ident, buffer_idents)
+        VALUES
+            (:ident, :workspace, :handle, :meta, :recipe_name, :event_launch, :event_finished, :layout_ident, :buffer_idents)
+    """
+
+    insert_layout = """
+        INSERT INTO launch_layouts
+            (ident, digest, nbuffers)
         VALUES
-            (:ident, :workspace, :handle, :meta, :recipe_name, :event_launch, :event_finished)
+            (:ident, :digest, :nbuffers)
     """
 
-    insert_launch_buf = """
-        INSERT INTO data_launches_bufs
-            (launch_ident, buffer_ident, [index], offset, synapse_name)
+    insert_layout_buf = """
+        INSERT INTO launch_layouts_bufs
+            (layout_ident, position, [index], offset, synapse_name)
         VALUES
             (?, ?, ?, ?, ?)
     """
@@ -320,6 +569,72 @@ class Launches:
         WHERE launch_ident = :launch_ident
     """
 
+    _select_launches_full = """
+        SELECT
+            events.ident AS event_ident,
+            data_launches.ident, data_launches.workspace, data_launches.handle,
+            data_launches.recipe_name,
+            data_launches.event_launch, data_launches.event_finished,
+            bufs.[index], bufs.offset, bufs.synapse_name,
+            data_buffers.ident, data_buffers.addr, data_buffers.size,
+            data_buffers.unknown
+        FROM events
+        INNER JOIN data_launches
+            ON events.reference = data_launches.ident
+            AND events.kind = 2
+        {bufs_join}
+        LEFT JOIN data_buffers
+            ON data_buffers.ident = {buffer_ident}
+    """
+
+    # layouts are shared by launches, buffers of a launch are stored in
+    # `buffer_idents` in the order of layout positions
+    _join_layouts_bufs = dict(
+        bufs_join="""
+        LEFT JOIN launch_layouts_bufs AS bufs
+            ON bufs.layout_ident = data_launches.layout_ident
+        LEFT JOIN json_each(data_launches.buffer_idents) AS launch_bufs
+            ON launch_bufs.key = bufs.position
+        """,
+        buffer_ident="launch_bufs.value",
+    )
+
+    # databases created before launch layouts were introduced
+    _join_legacy_bufs = dict(
+        bufs_join="""
+        LEFT JOIN data_launches_bufs AS bufs
+            ON bufs.launch_ident = data_launches.ident
+        """,
+        buffer_ident="bufs.buffer_ident",
+    )
+
+    _where_timerange = """
+        WHERE :begin <= events.ident AND events.ident < :end
+        ORDER BY events.ident, bufs.[index]
+    """
+
+    _where_launch_idents = """
+        WHERE data_launches.ident IN (SELECT value FROM json_each(:launch_idents))
+        ORDER BY events.ident, bufs.[index]
+    """
+
+    query_launches_full = (
+        _select_launches_full.format(**_join_layouts_bufs) + _where_timerange
+    )
+
+    query_launches_full_legacy = (
+        _select_launches_full.format(**_join_legacy_bufs) + _where_timerange
+    )
+
+    query_launches_full_by_launch_idents = (
+        _select_launches_full.format(**_join_layouts_bufs)
+        + _where_launch_idents
+    )
+
+    query_launches_full_by_launch_idents_legacy = (
+        _select_launches_full.format(**_join_legacy_bufs) + _where_launch_idents
+    )
+
 
 class Python:
     insert_python = """
@@ -344,6 +659,48 @@ class Python:
         ORDER BY event_ident
     """
 
+    query_marks = """
+        SELECT event_ident, command, funcname, filename, lineno, mark_id
+        FROM view_pythonlog
+        WHERE command IN ('mark-code-enter', 'mark-code-exit')
+        ORDER BY event_ident
+    """
+
+
+class CodeSpans:
+    insert_span = """
+        INSERT OR IGNORE INTO code_spans
+            (mark_id, begin_event, end_event, depth, parent, tid)
+        VALUES
+            (:mark_id, :begin_event, :end_event, :depth, :parent, :tid)
+    """
+
+    # Spans inside [begin; end) not nested in another span starting inside
+    # of it; the span `mark_id` itself (if it is the range) is skipped.
+    query_top_spans = """
+        SELECT s.mark_id, s.begin_event, s.end_event
+        FROM code_spans AS s
+        LEFT JOIN code_spans AS p ON p.mark_id = s.parent
+        WHERE :begin <= s.begin_event AND s.end_event < :end
+            AND s.mark_id != :mark_id
+            AND (p.mark_id IS NULL OR p.begin_event < :begin OR p.mark_id = :mark_id)
+        ORDER BY s.begin_event
+    """
+
+    query_spans = """
+        SELECT mark_id, begin_event, end_event, depth, parent, tid
+        FROM code_spans
+        ORDER BY begin_event
+    """
+
+    query_marks_replay = """
+        SELECT view_pythonlog.event_ident, command, mark_id, events.tid
+        FROM view_pythonlog
+        INNER JOIN events ON events.ident = view_pythonlog.event_ident
+        WHERE command IN ('mark-code-enter', 'mark-code-exit')
+        ORDER BY view_pythonlog.event_ident
+    """
+
 
 class Query:
     query_events = """
@@ -375,6 +732,7 @@ class Query:
             event_malloc, event_free, event_first_launch, event_last_launch,
             unknown FROM view_devmem_buf
         WHERE :begin <= event_ident AND event_ident < :end
+        ORDER BY event_ident
     """
 
     query_devmem_bufs_full = """
@@ -382,3 +740,14 @@ class Query:
         WHERE :begin <= event_ident AND event_ident < :end
         ORDER BY event_ident
     """
+
+
+def paged(query: str) -> str:
+    """
+    Returns `query` limited to `:limit` rows.
+
+    The query has to return `event_ident` as the first column, be ordered by it
+    and bounded by `:begin <= event_ident`, so the next page starts right after
+    the last returned event (keyset pagination).
+    """
+    return f"{query}    LIMIT :limit\n"
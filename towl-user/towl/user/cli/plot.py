@@ -30,5 +30,5 @@ def plot_cli():
 def cudamemviz(path: str, output: str):
     scenario = Scenario(path)
     scenario_view = scenario.make_global_view()
-    from towl.user.lib import dump_cudamemviz
-    dump_cudamemviz(scenario_view, '/tmp/cudamemviz.pickle', output)
+    from towl.user.cudamemviz.viewer import render_html
+    render_html(scenario_view, output)
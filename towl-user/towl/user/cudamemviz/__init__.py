@@ -18,5 +18,6 @@ from . import cli
 from . import builder
 from . import model
 from . import extract
+from . import viewer
 from .model import Snapshot
 from .builder import Builder
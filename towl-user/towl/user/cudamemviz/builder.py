@@ -15,12 +15,14 @@
 ################################################################################
 
 from . import model
+from typing import List
 
 
 class Builder:
     def __init__(self):
         self._traces = []
         self._addr_id = {}
+        self._stacks = {}
 
     def _get_addr(self, addr):
         if addr not in self._addr_id:
@@ -28,9 +30,13 @@ class Builder:
             self._addr_id[addr] = ident
         return self._addr_id[addr]
 
-    def finish(self) -> model.Snapshot:
+    def take(self) -> List[model.TraceEntry]:
+        "Returns traces recorded since the last call"
         self._traces, traces = [], self._traces
-        return model.Snapshot(segments=[], device_traces=[traces])
+        return traces
+
+    def finish(self) -> model.Snapshot:
+        return model.Snapshot(segments=[], device_traces=[self.take()])
 
     def _build_frames_bufname(self, bufname):
         if bufname is None:
@@ -56,7 +62,15 @@ class Builder:
 
         return frames
 
-    def _build_frames_stack(self, framess):
+    def _build_frames_stack(self, framess, stack_id=None):
+        if stack_id is None:
+            return self._build_frames_stacks(framess)
+        # frames are shared by all traces with the same stack
+        if stack_id not in self._stacks:
+            self._stacks[stack_id] = self._build_frames_stacks(framess)
+        return self._stacks[stack_id]
+
+    def _build_frames_stacks(self, framess):
         if framess is None or len(framess) == 0:
             return []
         _frames = []
@@ -70,21 +84,28 @@ class Builder:
             _frames.append(frame)
             for frame in frames:
                 _frame = model.Frame(
-                    filename=frame["filename"],
-                    line=frame["line"],
-                    name=frame["funcname"],
+                    filename=frame.filename,
+                    line=frame.line,
+                    name=frame.funcname,
                 )
                 _frames.append(_frame)
 
         return _frames
 
     def record_malloc(
-        self, addr: int, size: int, *, bufname=None, frames=None, events=None
+        self,
+        addr: int,
+        size: int,
+        *,
+        bufname=None,
+        frames=None,
+        events=None,
+        stack_id=None,
     ):
         _frames = []
         _frames += self._build_frames_bufname(bufname)
         _frames += self._build_frames_events(events)
-        _frames += self._build_frames_stack(frames)
+        _frames += self._build_frames_stack(frames, stack_id)
         trace = model.TraceEntry(
             action="alloc",
             addr=self._get_addr(addr),
@@ -118,11 +139,24 @@ class Builder:
         self._traces.append(trace_c)
 
     def record(
-        self, is_allocation, addr, size, *, bufname=None, frames=None, events=None
+        self,
+        is_allocation,
+        addr,
+        size,
+        *,
+        bufname=None,
+        frames=None,
+        events=None,
+        stack_id=None,
     ):
         if is_allocation:
             self.record_malloc(
-                addr, size, bufname=bufname, frames=frames, events=events
+                addr,
+                size,
+                bufname=bufname,
+                frames=frames,
+                events=events,
+                stack_id=stack_id,
             )
         else:
             self.record_free(addr, size, bufname=bufname)
@@ -19,8 +19,6 @@ from . import model
 from . import extract
 import rich_click as click
 from towl.user.utils.file import smart_open
-import os
-import sys
 
 
 @main_cli.group(name="cudamemviz")
@@ -40,19 +38,9 @@ def to_csv(path: str, output: str, device: int):
 @memviz_cli.command()
 @click.argument("path")
 @click.option("--output", "-o", required=True, help="output file")
-def to_html(path: str, output: str):
-    cmd = [
-        sys.executable,
-        "-m",
-        "torch.cuda._memory_viz",
-        "trace_plot",
-        "-o",
-        f"'{output}'",
-        f"'{path}'",
-    ]
-    cmd = " ".join(cmd)
-    print(">", cmd)
-    os.system(cmd)
+@click.option("--device", "-d", help="device index", default=0, type=int)
+def to_html(path: str, output: str, device: int):
+    extract.to_html(path, output, device)
 
 
 @memviz_cli.command()
@@ -63,3 +51,12 @@ def to_html(path: str, output: str):
 @click.option("--device", "-d", help="device index", default=0, type=int)
 def cut(path: str, output: str, begin: int, end: int, device: int):
     extract.cut_and_dump(path, output, begin, end, device)
+
+
+@memviz_cli.command()
+@click.argument("path")
+@click.option("--output", "-o", required=True, help="output file")
+def python_frames(path: str, output: str):
+    "Keeps only frames of Python files"
+    snapshot = extract.python_frames_only(path)
+    model.dump_snapshot_to_file(output, snapshot)
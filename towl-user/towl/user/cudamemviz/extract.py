@@ -15,34 +15,29 @@
 ################################################################################
 
 from . import model
+from . import viewer
 from typing import Union
+import numpy as np
 import pandas as pd
 
 
+def load_columns(inp: Union[str, model.Snapshot]) -> model.SnapshotColumns:
+    "Snapshot files are converted once, see `SnapshotColumns.open`"
+    if type(inp) is str:
+        return model.SnapshotColumns.open(inp)
+    return model.SnapshotColumns.from_snapshot(inp)
+
+
 def extract_memory_usage(
     inp: Union[str, model.Snapshot], device: int = 0
 ) -> pd.DataFrame:
-    if type(inp) is str:
-        snapshot = model.load_snapshot_from_file(inp)
-    else:
-        snapshot = inp
-    traces = model.get_device_traces(snapshot, device)
-
-    allocated_memory = 0
-
-    rows = []
-
-    for trace in traces:
-        if trace["action"] == "alloc":
-            allocated_memory += trace["size"]
-            dump = True
-        elif trace["action"] == "free_completed":
-            allocated_memory -= trace["size"]
-            dump = True
-        else:
-            dump = False
-        if dump:
-            rows.append(allocated_memory)
+    columns = load_columns(inp)
+    traces = columns.device(device)
+
+    is_alloc = traces.action == columns.action_code("alloc")
+    is_free = traces.action == columns.action_code("free_completed")
+    change = np.where(is_alloc, traces.size, -traces.size)
+    rows = np.cumsum(change[is_alloc | is_free])
 
     df = pd.DataFrame(dict(used=rows))
     df["used_gb"] = df["used"] / 1024**3
@@ -50,33 +45,30 @@ def extract_memory_usage(
 
 
 def cut(inp: Union[str, model.Snapshot], begin, end, device=0) -> model.Snapshot:
-    if type(inp) is str:
-        snapshot = model.load_snapshot_from_file(inp)
-    else:
-        snapshot = inp
-    traces = model.get_device_traces(snapshot, device)
-
-    filtered_trace = []
-    index = 0
-    for trace in traces:
-        if trace["action"] == "alloc":
-            dump = True
-        elif trace["action"] == "free_requested":
-            dump = True
-        elif trace["action"] == "free_completed":
-            index -= 1
-            dump = True
-        else:
-            dump = False
-        if dump:
-            if begin <= index and index < end:
-                filtered_trace.append(trace)
-            index += 1
-
+    columns = load_columns(inp)
+    traces = columns.device(device)
+
+    # Allocations and free requests take next index, completed free
+    # takes index of the preceding one.
+    steps = (traces.action == columns.action_code("alloc")) | (
+        traces.action == columns.action_code("free_requested")
+    )
+    is_free = traces.action == columns.action_code("free_completed")
+    index = np.cumsum(steps) - steps - is_free
+    selected = (steps | is_free) & (begin <= index) & (index < end)
+
+    filtered_trace = columns.traces(device, np.flatnonzero(selected))
     snapshot = model.Snapshot(segments=[], device_traces=[filtered_trace])
     return snapshot
 
 
+def python_frames_only(inp: Union[str, model.Snapshot]) -> model.Snapshot:
+    "Returns snapshot with frames limited to Python files"
+    columns = load_columns(inp)
+    columns = columns.filter_frames(lambda filename: filename.endswith(".py"))
+    return columns.to_snapshot()
+
+
 def cut_and_dump(
     inp: Union[str, model.Snapshot], out: str, begin, end, device=0
 ) -> model.Snapshot:
@@ -85,19 +77,5 @@ def cut_and_dump(
     return snapshot
 
 
-def to_html(path: str, output: str):
-    import sys
-    import os
-
-    cmd = [
-        sys.executable,
-        "-m",
-        "torch.cuda._memory_viz",
-        "trace_plot",
-        "-o",
-        f"'{output}'",
-        f"'{path}'",
-    ]
-    cmd = " ".join(cmd)
-    print(">", cmd)
-    os.system(cmd)
+def to_html(path: str, output: str, device: int = 0):
+    viewer.snapshot_to_html(path, output, device)
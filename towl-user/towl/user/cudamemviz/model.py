@@ -14,8 +14,13 @@
 # limitations under the License.
 ################################################################################
 
-from typing import TypedDict, List, Literal
+from typing import Callable, Dict, TypedDict, List, Literal, NamedTuple
+from typing import Optional, Tuple
+import io
+import json
+import os
 import pickle
+import numpy as np
 from towl.user.utils.file import smart_open
 
 
@@ -100,25 +105,425 @@ def dump_snapshot_to_file(path, snapshot: Snapshot):
         pickle.dump(snapshot, fd)
 
 
+class SnapshotWriter:
+    """
+    Writes `Snapshot` with a single device trace to `path` while the traces
+    are produced, so they do not have to be kept in memory.
+
+    ```
+    with SnapshotWriter(path) as writer:
+        for traces in chunks:
+            writer.write(traces)
+    ```
+
+    The file is a single pickle which `load_snapshot_from_file` reads back.
+    Objects shared by traces of one `write` (e.g. frames of the same stack)
+    are stored once.
+    """
+
+    # Protocol 2 memoizes objects under explicit indices, so the memo can be
+    # cleared after every chunk. Protocol 4 numbers them implicitly.
+    PROTOCOL = 2
+
+    def __init__(self, path: str):
+        self._path = path
+        self._fd = None
+        self._buffer = io.BytesIO()
+        self._pickler = pickle.Pickler(self._buffer, protocol=self.PROTOCOL)
+
+    def __enter__(self) -> "SnapshotWriter":
+        self._fd = smart_open(self._path, "wb")
+        self._fd.write(pickle.PROTO + bytes([self.PROTOCOL]))
+        # {"segments": [], "device_traces": [[...
+        self._fd.write(pickle.EMPTY_DICT + pickle.MARK)
+        self._write_object("segments")
+        self._fd.write(pickle.EMPTY_LIST)
+        self._write_object("device_traces")
+        self._fd.write(pickle.EMPTY_LIST + pickle.EMPTY_LIST)
+        return self
+
+    def _write_object(self, obj):
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._pickler.dump(obj)
+        # strip PROTO and STOP of the standalone pickle
+        self._fd.write(self._buffer.getvalue()[2:-1])
+
+    def write(self, traces: List[TraceEntry]):
+        if len(traces) == 0:
+            return
+        self._pickler.clear_memo()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._pickler.dump(list(traces))
+        data = self._buffer.getvalue()
+        # The pickled list starts with PROTO, EMPTY_LIST and BINPUT of the
+        # list itself, items follow as APPEND(S) to the list on top of the
+        # stack. Without the prefix they are appended to the device trace.
+        prefix = pickle.PROTO + bytes([self.PROTOCOL]) + pickle.EMPTY_LIST
+        prefix += pickle.BINPUT + bytes([0])
+        assert data.startswith(prefix) and data.endswith(pickle.STOP)
+        self._fd.write(data[len(prefix) : -1])
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            if exc_type is None:
+                # ...]]}
+                self._fd.write(pickle.APPEND + pickle.SETITEMS + pickle.STOP)
+        finally:
+            self._fd.close()
+            self._fd = None
+
+
+ACTIONS = [
+    "alloc",
+    "free_requested",
+    "free_completed",
+    "segment_alloc",
+    "segment_free",
+    "segment_map",
+    "segment_unmap",
+    "oom",
+    "snapshot",
+]
+
+# optional fields of `TraceEntry`, -1 stands for a missing one
+OPTIONAL_FIELDS = ["addr", "device_free", "time_us"]
+
+# fields stored in columns, the others are kept as they are
+TRACE_FIELDS = {"action", "frames", "size", "stream", *OPTIONAL_FIELDS}
+FRAME_FIELDS = {"filename", "name", "line"}
+
+
+class DeviceColumns(NamedTuple):
+    "Traces of a device, `action` indexes actions and `stack` stacks of columns"
+
+    action: np.ndarray
+    addr: np.ndarray
+    size: np.ndarray
+    stream: np.ndarray
+    device_free: np.ndarray
+    time_us: np.ndarray
+    stack: np.ndarray
+
+
+def _pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [x.encode("utf-8") for x in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(x) for x in encoded], out=offsets[1:])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets
+
+
+def _unpack_strings(data: np.ndarray, offsets: np.ndarray) -> List[str]:
+    data = data.tobytes()
+    offsets = offsets.tolist()
+    return [data[begin:end].decode("utf-8") for begin, end in zip(offsets, offsets[1:])]
+
+
+def _decode_extras(data: bytes) -> Tuple[List[Dict[int, dict]], Dict[int, dict]]:
+    extras = json.loads(data.decode("utf-8"))
+    trace_extras = [{row: extra for row, extra in x} for x in extras["traces"]]
+    frame_extras = {frame: extra for frame, extra in extras["frames"]}
+    return trace_extras, frame_extras
+
+
+class SnapshotColumns:
+    """
+    Device traces of `Snapshot` as arrays, see `DeviceColumns`.
+
+    Frames are stored once: every distinct frame is a row
+    `(filename, name, line)` of `frames` (strings as indices into `strings`)
+    and stack `i` is `stack_frames[stack_offsets[i]:stack_offsets[i + 1]]`.
+
+    Other fields (e.g. `compile_context` of traces) are kept as they are in
+    `trace_extras[device][row]` and `frame_extras[frame]`.
+
+    `SnapshotColumns.open(path)` caches the columns next to the snapshot,
+    the cache holds plain arrays and the extra fields as JSON (snapshots
+    with extra fields JSON can not hold are not cached).
+    """
+
+    CACHE_SUFFIX = ".columns.npz"
+    CACHE_VERSION = 3
+
+    def __init__(
+        self,
+        actions: List[str],
+        devices: List[DeviceColumns],
+        strings: List[str],
+        frames: np.ndarray,
+        stack_offsets: np.ndarray,
+        stack_frames: np.ndarray,
+        trace_extras: Optional[List[Dict[int, dict]]] = None,
+        frame_extras: Optional[Dict[int, dict]] = None,
+    ):
+        self.actions = actions
+        self.devices = devices
+        self.strings = strings
+        self.frames = frames
+        self.stack_offsets = stack_offsets
+        self.stack_frames = stack_frames
+        self.trace_extras = trace_extras or [{} for _ in devices]
+        self.frame_extras = frame_extras or {}
+        self._frame_cache: Dict[int, Frame] = {}
+
+    @staticmethod
+    def from_snapshot(snapshot: Snapshot) -> "SnapshotColumns":
+        actions = list(ACTIONS)
+        action_codes = {action: i for i, action in enumerate(actions)}
+        strings: Dict[str, int] = {}
+        frame_ids: Dict[Tuple, int] = {}
+        stack_ids: Dict[Tuple, int] = {}
+        frames, stack_frames, stack_offsets = [], [], [0]
+        frame_extras: Dict[int, dict] = {}
+
+        def frame_key(frame):
+            key = (frame["filename"], frame["name"], frame["line"])
+            if len(frame) == len(FRAME_FIELDS):
+                return key
+            extra = {k: v for k, v in frame.items() if k not in FRAME_FIELDS}
+            return key + (pickle.dumps(extra),)
+
+        def intern_stack(trace_frames):
+            key = tuple(frame_key(f) for f in trace_frames)
+            stack = stack_ids.get(key, None)
+            if stack is not None:
+                return stack
+            for frame, trace_frame in zip(key, trace_frames):
+                frame_id = frame_ids.get(frame, None)
+                if frame_id is None:
+                    frame_id = frame_ids[frame] = len(frames)
+                    filename, name, line = frame[:3]
+                    filename = strings.setdefault(filename, len(strings))
+                    name = strings.setdefault(name, len(strings))
+                    frames.append((filename, name, line))
+                    if len(frame) > 3:
+                        frame_extras[frame_id] = {
+                            k: v
+                            for k, v in trace_frame.items()
+                            if k not in FRAME_FIELDS
+                        }
+                stack_frames.append(frame_id)
+            stack_offsets.append(len(stack_frames))
+            stack = stack_ids[key] = len(stack_ids)
+            return stack
+
+        devices, trace_extras = [], []
+        for traces in snapshot["device_traces"]:
+            columns = {field: [] for field in DeviceColumns._fields}
+            extras: Dict[int, dict] = {}
+            for row, trace in enumerate(traces):
+                action = trace["action"]
+                if action not in action_codes:
+                    action_codes[action] = len(actions)
+                    actions.append(action)
+                columns["action"].append(action_codes[action])
+                for field in OPTIONAL_FIELDS:
+                    columns[field].append(trace.get(field, -1))
+                columns["size"].append(trace["size"])
+                columns["stream"].append(trace["stream"])
+                columns["stack"].append(intern_stack(trace["frames"]))
+                if not TRACE_FIELDS.issuperset(trace):
+                    extra = {k: v for k, v in trace.items() if k not in TRACE_FIELDS}
+                    extras[row] = extra
+            dtypes = dict(action=np.int16, stack=np.int32)
+            arrays = {
+                field: np.array(values, dtype=dtypes.get(field, np.int64))
+                for field, values in columns.items()
+            }
+            devices.append(DeviceColumns(**arrays))
+            trace_extras.append(extras)
+
+        return SnapshotColumns(
+            actions,
+            devices,
+            list(strings),
+            np.array(frames, dtype=np.int64).reshape(-1, 3),
+            np.array(stack_offsets, dtype=np.int64),
+            np.array(stack_frames, dtype=np.int64),
+            trace_extras,
+            frame_extras,
+        )
+
+    @staticmethod
+    def open(path: str) -> "SnapshotColumns":
+        """
+        Returns columns of the snapshot file `path`. They are cached in
+        `path + CACHE_SUFFIX`, the cache is rebuilt when the snapshot changes.
+        """
+        cache = path + SnapshotColumns.CACHE_SUFFIX
+        stat = os.stat(path)
+        source = np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+        if os.path.exists(cache):
+            try:
+                columns = SnapshotColumns.load(cache, source)
+                if columns is not None:
+                    return columns
+            except (OSError, ValueError, KeyError):
+                pass
+        columns = SnapshotColumns.from_snapshot(load_snapshot_from_file(path))
+        try:
+            columns.save(cache, source)
+        except (OSError, ValueError):
+            # e.g. read-only directory or extra fields JSON can not hold,
+            # the columns are not cached
+            pass
+        return columns
+
+    def save(self, path: str, source: np.ndarray):
+        arrays = dict(
+            version=np.array(self.CACHE_VERSION),
+            source=source,
+            frames=self.frames,
+            stack_offsets=self.stack_offsets,
+            stack_frames=self.stack_frames,
+            devices=np.array(len(self.devices)),
+            extras=np.frombuffer(self._encode_extras(), dtype=np.uint8),
+        )
+        for name in ("actions", "strings"):
+            data, offsets = _pack_strings(getattr(self, name))
+            arrays[f"{name}_data"], arrays[f"{name}_offsets"] = data, offsets
+        for i, device in enumerate(self.devices):
+            for field, values in device._asdict().items():
+                arrays[f"device{i}_{field}"] = values
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as fd:
+            np.savez(fd, **arrays)
+        os.replace(tmp, path)
+
+    def _encode_extras(self) -> bytes:
+        # rows and frames are keys of JSON objects only as strings, so the
+        # extra fields are stored as lists of pairs
+        extras = dict(
+            traces=[sorted(extras.items()) for extras in self.trace_extras],
+            frames=sorted(self.frame_extras.items()),
+        )
+        try:
+            data = json.dumps(extras).encode("utf-8")
+        except TypeError as e:
+            raise ValueError(f"Extra fields are not JSON: {e}")
+        if _decode_extras(data) != (self.trace_extras, self.frame_extras):
+            raise ValueError("Extra fields change in JSON")
+        return data
+
+    @staticmethod
+    def load(path: str, source: np.ndarray) -> Optional["SnapshotColumns"]:
+        "Returns columns saved from the snapshot `source`, None for other one"
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != SnapshotColumns.CACHE_VERSION:
+                return None
+            if not np.array_equal(data["source"], source):
+                return None
+            devices = [
+                DeviceColumns(
+                    **{
+                        field: data[f"device{i}_{field}"]
+                        for field in DeviceColumns._fields
+                    }
+                )
+                for i in range(int(data["devices"]))
+            ]
+            trace_extras, frame_extras = _decode_extras(data["extras"].tobytes())
+            return SnapshotColumns(
+                _unpack_strings(data["actions_data"], data["actions_offsets"]),
+                devices,
+                _unpack_strings(data["strings_data"], data["strings_offsets"]),
+                data["frames"],
+                data["stack_offsets"],
+                data["stack_frames"],
+                trace_extras,
+                frame_extras,
+            )
+
+    def action_code(self, action: str) -> int:
+        "Returns code of the action in `DeviceColumns.action`, -1 if unused"
+        if action not in self.actions:
+            return -1
+        return self.actions.index(action)
+
+    def device(self, device_index: int) -> DeviceColumns:
+        if len(self.devices) <= device_index:
+            raise RuntimeError(f"No device {device_index} in CUDA Snapshot traces")
+        return self.devices[device_index]
+
+    def filter_frames(self, keep: Callable[[str], bool]) -> "SnapshotColumns":
+        "Returns columns with frames of stacks limited to filenames satisfying `keep`"
+        kept_strings = np.array([keep(x) for x in self.strings], dtype=bool)
+        kept_frames = kept_strings[self.frames[:, 0]]
+        kept = kept_frames[self.stack_frames]
+        counts = np.zeros(len(kept) + 1, dtype=np.int64)
+        np.cumsum(kept, out=counts[1:])
+        return SnapshotColumns(
+            self.actions,
+            self.devices,
+            self.strings,
+            self.frames,
+            counts[self.stack_offsets],
+            self.stack_frames[kept],
+            self.trace_extras,
+            self.frame_extras,
+        )
+
+    def _frame(self, frame_id: int) -> Frame:
+        frame = self._frame_cache.get(frame_id, None)
+        if frame is None:
+            filename, name, line = self.frames[frame_id].tolist()
+            frame = Frame(
+                filename=self.strings[filename], line=line, name=self.strings[name]
+            )
+            frame.update(self.frame_extras.get(frame_id, {}))
+            self._frame_cache[frame_id] = frame
+        return frame
+
+    def stack(self, stack: int) -> List[Frame]:
+        begin, end = self.stack_offsets[stack], self.stack_offsets[stack + 1]
+        return [self._frame(frame_id) for frame_id in self.stack_frames[begin:end]]
+
+    def traces(self, device_index: int, rows=None) -> List[TraceEntry]:
+        "Returns traces of the device, only those at `rows` if given"
+        device = self.device(device_index)
+        indices = np.arange(len(device.action))
+        if rows is not None:
+            device = DeviceColumns(*(values[rows] for values in device))
+            indices = indices[rows]
+        extras = self.trace_extras[device_index]
+        traces = []
+        stacks: Dict[int, List[Frame]] = {}
+        optional = [getattr(device, field).tolist() for field in OPTIONAL_FIELDS]
+        columns = zip(
+            device.action.tolist(),
+            device.size.tolist(),
+            device.stream.tolist(),
+            device.stack.tolist(),
+            indices.tolist(),
+            *optional,
+        )
+        for action, size, stream, stack, index, *values in columns:
+            if stack not in stacks:
+                stacks[stack] = self.stack(stack)
+            trace = TraceEntry(
+                action=self.actions[action],
+                frames=list(stacks[stack]),
+                size=size,
+                stream=stream,
+            )
+            for field, value in zip(OPTIONAL_FIELDS, values):
+                if value != -1:
+                    trace[field] = value
+            if index in extras:
+                trace.update(extras[index])
+            traces.append(trace)
+        return traces
+
+    def to_snapshot(self) -> Snapshot:
+        device_traces = [self.traces(i) for i in range(len(self.devices))]
+        return Snapshot(segments=[], device_traces=device_traces)
+
+
 def filter_out_non_python_frames(snapshot: Snapshot):
-    import copy
-    import os
-
-    all_traces = []
-    for traces in snapshot["device_traces"]:
-        new_traces = []
-        for trace in traces:
-            trace = copy.deepcopy(trace)
-            frames = trace["frames"]
-            trace["frames"] = []
-            for frame in frames:
-                fname = frame["filename"]
-                if not fname.endswith(".py"):
-                    continue
-                trace["frames"].append(frame)
-            new_traces.append(trace)
-        all_traces.append(new_traces)
-    return Snapshot(segments=[], device_traces=all_traces)
+    columns = SnapshotColumns.from_snapshot(snapshot)
+    columns = columns.filter_frames(lambda filename: filename.endswith(".py"))
+    return columns.to_snapshot()
 
 
 def get_allocation_sizes(snapshot: Snapshot, device=0):
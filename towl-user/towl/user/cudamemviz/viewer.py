@@ -0,0 +1,281 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+
+"""
+Self-contained HTML viewer of buffer allocations.
+
+Buffers are embedded into the page as base64 encoded typed arrays, so the page
+needs neither torch nor a server, it is rendered directly from a `ScenarioView`
+(`render_html`) or from a snapshot produced by `towl.user.lib.dump_cudamemviz`
+(`snapshot_to_html`).
+"""
+
+from . import model
+from towl.user.data.scenario_view import ScenarioView, DEFAULT_CHUNK_SIZE
+from towl.user.utils.file import smart_open
+from typing import Dict, List, NamedTuple, Tuple, Union
+import base64
+import json
+import os
+import numpy as np
+import pandas as pd
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), "viewer.html")
+
+COLUMNS = [
+    "begin",
+    "end",
+    "size",
+    "ident",
+    "unknown",
+    "stack",
+    "first_launch",
+    "last_launch",
+]
+
+
+class ViewerData(NamedTuple):
+    """
+    Buffers shown by the viewer, `allocations` has a row with `COLUMNS` per
+    buffer. Buffer is live in `[begin; end)` of the time axis, `stack` indexes
+    `stacks` (-1 for none) and missing events are -1.
+    """
+
+    time_label: str
+    begin: int
+    end: int
+    allocations: pd.DataFrame
+    stacks: List[List[str]]
+
+    def usage(self) -> Tuple[np.ndarray, np.ndarray]:
+        "Returns `(times, bytes)` of live memory, it changes only at `times`"
+        begins = self.allocations["begin"].to_numpy(dtype=np.int64)
+        ends = self.allocations["end"].to_numpy(dtype=np.int64)
+        sizes = self.allocations["size"].to_numpy(dtype=np.int64)
+        times = np.concatenate([[self.begin], begins, ends])
+        deltas = np.concatenate([[0], sizes, -sizes])
+        order = np.argsort(times, kind="stable")
+        times, usage = times[order], np.cumsum(deltas[order])
+        last = np.append(times[1:] != times[:-1], True)
+        keep = last & (times < self.end)
+        return times[keep], usage[keep]
+
+    def to_json(self) -> str:
+        arrays = {column: self.allocations[column].to_numpy() for column in COLUMNS}
+        arrays["usage_time"], arrays["usage"] = self.usage()
+        data = dict(
+            time_label=self.time_label,
+            begin=self.begin,
+            end=self.end,
+            arrays={name: _encode(values) for name, values in arrays.items()},
+            stacks=self.stacks,
+        )
+        # the JSON is embedded into <script>
+        return json.dumps(data).replace("</", "<\\/")
+
+
+def _encode(values: np.ndarray) -> str:
+    # JavaScript reads it as Float64Array, integers are exact up to 2**53
+    data = np.ascontiguousarray(values, dtype="<f8").tobytes()
+    return base64.b64encode(data).decode("ascii")
+
+
+def _stack_lines(alloc_frames) -> List[str]:
+    lines = []
+    for i, frames in enumerate(alloc_frames):
+        lines.append(f"======== stack {i}")
+        for frame in frames:
+            lines.append(f"{frame.funcname}  {frame.filename}:{frame.line}")
+    return lines
+
+
+def _match_frees(
+    allocations: pd.DataFrame, frees: pd.DataFrame, begin: int, end: int
+) -> pd.DataFrame:
+    # frees of buffers unknown at the range start begin with it
+    allocations["end"] = end
+    position = pd.Index(allocations["ident"]).get_indexer(frees["ident"])
+    matched = position != -1
+    ends = frees["end"].to_numpy()[matched]
+    allocations.iloc[position[matched], COLUMNS.index("end")] = ends
+    unmatched = frees[~matched].assign(begin=begin)
+    df = pd.concat([allocations, unmatched], ignore_index=True)
+    return df[COLUMNS].astype(np.int64)
+
+
+class _Stacks:
+    # stacks are shared by buffers allocated at the same place
+    def __init__(self):
+        self.stacks: List[List[str]] = []
+        self._index: Dict[Tuple[str, ...], int] = {}
+
+    def add(self, meta) -> int:
+        if len(meta.alloc_frames) == 0:
+            return -1
+        lines = _stack_lines(meta.alloc_frames)
+        index = self._index.setdefault(tuple(lines), len(self.stacks))
+        if index == len(self.stacks):
+            self.stacks.append(lines)
+        return index
+
+
+def _live_at_begin(view: ScenarioView, stacks: _Stacks) -> pd.DataFrame:
+    # buffers allocated before the view and live at its start
+    timerange = view.event_timerange
+    live = view.live_state_at(timerange.begin - 1)
+    metas = view._query_buffers_meta(live.index.tolist())["meta"]
+    return pd.DataFrame(
+        dict(
+            begin=timerange.begin,
+            end=timerange.end,
+            size=live["size"],
+            ident=live.index,
+            unknown=live["unknown"],
+            stack=[stacks.add(meta) for meta in metas.loc[live.index]],
+            first_launch=live["event_first_launch"].astype(np.float64),
+            last_launch=live["event_last_launch"].astype(np.float64),
+        )
+    ).fillna(-1)
+
+
+def viewer_data_from_view(
+    view: ScenarioView, *, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> ViewerData:
+    """
+    Collects buffers live at the start of the view and the ones allocated or
+    freed in it, reading at most `chunk_size` buffer events at a time.
+    """
+    timerange = view.event_timerange
+    stacks = _Stacks()
+    allocations, frees = [], []
+    stack_index: Dict[int, int] = {}
+    if timerange.begin > 0:
+        live = _live_at_begin(view, stacks)
+        if len(live) > 0:
+            allocations.append(live)
+
+    for df in view._iter_devmem_bufs_full(chunk_size=chunk_size):
+        firsts = df.drop_duplicates("stack_id")
+        for stack_id, meta in zip(firsts["stack_id"].tolist(), firsts["meta"]):
+            if stack_id not in stack_index:
+                stack_index[stack_id] = stacks.add(meta)
+
+        rows = pd.DataFrame(
+            dict(
+                begin=df.index,
+                end=df.index,
+                size=df["size"],
+                ident=df["ident"],
+                unknown=df["unknown"],
+                stack=df["stack_id"].map(stack_index),
+                first_launch=df["event_first_launch"].astype(np.float64),
+                last_launch=df["event_last_launch"].astype(np.float64),
+            )
+        ).fillna(-1)
+        is_allocation = df["is_allocation"].to_numpy() != 0
+        allocations.append(rows[is_allocation])
+        frees.append(rows[~is_allocation].assign(stack=-1))
+
+    allocations = pd.concat(allocations or [pd.DataFrame(columns=COLUMNS)])
+    frees = pd.concat(frees or [pd.DataFrame(columns=COLUMNS)])
+    df = _match_frees(allocations, frees, timerange.begin, timerange.end)
+    return ViewerData("event", timerange.begin, timerange.end, df, stacks.stacks)
+
+
+def viewer_data_from_snapshot(
+    inp: Union[str, model.Snapshot], device: int = 0
+) -> ViewerData:
+    """
+    Collects buffers of a snapshot, the time axis is the index of trace entry.
+    """
+    if type(inp) is str:
+        snapshot = model.load_snapshot_from_file(inp)
+    else:
+        snapshot = inp
+    traces = model.get_device_traces(snapshot, device)
+
+    rows = []
+    live: Dict[int, int] = {}
+    stacks: List[List[str]] = []
+    stack_index: Dict[Tuple[str, ...], int] = {}
+    for index, trace in enumerate(traces):
+        if trace["action"] == "free_completed":
+            if trace["addr"] in live:
+                rows[live.pop(trace["addr"])][1] = index
+                continue
+            # allocated before the snapshot starts
+            begin = 0
+        elif trace["action"] == "alloc":
+            live[trace["addr"]] = len(rows)
+            begin = index
+        else:
+            continue
+        ident, unknown, launches, lines = _parse_frames(trace["frames"])
+        if len(lines) == 0:
+            stack = -1
+        else:
+            stack = stack_index.setdefault(tuple(lines), len(stacks))
+            if stack == len(stacks):
+                stacks.append(lines)
+        end = len(traces) if trace["action"] == "alloc" else index
+        rows.append([begin, end, trace["size"], ident, unknown, stack, *launches])
+
+    df = pd.DataFrame(rows, columns=COLUMNS, dtype=np.int64)
+    return ViewerData("trace entry", 0, len(traces), df, stacks)
+
+
+def _parse_frames(frames: List[model.Frame]):
+    # frames written by `Builder`, snapshots of torch have only the stacks
+    ident, unknown, launches, lines = -1, 0, (-1, -1), []
+    for frame in frames:
+        filename, name, line = frame["filename"], frame["name"], frame["line"]
+        if filename == "BUFFER_NAME":
+            prefix, _, number = name.partition("_")
+            if number.isdigit():
+                ident, unknown = int(number), int(prefix == "UNK")
+        elif filename == "EVENTS":
+            if name == "first_launch":
+                launches = (line, launches[1])
+            elif name == "last_launch":
+                launches = (launches[0], line)
+        elif filename == "ATTACHED STACKS":
+            continue
+        elif filename == "======== STACK":
+            lines.append(f"======== stack {line}")
+        else:
+            lines.append(f"{name}  {filename}:{line}")
+    return ident, unknown, launches, lines
+
+
+def write_html(data: ViewerData, output: str):
+    with smart_open(TEMPLATE_PATH, "rt") as fd:
+        template = fd.read()
+    page = template.replace("/*TOWL_DATA*/null", data.to_json(), 1)
+    with smart_open(output, "wt") as fd:
+        fd.write(page)
+
+
+def render_html(
+    view: ScenarioView, output: str, *, chunk_size: int = DEFAULT_CHUNK_SIZE
+):
+    "Writes HTML page with buffers of the view to `output`"
+    write_html(viewer_data_from_view(view, chunk_size=chunk_size), output)
+
+
+def snapshot_to_html(inp: Union[str, model.Snapshot], output: str, device: int = 0):
+    "Writes HTML page with buffers of the snapshot to `output`"
+    write_html(viewer_data_from_snapshot(inp, device), output)
@@ -22,12 +22,18 @@ from . import timerange
 from .scenario import Scenario
 from .scenario_view import ScenarioView
 from .recipe_launch import RecipeLaunch
+from .allocator_usage import AllocatorUsage
+from .peak_attribution import PeakAttribution
+from .perf import PerfReport
 from .timerange import EventTimeRange, WallclockTimeRange
 
 __all__ = [
     "Scenario",
     "ScenarioView",
     "RecipeLaunch",
+    "AllocatorUsage",
+    "PeakAttribution",
+    "PerfReport",
     "EventTimeRange",
     "WallclockTimeRange",
 ]
@@ -0,0 +1,53 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+
+
+class AllocatorUsage(NamedTuple):
+    """
+    Allocator-level memory series. Every array holds one entry per
+    allocation or deallocation event (see `ScenarioView.query_allocator_usage`).
+    """
+
+    event_ident: np.ndarray
+    live_bytes: np.ndarray
+    live_count: np.ndarray
+    unknown_bytes: np.ndarray
+    unknown_count: np.ndarray
+
+    @staticmethod
+    def from_rows(rows) -> "AllocatorUsage":
+        dtype = [(name, np.int64) for name in AllocatorUsage._fields]
+        array = np.fromiter(rows, dtype=dtype)
+        return AllocatorUsage(*(array[name] for name in AllocatorUsage._fields))
+
+    def __len__(self):
+        return len(self.event_ident)
+
+    @property
+    def unknown_share(self) -> np.ndarray:
+        "Share of live bytes held by unknown buffers"
+        live_bytes = np.maximum(self.live_bytes, 1)
+        return self.unknown_bytes / live_bytes
+
+    def to_dataframe(self) -> pd.DataFrame:
+        "Returns pandas DataFrame indexed by `event_ident`"
+        df = pd.DataFrame(self._asdict())
+        df.set_index("event_ident", inplace=True, drop=True)
+        return df
@@ -14,10 +14,10 @@
 # limitations under the License.
 ################################################################################
 
-import functools
 import rich
 from .timerange import EventTimeRange
 from .scenario import Scenario
+from .code_index import CodeMark
 
 
 class PythonCodeStack:
@@ -124,56 +124,59 @@ class PythonCode:
         self._stack = stack.push(self)
         self._mark_id = int(mark_id)
         self._given_event_time_range = given_event_time_range
+        self._calls = None
 
     @property
     def mark_id(self):
         return self._mark_id
 
     @property
-    @functools.cache
+    def _mark(self) -> CodeMark:
+        return self._scenario.code_marks[self._mark_id]
+
+    @property
     def filename(self):
         if self._mark_id == -1:
             return "GIVEN_TIMERANGE"
-        df = self._scenario._common_view.query_python_log_by_mark_id(
-            self._mark_id)
-        return df.iloc[0]["filename"]
+        return self._mark.filename
 
     @property
-    @functools.cache
     def funcname(self):
         if self._mark_id == -1:
             return "GIVEN_TIMERANGE"
-        df = self._scenario._common_view.query_python_log_by_mark_id(
-            self._mark_id)
-        return df.iloc[0]["funcname"]
+        return self._mark.funcname
 
     @property
-    @functools.cache
     def line(self):
         if self._mark_id == -1:
             return 0
-        df = self._scenario._common_view.query_python_log_by_mark_id(
-            self._mark_id)
-        return df.iloc[0]["lineno"]
+        return self._mark.line
 
     @property
-    @functools.cache
     def event_timerange(self) -> EventTimeRange:
-        if self._mark_id == -1:
-            return self._given_event_time_range
         if self._given_event_time_range is not None:
             return self._given_event_time_range
-        df = self._scenario._common_view.query_python_log_by_mark_id(
-            self._mark_id)
-        begin, end = df.index[0], df.index[1] + 1
-        return EventTimeRange(begin, end)
+        mark = self._mark
+        return EventTimeRange(mark.begin_event, mark.end_event + 1)
 
     def make_view(self):
         return self._scenario.make_view(self.event_timerange)
 
     @property
-    @functools.cache
     def calls(self):
+        if self._calls is None:
+            self._calls = self._query_calls()
+        return self._calls
+
+    def _query_calls(self):
+        common_view = self._scenario._common_view
+        if not common_view.has_code_spans():
+            return self._calls_from_python_log()
+        body_order = common_view.query_code_calls(self.event_timerange, self._mark_id)
+        return PythonCodeCalls(self._scenario, body_order)
+
+    def _calls_from_python_log(self):
+        # databases without code spans
         df = self._scenario.make_view(self.event_timerange).query_python_log()
         body_order = []
         substack = []
@@ -208,14 +211,17 @@ class PythonCode:
     def enter_event(self, event_index: int):
         if not self.event_timerange.has(event_index):
             return None
-        calls = self.calls
-        import tqdm
-
-        for i in tqdm.trange(len(calls)):
-            pc = calls._pc(i)
-            if pc.event_timerange.has(event_index):
-                return self.enter(i).enter_event(event_index)
-        return self
+        index = self._scenario.code_index
+        pc = self
+        # The stack is ordered outermost first, marks inside the code entered
+        # so far are its direct calls.
+        for mark_id in index.stack_at(event_index):
+            begin, end = index.span(mark_id)
+            tr = pc.event_timerange
+            if mark_id == pc.mark_id or not (tr.begin <= begin and end < tr.end):
+                continue
+            pc = PythonCode(self._scenario, mark_id, pc.stack)
+        return pc
 
     def back(self):
         return self.stack.back()
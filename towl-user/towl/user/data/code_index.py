@@ -0,0 +1,161 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+from towl.db.store import model
+from typing import Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+import pandas as pd
+
+
+class _Level:
+    "Spans of a single thread at a single depth, they never overlap"
+
+    def __init__(self, spans: List[model.CodeSpan]):
+        spans = sorted(spans, key=lambda span: span.begin_event)
+        self.begins = np.array([span.begin_event for span in spans], dtype=np.int64)
+        self.ends = np.array([span.end_event for span in spans], dtype=np.int64)
+        self.marks = np.array([span.mark_id for span in spans], dtype=np.int64)
+
+    def lookup(self, events: np.ndarray) -> np.ndarray:
+        "Returns mark containing every event, -1 where there is none"
+        i = np.searchsorted(self.begins, events, side="right") - 1
+        found = i >= 0
+        i = np.maximum(i, 0)
+        found &= events <= self.ends[i]
+        return np.where(found, self.marks[i], -1)
+
+
+class CodeIndex:
+    """
+    Nested-interval index of code marked with `towl.instrument`.
+
+    Spans of a thread at the same depth do not overlap, so they are kept
+    as sorted arrays per (thread, depth) and the stack of marks containing
+    an event is found with one binary search per depth.
+    """
+
+    def __init__(self, spans: List[model.CodeSpan]):
+        self._spans: Dict[int, Tuple[int, int]] = {
+            span.mark_id: (span.begin_event, span.end_event) for span in spans
+        }
+        by_level: Dict[Tuple[int, int], List[model.CodeSpan]] = {}
+        for span in spans:
+            by_level.setdefault((span.tid, span.depth), []).append(span)
+        self._levels: Dict[int, List[Optional[_Level]]] = {}
+        for (tid, depth), xs in by_level.items():
+            levels = self._levels.setdefault(tid, [])
+            levels += [None] * (depth + 1 - len(levels))
+            levels[depth] = _Level(xs)
+        self._depth = max((len(x) for x in self._levels.values()), default=0)
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    @property
+    def tids(self) -> List[int]:
+        return sorted(self._levels)
+
+    def span(self, mark_id: int) -> Optional[Tuple[int, int]]:
+        "Returns `(enter event, exit event)` of the mark"
+        return self._spans.get(mark_id, None)
+
+    def stacks_at(self, events, tid: Optional[int] = None) -> np.ndarray:
+        """
+        Returns array of shape `(len(events), depth)`: marks containing every
+        event, outermost first, padded with -1.
+
+        Marks are looked up in the thread `tid`. Without it, the thread with
+        the deepest stack at the event is used.
+        """
+        events = np.asarray(events, dtype=np.int64)
+        tids = self.tids if tid is None else [tid]
+        result = np.full((len(events), self._depth), -1, dtype=np.int64)
+        best = np.zeros(len(events), dtype=np.int64)
+        for t in tids:
+            stacks = np.full((len(events), self._depth), -1, dtype=np.int64)
+            for depth, level in enumerate(self._levels.get(t, [])):
+                if level is not None:
+                    stacks[:, depth] = level.lookup(events)
+            count = (stacks != -1).sum(axis=1)
+            deeper = count > best
+            result[deeper] = stacks[deeper]
+            best = np.maximum(best, count)
+        return result
+
+    def stack_at(self, event_ident: int, tid: Optional[int] = None) -> List[int]:
+        "Returns marks containing the event, outermost first"
+        stack = self.stacks_at([event_ident], tid)[0]
+        return [int(mark_id) for mark_id in stack if mark_id != -1]
+
+
+class CodeMark(NamedTuple):
+    mark_id: int
+    filename: str
+    funcname: str
+    line: int
+    begin_event: int
+    end_event: int
+
+
+class CodeMarks:
+    """
+    Location and events of every mark, loaded at once.
+
+    Marks are kept as arrays sorted by `mark_id` with file and function names
+    interned, so memory grows with the number of marks by a few words each
+    and with the number of distinct locations.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._marks = df.index.to_numpy(dtype=np.int64)
+        self._lines = df["lineno"].to_numpy(dtype=np.int64)
+        self._begins = df["begin_event"].to_numpy(dtype=np.int64)
+        self._ends = df["end_event"].to_numpy(dtype=np.int64)
+        codes, self._filenames = pd.factorize(df["filename"])
+        self._filename_codes = codes.astype(np.int32)
+        codes, self._funcnames = pd.factorize(df["funcname"])
+        self._funcname_codes = codes.astype(np.int32)
+
+    def __len__(self) -> int:
+        return len(self._marks)
+
+    def __contains__(self, mark_id: int) -> bool:
+        return self._position(mark_id) is not None
+
+    def _position(self, mark_id: int) -> Optional[int]:
+        i = int(np.searchsorted(self._marks, mark_id))
+        if i < len(self._marks) and self._marks[i] == mark_id:
+            return i
+        return None
+
+    def get(self, mark_id: int) -> Optional[CodeMark]:
+        i = self._position(mark_id)
+        if i is None:
+            return None
+        return CodeMark(
+            mark_id=int(mark_id),
+            filename=self._filenames[self._filename_codes[i]],
+            funcname=self._funcnames[self._funcname_codes[i]],
+            line=int(self._lines[i]),
+            begin_event=int(self._begins[i]),
+            end_event=int(self._ends[i]),
+        )
+
+    def __getitem__(self, mark_id: int) -> CodeMark:
+        mark = self.get(mark_id)
+        if mark is None:
+            raise KeyError(mark_id)
+        return mark
@@ -19,6 +19,8 @@ from towl.user.utils.typechecked import typechecked
 from .recipe_launch import RecipeLaunch
 from towl.db.store import model
 import pandas as pd
+from typing import List, Tuple
+from .timerange import EventTimeRange
 
 
 @typechecked
@@ -32,6 +34,9 @@ class CommonView:
     def query_recipe_launch_by_event_ident(self, event_ident: int):
         return self._db.query_recipe_launch_by_event_ident(event_ident)
 
+    def query_recipe_launches_by_ident(self, launch_idents: List[int]):
+        return self._db.query_recipe_launches_by_launch_idents(launch_idents)
+
     def query_python_log_by_mark_id(
         self, mark_id: int, map_basename=False
     ) -> pd.DataFrame:
@@ -41,3 +46,28 @@ class CommonView:
             map_basename=map_basename,
         )
         return df
+
+    def has_code_spans(self) -> bool:
+        "Databases created before code spans were recorded have none"
+        return self._db.has_code_spans()
+
+    def query_code_calls(
+        self, event_timerange: EventTimeRange, mark_id: int
+    ) -> List[Tuple[int, int, int]]:
+        """
+        Returns `(mark_id, enter event, exit event)` of marked code called
+        directly inside `event_timerange` (or inside the mark `mark_id`).
+        """
+        return self._db.query_code_calls(event_timerange, mark_id)
+
+    def query_code_marks(self) -> pd.DataFrame:
+        """
+        Returns pandas DataFrame indexed by `mark_id` with location
+        (`funcname`, `filename`, `lineno`) and `begin_event`/`end_event`
+        of every mark
+        """
+        return self._db.query_code_marks()
+
+    def query_code_spans(self) -> List[model.CodeSpan]:
+        "Returns all marked code spans ordered by enter event"
+        return self._db.query_code_spans()
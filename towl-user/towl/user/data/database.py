@@ -17,50 +17,99 @@
 from towl.user.utils.typechecked import typechecked
 from towl.db.store import Database as Database
 from .timerange import EventTimeRange
+import numpy as np
 import pandas as pd
-from typing import Optional
+from typing import Callable, Dict, Optional, List, Tuple
 import os
-from ..utils.strings import memory_str
+from ..utils.lazy_str import LazyStrArray
 from towl.db.store import model
+from .allocator_usage import AllocatorUsage
+from .peak_attribution import is_user_file
+from .perf import PerfRecorder, PerfReport, measured
 
 
 @typechecked
 class DatabaseFacade:
-    def __init__(self, path: str):
-        self._db = Database(os.path.join(path, "towl.db"))
+    def __init__(self, path: str, *, profile: bool = False):
+        self._db = Database(
+            os.path.join(path, "towl.db"), read_only=True, profile=profile
+        )
+        self._perf = PerfRecorder(enabled=profile)
+
+    @property
+    def perf(self) -> PerfRecorder:
+        return self._perf
+
+    def perf_report(self) -> PerfReport:
+        if self._db.profiler is None:
+            raise RuntimeError("Database is not opened with profile=True")
+        totals = self._perf.totals()
+        sql = self._db.profiler.total_time
+        phases = {
+            "sql": sql,
+            "dataframe": max(totals.get("query", 0.0) - sql, 0.0),
+            "formatting": totals.get("formatting", 0.0),
+        }
+        return PerfReport.make(
+            phases, self._db.profiler.report(), self._db.profiler.slow_queries
+        )
 
+    def reset_perf(self):
+        self._perf.reset()
+        if self._db.profiler is not None:
+            self._db.profiler.reset()
+
+    @measured("query")
     def fetch_global_timerange(self):
         end = self._db.query_number_of_events()
         return EventTimeRange(0, end)
 
+    @measured("query")
     def query_events(
         self,
         timerange: EventTimeRange,
     ) -> pd.DataFrame:
+        cursor = self._db.query_events(timerange.begin, timerange.end)
+        return self._events_frame(cursor)
+
+    @measured("query")
+    def iter_events(self, timerange: EventTimeRange, chunk_size: int):
+        chunks = self._db.iter_events(timerange.begin, timerange.end, chunk_size)
+        for rows in chunks:
+            yield self._events_frame(rows)
+
+    def _events_frame(self, rows) -> pd.DataFrame:
         columns = [
             "event_ident",
             "tid",
             "timestamp",
             "event_kind",
         ]
-        cursor = self._db.query_events(timerange.begin, timerange.end)
-        df = pd.DataFrame(cursor, columns=columns)
+        df = pd.DataFrame(rows, columns=columns)
         df.set_index("event_ident", inplace=True, drop=True)
         from datetime import datetime
 
-        df["timestamp"] = df["timestamp"].map(
-            lambda x: datetime.fromisoformat(x).time()
-        )
+        with self._perf.measure("formatting"):
+            df["timestamp"] = df["timestamp"].map(
+                lambda x: datetime.fromisoformat(x).time()
+            )
         return df
 
+    @measured("query")
     def query_recipe_launch_by_launch_ident(self, launch_ident: int):
         x = self._db.query_launch_by_launch_id(launch_ident)
         return self._query_launch(*x)
 
+    @measured("query")
     def query_recipe_launch_by_event_ident(self, event_ident: int):
         x = self._db.query_launch_by_event_ident(event_ident)
         return self._query_launch(*x)
 
+    @measured("query")
+    def query_recipe_launches_by_launch_idents(self, launch_idents: List[int]):
+        xs = self._db.query_launches_by_launch_idents(launch_idents)
+        return [self._query_launch(*x) for x in xs]
+
     def _query_launch(self, event_ident: int, m: model.DataRecipeLaunch):
         from .recipe_launch import RecipeLaunch
 
@@ -75,6 +124,7 @@ class DatabaseFacade:
             db=self,
         )
 
+    @measured("query")
     def query_devmem_summary(
         self,
         timerange: EventTimeRange,
@@ -82,16 +132,72 @@ class DatabaseFacade:
     ) -> pd.DataFrame:
         cursor = self._db.query_devmem_summary(
             timerange.begin, timerange.end, tag)
+        return self._devmem_summary_frame(cursor)
+
+    @measured("query")
+    def iter_devmem_summary(
+        self, timerange: EventTimeRange, tag: Optional[str], chunk_size: int
+    ):
+        chunks = self._db.iter_devmem_summary(
+            timerange.begin, timerange.end, tag, chunk_size
+        )
+        for rows in chunks:
+            yield self._devmem_summary_frame(rows)
+
+    @staticmethod
+    def _devmem_summary_frame(rows) -> pd.DataFrame:
         columns = ["event_ident", "used", "workspace", "persistent", "tag"]
-        df = pd.DataFrame(cursor, columns=columns)
+        df = pd.DataFrame(rows, columns=columns)
         df.set_index("event_ident", drop=True, inplace=True)
 
         return df
 
+    @measured("query")
+    def query_allocator_usage(self, timerange: EventTimeRange) -> AllocatorUsage:
+        cursor = self._db.query_allocator_usage(timerange.begin, timerange.end)
+        return AllocatorUsage.from_rows(cursor)
+
+    @measured("query")
+    def iter_allocator_usage(self, timerange: EventTimeRange, chunk_size: int):
+        chunks = self._db.iter_allocator_usage(
+            timerange.begin, timerange.end, chunk_size
+        )
+        for rows in chunks:
+            yield AllocatorUsage.from_rows(rows)
+
+    @measured("query")
+    def query_series_level(
+        self, series: str, timerange: EventTimeRange, level: int
+    ) -> Optional[pd.DataFrame]:
+        cursor = self._db.query_series_level(
+            series, level, timerange.begin, timerange.end
+        )
+        if cursor is None:
+            return None
+        columns = ["bucket", "min", "max", "last"]
+        df = pd.DataFrame(cursor, columns=columns)
+        width = model.series_level_width(level)
+        df["event_ident"] = (df["bucket"] * width).clip(lower=timerange.begin)
+        del df["bucket"]
+        df.set_index("event_ident", inplace=True, drop=True)
+        return df
+
+    @measured("query")
     def query_devmem_bufs_full(self, timerange: EventTimeRange) -> pd.DataFrame:
+        cursor = self._db.query_devmem_bufs_full(timerange.begin, timerange.end)
+        return self._devmem_bufs_full_frame(cursor, {})
+
+    @measured("query")
+    def iter_devmem_bufs_full(self, timerange: EventTimeRange, chunk_size: int):
+        chunks = self._db.iter_devmem_bufs_full(
+            timerange.begin, timerange.end, chunk_size
+        )
+        # ids stay the same across chunks
+        stack_ids: Dict[bytes, int] = {}
+        for rows in chunks:
+            yield self._devmem_bufs_full_frame(rows, stack_ids)
 
-        cursor = self._db.query_devmem_bufs_full(
-            timerange.begin, timerange.end)
+    def _devmem_bufs_full_frame(self, rows, stack_ids: Dict[bytes, int]):
         columns = [
             "event_ident",
             "is_allocation",
@@ -106,33 +212,61 @@ class DatabaseFacade:
             "unknown",
         ]
 
-        df = pd.DataFrame(cursor, columns=columns)
+        df = pd.DataFrame(rows, columns=columns)
         df["addr"] = 2 * df["addr"]
+        # buffers allocated at the same place share the encoded meta,
+        # every distinct one is decoded once and gets its own `stack_id`
+        codes, uniques = pd.factorize(df["meta"])
+        metas = np.empty(len(uniques), dtype=object)
+        metas[:] = [self._db.decode_buffer_meta(data) for data in uniques]
+        ids = [stack_ids.setdefault(data, len(stack_ids)) for data in uniques]
+        df["meta"] = metas[codes]
+        df["stack_id"] = np.array(ids, dtype=np.int64)[codes]
         df.set_index("event_ident", inplace=True, drop=True)
         return df
 
-    def query_launches(self, timerange: EventTimeRange):
-        cursor = self._db.query_launches(timerange.begin, timerange.end)
+    @measured("query")
+    def query_buffers_allocs(self, timerange: EventTimeRange) -> pd.DataFrame:
+        cursor = self._db.query_devmem_bufs(timerange.begin, timerange.end)
+        return self._buffers_allocs_frame(cursor)
+
+    @measured("query")
+    def iter_buffers_allocs(self, timerange: EventTimeRange, chunk_size: int):
+        chunks = self._db.iter_devmem_bufs(timerange.begin, timerange.end, chunk_size)
+        for rows in chunks:
+            yield self._buffers_allocs_frame(rows)
+
+    def _buffers_allocs_frame(self, rows) -> pd.DataFrame:
         columns = [
             "event_ident",
-            "launch_ident",
-            "workspace",
-            "handle",
-            "name",
-            "event_launch",
-            "event_finished",
+            "is_allocation",
+            "buffer_ident",
+            "addr",
+            "size",
+            "event_malloc",
+            "event_free",
+            "event_first_launch",
+            "event_last_launch",
+            "unknown",
         ]
-        df = pd.DataFrame(cursor, columns=columns)
-        df["workspace_gb"] = df["workspace"] / (1024**3)
-        df["handle_hex"] = df["handle"].map(lambda x: f"0x{x:x}")
-        df.set_index("event_ident", drop=True, inplace=True)
+
+        df = pd.DataFrame(rows, columns=columns)
+        df["addr"] = 2 * df["addr"]
+        df["change"] = np.where(df["is_allocation"] != 0, df["size"], -df["size"])
+        with self._perf.measure("formatting"):
+            df["bufname"] = LazyStrArray.make(df["buffer_ident"], "bufname")
+            df["addr_str"] = LazyStrArray.make(df["addr"], "hex")
+            df["size_str"] = LazyStrArray.make(df["size"], "memory")
+            df["change_str"] = LazyStrArray.make(df["change"], "memory")
+
+        df.set_index("event_ident", inplace=True, drop=True)
         return df
 
-    def query_buffers_allocs(self, timerange: EventTimeRange) -> pd.DataFrame:
-        cursor = self._db.query_devmem_bufs(timerange.begin, timerange.end)
+    @measured("query")
+    def query_live_buffers(self, event_ident: int) -> pd.DataFrame:
+        idents = self._db.query_live_buffer_idents(event_ident)
+        cursor = self._db.query_buffers_by_idents(idents)
         columns = [
-            "event_ident",
-            "is_allocation",
             "buffer_ident",
             "addr",
             "size",
@@ -144,28 +278,53 @@ class DatabaseFacade:
         ]
 
         df = pd.DataFrame(cursor, columns=columns)
-        df["bufname"] = df["buffer_ident"].map(lambda x: f"BUF_{x}")
         df["addr"] = 2 * df["addr"]
-        df["addr_str"] = df["addr"].map(lambda x: f"0x{x:x}")
-        df["size_str"] = df["size"].map(memory_str)
+        with self._perf.measure("formatting"):
+            df["bufname"] = LazyStrArray.make(df["buffer_ident"], "bufname")
+            df["addr_str"] = LazyStrArray.make(df["addr"], "hex")
+            df["size_str"] = LazyStrArray.make(df["size"], "memory")
 
-        def f(i: int):
-            row = df.iloc[i]
-            size = row["size"]
-            is_alloc = row["is_allocation"]
-            if is_alloc:
-                return size
-            else:
-                return -size
-
-        import numpy as np
+        df.set_index("buffer_ident", inplace=True, drop=True)
+        return df
 
-        df["change"] = np.array(map(f, range(len(df))))
-        df["change_str"] = df["change"].map(memory_str)
+    @measured("query")
+    def query_buffers_meta(self, idents: List[int]) -> pd.DataFrame:
+        cursor = self._db.query_buffers_attribution_by_idents(idents)
+        columns = ["buffer_ident", "meta", "synapse_name"]
+        df = pd.DataFrame(cursor, columns=columns)
+        codes, uniques = pd.factorize(df["meta"])
+        metas = np.empty(len(uniques), dtype=object)
+        metas[:] = [self._db.decode_buffer_meta(data) for data in uniques]
+        df["meta"] = metas[codes]
+        del df["synapse_name"]
+        df.set_index("buffer_ident", inplace=True, drop=True)
+        return df
 
-        df.set_index("event_ident", inplace=True, drop=True)
+    @measured("query")
+    def query_buffers_attribution(
+        self, idents: List[int], user_file: Callable[[str], bool] = is_user_file
+    ) -> pd.DataFrame:
+        cursor = self._db.query_buffers_attribution_by_idents(idents)
+        columns = ["buffer_ident", "meta", "synapse_name"]
+        df = pd.DataFrame(cursor, columns=columns)
+        # every distinct meta is decoded once, the first attached stack is used
+        codes, uniques = pd.factorize(df["meta"])
+        stacks = np.full(len(uniques), None, dtype=object)
+        frames = np.full(len(uniques), None, dtype=object)
+        for i, data in enumerate(uniques):
+            alloc_frames = self._db.decode_buffer_meta(data).alloc_frames
+            if len(alloc_frames) > 0 and len(alloc_frames[0]) > 0:
+                stack = alloc_frames[0]
+                stacks[i] = "\n".join(_frame_str(frame) for frame in stack)
+                users = (frame for frame in stack if user_file(frame.filename))
+                frames[i] = _frame_str(next(users, stack[0]))
+        del df["meta"]
+        df["stack"] = stacks[codes]
+        df["frame"] = frames[codes]
+        df.set_index("buffer_ident", inplace=True, drop=True)
         return df
 
+    @measured("query")
     def query_launches(self, timerange: EventTimeRange):
         cursor = self._db.query_launches(timerange.begin, timerange.end)
         columns = [
@@ -178,11 +337,75 @@ class DatabaseFacade:
             "recipe_name",
         ]
         df = pd.DataFrame(cursor, columns=columns)
-        df["workspace_str"] = df["workspace"].map(memory_str)
-        df["handle_str"] = df["handle"].map(lambda x: f"0x{x:x}")
+        with self._perf.measure("formatting"):
+            df["workspace_str"] = LazyStrArray.make(df["workspace"], "memory")
+            df["handle_str"] = LazyStrArray.make(df["handle"], "hex")
+        df.set_index("event_ident", drop=True, inplace=True)
+        return df
+
+    @measured("query")
+    def query_launches_full(self, timerange: EventTimeRange) -> pd.DataFrame:
+        cursor = self._db.query_launches_full(timerange.begin, timerange.end)
+        columns = [
+            "event_ident",
+            "launch_ident",
+            "workspace",
+            "handle",
+            "recipe_name",
+            "event_launch",
+            "event_finished",
+            "index",
+            "offset",
+            "synapse_name",
+            "buffer_ident",
+            "addr",
+            "size",
+            "unknown",
+        ]
+        df = pd.DataFrame(cursor, columns=columns)
+        df["addr"] = 2 * df["addr"]
         df.set_index("event_ident", drop=True, inplace=True)
         return df
 
+    def has_code_spans(self) -> bool:
+        return self._db.has_code_spans()
+
+    @measured("query")
+    def query_code_calls(
+        self, timerange: EventTimeRange, mark_id: int
+    ) -> List[Tuple[int, int, int]]:
+        cursor = self._db.query_code_spans_top(timerange.begin, timerange.end, mark_id)
+        return [tuple(row) for row in cursor]
+
+    @measured("query")
+    def query_code_spans(self) -> List[model.CodeSpan]:
+        return self._db.query_code_spans()
+
+    @measured("query")
+    def query_code_marks(self) -> pd.DataFrame:
+        columns = [
+            "event_ident",
+            "command",
+            "funcname",
+            "filename",
+            "lineno",
+            "mark_id",
+        ]
+        df = pd.DataFrame(self._db.query_code_marks(), columns=columns)
+        command = df["command"]
+        enters = df[command == "mark-code-enter"].drop_duplicates("mark_id")
+        exits = df[command == "mark-code-exit"].drop_duplicates("mark_id")
+
+        df = enters.set_index("mark_id")[["funcname", "filename", "lineno"]]
+        df["begin_event"] = enters["event_ident"].to_numpy()
+        end_events = exits.set_index("mark_id")["event_ident"].reindex(df.index)
+        # marks never exited last until the end of the scenario
+        last_event = self.fetch_global_timerange().end - 1
+        df["end_event"] = end_events.fillna(last_event).astype(np.int64)
+        df.sort_index(inplace=True)
+        return df
+
+    @measured("query")
     def query_python_log_full(self, timerange: EventTimeRange, *, map_basename: bool):
         cursor = self._db.query_python_log(
             timerange.begin,
@@ -199,12 +422,17 @@ class DatabaseFacade:
             "mark_id",
         ]
         df = pd.DataFrame(cursor, columns=columns)
+        df["content"] = df["content"].map(
+            self._db.decode_framelog_content, na_action="ignore"
+        )
         df.set_index("event_ident", inplace=True, drop=True)
 
         if map_basename:
-            df["filename"] = df["filename"].map(os.path.basename)
+            with self._perf.measure("formatting"):
+                df["filename"] = df["filename"].map(os.path.basename)
         return df
 
+    @measured("query")
     def query_python_log_full_by_mark_id(self, mark_id: int, *, map_basename: bool):
         cursor = self._db.query_python_log_by_mark_id(
             mark_id,
@@ -220,8 +448,16 @@ class DatabaseFacade:
             "mark_id",
         ]
         df = pd.DataFrame(cursor, columns=columns)
+        df["content"] = df["content"].map(
+            self._db.decode_framelog_content, na_action="ignore"
+        )
         df.set_index("event_ident", inplace=True, drop=True)
 
         if map_basename:
-            df["filename"] = df["filename"].map(os.path.basename)
+            with self._perf.measure("formatting"):
+                df["filename"] = df["filename"].map(os.path.basename)
         return df
+
+
+def _frame_str(frame: model.FrameInfo) -> str:
+    return f"{frame.funcname}  {frame.filename}:{frame.line}"
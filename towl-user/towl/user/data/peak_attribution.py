@@ -0,0 +1,111 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+from typing import NamedTuple
+import os
+import numpy as np
+import pandas as pd
+from towl.user.utils.strings import memory_str
+
+# group of buffers without allocation stack or never launched
+UNATTRIBUTED = "<unattributed>"
+
+# directories of code which allocates on behalf of the user
+LIBRARY_DIRS = {"site-packages", "dist-packages", "torch"}
+
+
+def is_user_file(filename: str) -> bool:
+    "Returns whether `filename` is a Python file of the user, not of a library"
+    parts = filename.replace(os.sep, "/").split("/")
+    return filename.endswith(".py") and LIBRARY_DIRS.isdisjoint(parts)
+
+
+class PeakAttribution(NamedTuple):
+    """
+    Buffers live at the allocator peak (see `ScenarioView.peak_attribution`).
+
+    `buffers` has a row per live buffer with its `size`, `unknown` flag,
+    allocation `stack`, innermost user `frame` (the innermost one if the stack
+    has no frame of the user), `synapse_name` of its first launch
+    and `size_class` (lower power of two bound of the size).
+    Every `by_*` DataFrame holds `top` largest groups of the column with
+    `bytes`, `count` and `share` of the peak, sorted by bytes.
+    """
+
+    event_ident: int
+    live_bytes: int
+    buffers: pd.DataFrame
+    by_stack: pd.DataFrame
+    by_frame: pd.DataFrame
+    by_synapse_name: pd.DataFrame
+    by_size_class: pd.DataFrame
+
+    @staticmethod
+    def make(event_ident: int, buffers: pd.DataFrame, top: int) -> "PeakAttribution":
+        buffers = buffers.copy()
+        sizes = buffers["size"].to_numpy(dtype=np.int64)
+        exponents = np.floor(np.log2(np.maximum(sizes, 1))).astype(np.int64)
+        buffers["size_class"] = np.where(sizes > 0, 2**exponents, 0)
+        live_bytes = int(sizes.sum())
+
+        def aggregate(column: str) -> pd.DataFrame:
+            keys = buffers[column]
+            if keys.dtype == object:
+                keys = keys.fillna(UNATTRIBUTED)
+            df = buffers["size"].groupby(keys).agg(bytes="sum", count="size")
+            df["share"] = df["bytes"] / max(live_bytes, 1)
+            return df.sort_values("bytes", ascending=False, kind="stable").head(top)
+
+        by_size_class = aggregate("size_class")
+        by_size_class.index = [_size_class_str(int(x)) for x in by_size_class.index]
+        by_size_class.index.name = "size_class"
+        return PeakAttribution(
+            event_ident=event_ident,
+            live_bytes=live_bytes,
+            buffers=buffers,
+            by_stack=aggregate("stack"),
+            by_frame=aggregate("frame"),
+            by_synapse_name=aggregate("synapse_name"),
+            by_size_class=by_size_class,
+        )
+
+    def show(self):
+        print(
+            f"Peak {memory_str(self.live_bytes)} in {len(self.buffers)} buffers"
+            f" after event {self.event_ident}"
+        )
+        groups = [
+            ("allocation stack", self.by_stack),
+            ("innermost user frame", self.by_frame),
+            ("synapse name", self.by_synapse_name),
+            ("size class", self.by_size_class),
+        ]
+        indent = "\n" + " " * 34
+        for title, df in groups:
+            print(">> by", title)
+            for key, row in df.iterrows():
+                # stacks are printed a frame per line
+                key = str(key).replace("\n", indent)
+                print(
+                    f"{memory_str(int(row['bytes'])):>14} {row['share']:8.2%}"
+                    f" {int(row['count']):>8}  {key}"
+                )
+
+
+def _size_class_str(size_class: int) -> str:
+    if size_class == 0:
+        return "0 B"
+    return f"[{memory_str(size_class)}; {memory_str(2 * size_class)})"
@@ -0,0 +1,144 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+
+from typing import NamedTuple, List, Dict
+from collections import defaultdict
+import contextlib
+import functools
+import inspect
+import threading
+import time
+import pandas as pd
+from towl.db.store.profiler import QueryStats, SlowQuery
+
+
+class PerfReport(NamedTuple):
+    """
+    Where time of scenario queries went. See `Scenario.perf_report`.
+
+    * `phases` - seconds spent in SQL, DataFrame construction and formatting
+      of human readable columns
+    * `queries` - SQL statements, the most expensive first
+    * `slow_queries` - statements over the threshold with their query plans
+    """
+
+    phases: pd.DataFrame
+    queries: pd.DataFrame
+    slow_queries: List[SlowQuery]
+
+    def show(self, top: int = 10):
+        print(self.phases.to_string())
+        print()
+        print(self.queries.head(top).to_string())
+        for slow in self.slow_queries:
+            print()
+            print(f"SLOW {slow.time:.4f}s, {slow.rows} rows")
+            print(" ".join(slow.query.split()))
+            for detail in slow.plan:
+                print("   ", detail)
+
+    @staticmethod
+    def make(phases: Dict[str, float], queries: List[QueryStats], slow_queries):
+        total = sum(phases.values())
+        df_phases = pd.DataFrame(
+            {
+                "seconds": pd.Series(phases),
+                "share": pd.Series(phases) / total if total > 0 else 0.0,
+            }
+        )
+        df_queries = pd.DataFrame(queries, columns=QueryStats._fields)
+        df_queries["total_time"] = df_queries["execute_time"] + df_queries["fetch_time"]
+        df_queries["query"] = df_queries["query"].map(lambda x: " ".join(x.split()))
+        return PerfReport(
+            phases=df_phases, queries=df_queries, slow_queries=slow_queries
+        )
+
+
+class PerfRecorder:
+    """
+    Accumulates self time of nested phases (time of inner phases is not
+    counted to the outer one). Does nothing unless `enabled`.
+    """
+
+    def __init__(self, enabled: bool):
+        self._enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._totals = defaultdict(float)
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    @contextlib.contextmanager
+    def measure(self, phase: str):
+        if not self._enabled:
+            yield
+            return
+
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - begin
+            nested = stack.pop()
+            if len(stack) > 0:
+                stack[-1] += elapsed
+            with self._lock:
+                self._totals[phase] += elapsed - nested
+
+    def totals(self) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._totals)
+
+    def reset(self):
+        with self._lock:
+            self._totals.clear()
+
+
+def measured(phase: str):
+    """
+    Measures decorated method as `phase` of `self._perf` recorder. Generators
+    are measured while producing items.
+    """
+
+    def decorator(f):
+        if inspect.isgeneratorfunction(f):
+
+            @functools.wraps(f)
+            def generator_wrapper(self, *args, **kwargs):
+                items = f(self, *args, **kwargs)
+                while True:
+                    with self._perf.measure(phase):
+                        try:
+                            item = next(items)
+                        except StopIteration:
+                            return
+                    yield item
+
+            return generator_wrapper
+
+        @functools.wraps(f)
+        def wrapper(self, *args, **kwargs):
+            with self._perf.measure(phase):
+                return f(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
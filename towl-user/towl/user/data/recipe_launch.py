@@ -17,6 +17,7 @@
 from .database import DatabaseFacade
 from typing import List
 from towl.user.utils.strings import memory_str
+from towl.user.utils.lazy_str import LazyStrArray
 from .timerange import EventTimeRange
 from typeguard import typechecked
 from towl.db.store import model
@@ -77,5 +78,5 @@ class RecipeLaunch:
 
         df = pd.DataFrame.from_dict(d)
         df.set_index("index", drop=True, inplace=True)
-        df["bufname"] = df["buffer"].map(lambda x: f"BUF_{x}")
+        df["bufname"] = LazyStrArray.make(df["buffer"], "bufname")
         return df
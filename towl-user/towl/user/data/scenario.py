@@ -20,23 +20,59 @@ from .timerange import EventTimeRange
 from .scenario_view import ScenarioView
 from .common_view import CommonView
 from .recipe_launch import RecipeLaunch
+from .perf import PerfReport
+from .code_index import CodeIndex, CodeMarks
+from typing import List
 
 
 @typechecked
 class Scenario:
     """
     Representation of scenario stored in the database stored in the `path` directory.
+
+    With `profile=True` time spent by queries is measured, see `perf_report`.
     """
 
-    def __init__(self, path: str):
-        self._db = DatabaseFacade(path)
+    def __init__(self, path: str, *, profile: bool = False):
+        self._db = DatabaseFacade(path, profile=profile)
         self._common_view = CommonView(self._db)
+        self._code_index = None
+        self._code_marks = None
 
     @property
     def global_event_timerange(self) -> EventTimeRange:
         """Returns timerange representing whole scenario"""
         return self._db.fetch_global_timerange()
 
+    @property
+    def code_index(self) -> CodeIndex:
+        """
+        Index of code marked with `towl.instrument`, built on first use.
+
+        ```
+        scenario.code_index.stack_at(event_ident)
+        scenario.code_index.stacks_at(df.index)
+        ```
+        """
+        if self._code_index is None:
+            self._code_index = CodeIndex(self._common_view.query_code_spans())
+        return self._code_index
+
+    @property
+    def code_marks(self) -> CodeMarks:
+        """
+        Location and enter/exit events of code marked with `towl.instrument`,
+        loaded on first use.
+
+        ```
+        mark = scenario.code_marks[mark_id]
+        print(mark.funcname, mark.filename, mark.line)
+        ```
+        """
+        if self._code_marks is None:
+            self._code_marks = CodeMarks(self._common_view.query_code_marks())
+        return self._code_marks
+
     def make_view(self, event_timerange: EventTimeRange) -> ScenarioView:
         """
         Makes a view for given timerange.
@@ -57,6 +93,31 @@ class Scenario:
         "Returns `RecipeLaunch` representation for given `event_ident`"
         return self._common_view.query_recipe_launch_by_event_ident(event_ident)
 
+    def query_recipe_launches_by_ident(
+        self, launch_idents: List[int]
+    ) -> List[RecipeLaunch]:
+        "Returns list of `RecipeLaunch` for given `launch_idents` using a single query"
+        return self._common_view.query_recipe_launches_by_ident(launch_idents)
+
+    def perf_report(self) -> PerfReport:
+        """
+        Returns where time of queries went so far: SQL (executing statements
+        and fetching rows), DataFrame construction and formatting of human
+        readable columns, together with per-statement timings and slow
+        queries with their query plans. Requires `profile=True`.
+
+        ```
+        scenario = Scenario(path, profile=True)
+        scenario.make_global_view().query_buffers_allocs()
+        scenario.perf_report().show()
+        ```
+        """
+        return self._db.perf_report()
+
+    def reset_perf_report(self):
+        "Forgets timings collected so far"
+        self._db.reset_perf()
+
     def python_code(self, view=None):
         from .code import PythonCode
 
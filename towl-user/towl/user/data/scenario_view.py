@@ -17,11 +17,24 @@
 from .database import DatabaseFacade
 from towl.user.utils.typechecked import typechecked
 from .timerange import EventTimeRange
+import numpy as np
 import pandas as pd
-from typing import Optional
+from typing import Optional, List, Union, Callable, Any, Iterator
+import concurrent.futures
+import functools
+from towl.db.store import model
 import towl.user.utils.strings as ustrings
-from ..utils.strings import memory_str
+from ..utils.lazy_str import LazyStrArray
 from .common_view import CommonView
+from .allocator_usage import AllocatorUsage
+from .peak_attribution import PeakAttribution, is_user_file
+from .recipe_launch import RecipeLaunch
+
+
+DEFAULT_CHUNK_SIZE = 100000
+
+# buckets of downsampled allocator usage searched for the peak
+PEAK_SEARCH_POINTS = 1000
 
 
 @typechecked
@@ -51,27 +64,138 @@ class ScenarioView:
         df = self._db.query_events(self.event_timerange)
         return df
 
+    def iter_events(
+        self, *, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[pd.DataFrame]:
+        "Yields events (see `query_events`) as DataFrames of at most `chunk_size` rows"
+        return self._db.iter_events(self.event_timerange, chunk_size)
+
     def query_memory_usage(self, tag: Optional[str] = None) -> pd.DataFrame:
         """
         Returns pandas DataFrame with memory usage.
         """
         df = self._db.query_devmem_summary(self.event_timerange, tag)
+        return self._memory_usage_frame(df)
+
+    def iter_memory_usage(
+        self, tag: Optional[str] = None, *, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yields memory usage (see `query_memory_usage`) as DataFrames of at most
+        `chunk_size` rows, so whole view never has to fit in memory.
+        """
+        chunks = self._db.iter_devmem_summary(self.event_timerange, tag, chunk_size)
+        for df in chunks:
+            yield self._memory_usage_frame(df)
 
-        df["workspace_str"] = df["workspace"].map(ustrings.memory_str)
-        df["persistent_str"] = df["persistent"].map(ustrings.memory_str)
-        df["used_str"] = df["used"].map(ustrings.memory_str)
+    def _memory_usage_frame(self, df: pd.DataFrame) -> pd.DataFrame:
+        with self._db.perf.measure("formatting"):
+            df["workspace_str"] = LazyStrArray.make(df["workspace"], "memory")
+            df["persistent_str"] = LazyStrArray.make(df["persistent"], "memory")
+            df["used_str"] = LazyStrArray.make(df["used"], "memory")
 
         # df["addr_hex"] = df["addr"].map(ustrings.to_hex)
         # df["size_str"] = df["size"].map(ustrings.memory_str)
 
         return df
 
+    def query_allocator_usage(self) -> AllocatorUsage:
+        """
+        Returns allocator-level memory usage as NumPy arrays: live bytes,
+        live buffer count and unknown buffers usage after every allocation
+        and deallocation event.
+
+        Unlike `query_memory_usage`, the series is exact and does not depend
+        on `devmem.summary` events.
+        """
+        return self._db.query_allocator_usage(self._event_timerange)
+
+    def iter_allocator_usage(
+        self, *, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[AllocatorUsage]:
+        """
+        Yields allocator-level memory usage (see `query_allocator_usage`)
+        as NumPy chunks of at most `chunk_size` events.
+        """
+        return self._db.iter_allocator_usage(self._event_timerange, chunk_size)
+
+    def query_memory_usage_downsampled(
+        self, points: int, tag: Optional[str] = None
+    ) -> pd.DataFrame:
+        """
+        Returns pandas DataFrame with memory usage (see `query_memory_usage`)
+        reduced to roughly `points` buckets. Every series is represented by
+        `<name>_min`, `<name>_max` and `<name>_last` columns.
+
+        Precomputed downsampling levels are used when available, so the cost
+        does not depend on the length of the view.
+        """
+        names = ["used", "workspace", "persistent"]
+        df = None
+        if tag is None:
+            df = self._query_series_downsampled(names, points)
+        if df is None:
+            raw = self._db.query_devmem_summary(self.event_timerange, tag)
+            df = self._raw_as_downsampled(raw, names)
+        return df
+
+    def query_allocator_usage_downsampled(self, points: int) -> pd.DataFrame:
+        """
+        Returns pandas DataFrame with allocator live bytes
+        (see `query_allocator_usage`) reduced to roughly `points` buckets.
+        """
+        names = ["live_bytes"]
+        df = self._query_series_downsampled(names, points)
+        if df is None:
+            raw = self.query_allocator_usage().to_dataframe()
+            df = self._raw_as_downsampled(raw, names)
+        return df
+
+    def _select_series_level(self, points: int) -> Optional[int]:
+        selected = None
+        for level in range(model.SERIES_LEVELS_COUNT):
+            width = model.series_level_width(level)
+            if len(self.event_timerange) // width >= points:
+                selected = level
+        return selected
+
+    def _query_series_downsampled(
+        self, names: List[str], points: int
+    ) -> Optional[pd.DataFrame]:
+        level = self._select_series_level(points)
+        if level is None:
+            return None
+
+        dfs = []
+        for name in names:
+            df = self._db.query_series_level(name, self.event_timerange, level)
+            if df is None:
+                return None
+            dfs.append(df.add_prefix(f"{name}_"))
+        return pd.concat(dfs, axis=1)
+
+    def _raw_as_downsampled(self, df: pd.DataFrame, names: List[str]) -> pd.DataFrame:
+        result = pd.DataFrame(index=df.index)
+        for name in names:
+            for suffix in ["min", "max", "last"]:
+                result[f"{name}_{suffix}"] = df[name]
+        return result
+
     def _query_devmem_bufs_full(self) -> pd.DataFrame:
         df = self._db.query_devmem_bufs_full(self._event_timerange)
-        df["addr_hex"] = df["addr"].map(lambda x: f"0x{x:x}")
-        df["size_str"] = df["size"].map(memory_str)
+        with self._db.perf.measure("formatting"):
+            df["addr_hex"] = LazyStrArray.make(df["addr"], "hex")
+            df["size_str"] = LazyStrArray.make(df["size"], "memory")
         return df
 
+    def _iter_devmem_bufs_full(
+        self, *, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[pd.DataFrame]:
+        return self._db.iter_devmem_bufs_full(self._event_timerange, chunk_size)
+
+    def _query_buffers_meta(self, idents: List[int]) -> pd.DataFrame:
+        return self._db.query_buffers_meta(idents)
+
     def _x_query_recipe_launches(self) -> pd.DataFrame:
         return self._db.query_recipe_launches(self._event_timerange)
 
@@ -82,6 +206,74 @@ class ScenarioView:
         df = self._db.query_buffers_allocs(self._event_timerange)
         return df
 
+    def iter_buffers_allocs(
+        self, *, chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yields memory allocations and deallocations (see `query_buffers_allocs`)
+        as DataFrames of at most `chunk_size` rows.
+        """
+        return self._db.iter_buffers_allocs(self._event_timerange, chunk_size)
+
+    def live_state_at(self, event_ident: int) -> pd.DataFrame:
+        """
+        Returns pandas DataFrame with buffers which are live right after
+        the event `event_ident`.
+
+        The allocator state is restored from the nearest checkpoint stored
+        in the database, so only a short tail of events is replayed.
+        """
+        df = self._db.query_live_buffers(event_ident)
+        return df
+
+    def peak_attribution(
+        self, top: int = 20, user_file: Callable[[str], bool] = is_user_file
+    ) -> PeakAttribution:
+        """
+        Returns what is live at the allocator peak of the view and who
+        allocated it: live bytes aggregated by allocation stack, innermost
+        user frame, synapse name and size class, `top` largest groups of each.
+        Frames of files satisfying `user_file` are the user ones.
+
+        The peak is located on precomputed downsampling levels and the live
+        set is restored from the nearest checkpoint, so only short ranges
+        of events are read even on huge traces.
+
+        ```
+        view.peak_attribution(top=10).show()
+        ```
+        """
+        event_ident = self._find_allocator_peak()
+        if event_ident is None:
+            raise RuntimeError("No allocations in the view")
+        live = self.live_state_at(event_ident)
+        idents = live.index.tolist()
+        attribution = self._db.query_buffers_attribution(idents, user_file)
+        buffers = live[["size", "unknown"]].join(attribution)
+        return PeakAttribution.make(event_ident, buffers, top)
+
+    def _find_allocator_peak(self) -> Optional[int]:
+        # the bucket holding the maximum is scanned, unless it reaches outside
+        # the view (edge buckets) and the maximum is not inside
+        df = self.query_allocator_usage_downsampled(PEAK_SEARCH_POINTS)
+        if len(df) == 0:
+            return None
+        maxima = df["live_bytes_max"].to_numpy()
+        starts = df.index.to_numpy()
+        k = int(np.argmax(maxima))
+        end = starts[k + 1] if k + 1 < len(starts) else self.event_timerange.end
+        bucket = self.make_view(EventTimeRange.make(starts[k], end))
+        usage = bucket.query_allocator_usage()
+        if len(usage) > 0 and usage.live_bytes.max() == maxima[k]:
+            return int(usage.event_ident[np.argmax(usage.live_bytes)])
+
+        best_bytes, best_ident = None, None
+        for usage in self.iter_allocator_usage():
+            i = int(np.argmax(usage.live_bytes))
+            if best_bytes is None or usage.live_bytes[i] > best_bytes:
+                best_bytes, best_ident = usage.live_bytes[i], int(usage.event_ident[i])
+        return best_ident
+
     def query_recipe_launches(self) -> pd.DataFrame:
         """
         Returns pandas DataFrame with recipe launches.
@@ -89,6 +281,21 @@ class ScenarioView:
         df = self._db.query_launches(self._event_timerange)
         return df
 
+    def query_recipe_launches_full(self) -> pd.DataFrame:
+        """
+        Returns pandas DataFrame with recipe launches together with their
+        buffers, one row per launch buffer. Everything is loaded with
+        a single query.
+        """
+        df = self._db.query_launches_full(self._event_timerange)
+        return df
+
+    def query_recipe_launches_by_ident(
+        self, launch_idents: List[int]
+    ) -> List[RecipeLaunch]:
+        "Returns list of `RecipeLaunch` for given `launch_idents` using a single query"
+        return self._common_view.query_recipe_launches_by_ident(launch_idents)
+
     def query_recipe_launch_by_launch_ident(self, launch_ident: int):
         "Returns `RecipeLaunch` representation for given `launch_ident`"
         return self._common_view.query_recipe_launch_by_launch_ident(launch_ident)
@@ -109,3 +316,34 @@ class ScenarioView:
             map_basename=map_basename,
         )
         return df
+
+    def query_concurrently(
+        self,
+        *queries: Union[str, Callable[["ScenarioView"], Any]],
+        max_workers: Optional[int] = None,
+    ) -> List[Any]:
+        """
+        Runs several independent queries at once and returns their results
+        in the same order.
+
+        Each query is either a name of `ScenarioView` method taking no
+        arguments (e.g. `"query_memory_usage"`) or a callable which gets
+        this view. The database is opened read-only with a connection per
+        thread, so queries do not serialize on a single connection.
+
+        ```
+        usage, launches = view.query_concurrently(
+            "query_memory_usage", "query_recipe_launches"
+        )
+        ```
+        """
+        calls = []
+        for query in queries:
+            if isinstance(query, str):
+                calls.append(getattr(self, query))
+            else:
+                calls.append(functools.partial(query, self))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(call) for call in calls]
+            return [future.result() for future in futures]
@@ -24,7 +24,7 @@ from . import zombie
 from . import framelog
 
 from .footprint import MemoryFootprint
-from .zigzag import find_hills, find_zigzags
+from .zigzag import find_hills, find_zigzags, iter_hills, iter_zigzags
 from .cudamemviz import dump_cudamemviz
 from .zombie import ZombieAnalysisResult, analyze_zombie
 from .framelog import decode_framelog
@@ -35,6 +35,7 @@ __pdoc__ = {
     "cudamemviz": False,
     "MemoryFootprint": False,
     "find_zigzags": False,
+    "iter_zigzags": False,
 }
 
 __all__ = [
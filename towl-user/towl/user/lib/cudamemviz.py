@@ -15,70 +15,83 @@
 ################################################################################
 
 import towl.user.cudamemviz as cv
-from ..data.scenario_view import ScenarioView
+from ..data.scenario_view import ScenarioView, DEFAULT_CHUNK_SIZE
 import numpy as np
-from typing import Optional
+from typing import Iterator, List, Optional
 
 
-def dump_cudamemviz(view: ScenarioView, snapshot_path: str, html_path: Optional[str]):
+def dump_cudamemviz(
+    view: ScenarioView,
+    snapshot_path: str,
+    html_path: Optional[str],
+    *,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+):
     """
     Converts memory usage information (see `ScenarioView.query_memory_usage`) into
     PyTorch CUDA Memory Visualizer snapshot format and builds HTML page containing
     visualization.
 
-    The `snapshot_path` is path to temporary file where converted data can be stored
+    The `snapshot_path` is path to file where converted data are stored
     and `html_path` is name of output HTML file.
+
+    Buffers are read and written to the snapshot in chunks of `chunk_size` rows.
+    The HTML page is rendered from the view, see `towl.user.cudamemviz.viewer`.
     """
-    snapshot = build_cudamemviz(view)
-    cv.model.dump_snapshot_to_file(snapshot_path, snapshot)
+    with cv.model.SnapshotWriter(snapshot_path) as writer:
+        for traces in iter_cudamemviz_traces(view, chunk_size=chunk_size):
+            writer.write(traces)
     if html_path is not None:
-        cv.extract.to_html(snapshot_path, html_path)
-
-
-def build_cudamemviz(view: ScenarioView):
-    xs = []
-    df = view._query_devmem_bufs_full()
-    b = cv.Builder()
-
-    for i in range(len(df)):
-        import json
-
-        entry = df.iloc[i]
-        meta = json.loads(entry.meta)
-        if meta["unknown"]:
-            ident = entry["ident"]
-            bufname = f"UNK_{ident}"
-        else:
-            ident = entry["ident"]
-            bufname = f"BUF_{ident}"
-
-        def to_int(x):
+        cv.viewer.render_html(view, html_path, chunk_size=chunk_size)
 
-            if x is None or np.isnan(x):
-                return -1
-            return int(x)
 
-        events = (
-            to_int(entry["event_malloc"]),
-            to_int(entry["event_first_launch"]),
-            to_int(entry["event_last_launch"]),
-            to_int(entry["event_free"]),
-        )
-
-        frames = meta["alloc_frames"]
+def build_cudamemviz(view: ScenarioView) -> cv.Snapshot:
+    traces = []
+    for chunk in iter_cudamemviz_traces(view):
+        traces += chunk
+    return cv.Snapshot(segments=[], device_traces=[traces])
 
-        if len(frames) > 0:
-            xs.append(bufname)
 
-        b.record(
-            entry["is_allocation"],
-            entry["addr"],
-            entry["size"],
-            bufname=bufname,
-            events=events,
-            frames=frames,
+def iter_cudamemviz_traces(
+    view: ScenarioView, *, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[List[cv.model.TraceEntry]]:
+    """
+    Yields snapshot traces of buffers allocated and freed in the view,
+    converted from at most `chunk_size` buffer events at a time.
+    """
+    b = cv.Builder()
+    events_columns = [
+        "event_malloc",
+        "event_first_launch",
+        "event_last_launch",
+        "event_free",
+    ]
+
+    for df in view._iter_devmem_bufs_full(chunk_size=chunk_size):
+        events = df[events_columns].astype(np.float64).fillna(-1).astype(np.int64)
+        events = events.to_numpy().tolist()
+        rows = zip(
+            df["is_allocation"].tolist(),
+            df["ident"].tolist(),
+            df["addr"].tolist(),
+            df["size"].tolist(),
+            df["meta"],
+            df["stack_id"].tolist(),
+            events,
         )
-
-    snapshot = b.finish()
-
-    return snapshot
+        for is_allocation, ident, addr, size, meta, stack_id, events in rows:
+            if meta.unknown:
+                bufname = f"UNK_{ident}"
+            else:
+                bufname = f"BUF_{ident}"
+
+            b.record(
+                is_allocation,
+                addr,
+                size,
+                bufname=bufname,
+                events=tuple(events),
+                frames=meta.alloc_frames,
+                stack_id=stack_id,
+            )
+        yield b.take()
@@ -61,17 +61,43 @@ class MemoryFootprint(NamedTuple):
 
     @staticmethod
     def from_view(title: str, view: ScenarioView):
-        usage_df = view.query_memory_usage()
-        max_workspace = usage_df["workspace"].max()
+        """
+        Computes footprint of `view` streaming memory usage chunk by chunk,
+        so the view does not have to fit in memory.
+        """
+        BOTTOM_SKIP = 1000
+        count = 0
+        total = 0
+        max_memory = None
+        bottom_memory = None
+        max_workspace = None
+        for usage_df in view.iter_memory_usage():
+            used = usage_df["used"]
+            total += used.sum()
+            max_memory = _max(max_memory, used.max())
+            max_workspace = _max(max_workspace, usage_df["workspace"].max())
+            tail = used.iloc[max(BOTTOM_SKIP - count, 0) :]
+            if len(tail) > 0:
+                bottom_memory = _min(bottom_memory, tail.min())
+            count += len(usage_df)
+
         return MemoryFootprint(
             title=title,
-            max_memory=usage_df["used"].max(),
-            avg_memory=usage_df["used"].mean(),
-            bottom_memory=usage_df["used"][1000:].min(),
+            max_memory=max_memory,
+            avg_memory=total / count if count > 0 else None,
+            bottom_memory=bottom_memory,
             max_workspace=max_workspace,
         )
 
 
+def _max(a, b):
+    return b if a is None else max(a, b)
+
+
+def _min(a, b):
+    return b if a is None else min(a, b)
+
+
 def global_mem_usage(global_view):
     usage_df = global_view.query_memory_usage()
     max_workspace = usage_df["workspace"].max()
@@ -15,16 +15,14 @@
 ################################################################################
 
 from towl.user.data import Scenario
-import json
 
 
 def decode_framelog(scenario: Scenario, event_index: int):
     df = scenario.make_global_view()._query_python_log_full()
     row = df.loc[event_index]
     content = row["content"]
-    data = json.loads(content)
 
-    for frame in data["stack"]:
-        print("=====>", frame["frame"]["funcname"])
-        for k, v in frame["memory"].items():
+    for frame in content.stack:
+        print("=====>", frame.frame.funcname)
+        for k, v in frame.memory.items():
             print(k, f"BUF_{v}")
@@ -17,83 +17,202 @@
 import numpy as np
 import pandas as pd
 from ..data.timerange import EventTimeRange
-from typing import List, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+# Scans start with small blocks which double in size, so the work done
+# for a segment is proportional to its length, not to the series length.
+MIN_SCAN_BLOCK = 1024
+
+
+def _scan(values: np.ndarray, start: int, stop: int, peak, threshold):
+    """
+    Scans `values[start:stop]` for the first position at least `threshold`
+    below the running maximum, which starts at `peak`.
+
+    Returns `(hill, drop, peak)`: `hill` is the last position of the running
+    maximum before `drop` (None if `peak` was not reached), `drop` is None
+    when there is no such position.
+    """
+    hill = None
+    size = MIN_SCAN_BLOCK
+    while start < stop:
+        end = min(start + size, stop)
+        block = values[start:end]
+        running = np.maximum.accumulate(block)
+        np.maximum(running, peak, out=running)
+        drops = np.flatnonzero(running - block >= threshold)
+        count = len(block) if len(drops) == 0 else drops[0]
+        if count > 0:
+            top = block[:count].max()
+            if top >= peak:
+                # ties move the hill forward
+                hill = start + count - 1 - np.argmax(block[count - 1 :: -1] == top)
+                peak = top
+        if len(drops) > 0:
+            return hill, start + count, peak
+        start = end
+        size *= 2
+    return hill, None, peak
+
+
+class _Trend:
+    """
+    Current segment of the zigzag, values are kept multiplied by the
+    direction so the hill is always the running maximum.
+    """
+
+    def __init__(self, direction: int, begin, value, threshold):
+        self.direction = direction
+        self.begin = begin
+        self.peak = direction * value
+        self.hill = begin
+        self.hill_prev = None
+        self.threshold = threshold
+        self.segments: List[Tuple[int, EventTimeRange]] = []
+
+    def scan(self, labels, values, negated, start: int, stop: int, prev_label):
+        def label_before(i):
+            return labels[i - 1] if i > 0 else prev_label
+
+        while start < stop:
+            w = values if self.direction == 1 else negated
+            hill, drop, self.peak = _scan(w, start, stop, self.peak, self.threshold)
+            if hill is not None:
+                self.hill, self.hill_prev = labels[hill], label_before(hill)
+            if drop is None:
+                break
+            tr = EventTimeRange(int(self.begin), int(self.hill_prev) + 1)
+            self.segments.append((self.direction, tr))
+            # Everything between the hill and the drop lies within threshold
+            # below the hill, so the drop is the first hill of the new segment.
+            self.begin = self.hill
+            self.direction = -self.direction
+            self.peak = -w[drop]
+            self.hill, self.hill_prev = labels[drop], label_before(drop)
+            start = drop + 1
+
+    def pop_segments(self) -> List[Tuple[int, EventTimeRange]]:
+        segments, self.segments = self.segments, []
+        return segments
+
+
+class ZigZagStream:
+    """
+    Finds zigzags (see `find_zigzags`) of a series pushed chunk by chunk.
+    Segments are returned as soon as they are complete.
+
+    Example:
+    ```
+        zz = ZigZagStream(threshold)
+        for df in view.iter_memory_usage():
+            segments = zz.push(df["used"])
+        segments = zz.finish()
+    ```
+    """
+
+    def __init__(self, threshold: int):
+        self._threshold = threshold
+        self._first: Optional[Tuple[int, object]] = None
+        # Until the first move by threshold both directions are followed.
+        self._candidates: List[_Trend] = []
+        self._trend: Optional[_Trend] = None
+        self._last_label = None
+
+    def push(self, series: pd.Series) -> List[Tuple[int, EventTimeRange]]:
+        n = len(series)
+        if n == 0:
+            return []
+        labels = series.index.to_numpy()
+        values = series.to_numpy()
+        dtype = np.int64 if np.issubdtype(values.dtype, np.integer) else np.float64
+        values = values.astype(dtype, copy=False)
+        negated = -values
+
+        start = 0
+        if self._first is None:
+            self._first = (labels[0], values[0])
+            self._candidates = [
+                _Trend(d, labels[0], values[0], self._threshold) for d in [1, -1]
+            ]
+            start = 1
+
+        prev_label = self._last_label
+        self._last_label = labels[-1]
+        if self._trend is None:
+            moved = np.flatnonzero(
+                np.abs(values[start:] - self._first[1]) >= self._threshold
+            )
+            if len(moved) == 0:
+                for trend in self._candidates:
+                    trend.scan(labels, values, negated, start, n, prev_label)
+                return []
+
+            stop = start + moved[0]
+            direction = 1 if values[stop] > self._first[1] else -1
+            self._trend = self._candidates[0 if direction == 1 else 1]
+            self._candidates = []
+            self._trend.scan(labels, values, negated, start, stop, prev_label)
+            start = stop
+
+        self._trend.scan(labels, values, negated, start, n, prev_label)
+        return self._trend.pop_segments()
+
+    def finish(self) -> List[Tuple[int, EventTimeRange]]:
+        if self._first is None:
+            return []
+        end = int(self._last_label) + 1
+        if self._trend is None:
+            return [(0, EventTimeRange(int(self._first[0]), end))]
+        segments = self._trend.pop_segments()
+        segments.append(
+            (self._trend.direction, EventTimeRange(int(self._trend.begin), end))
+        )
+        return segments
 
 
 class ZigZagImpl:
     def __init__(self, series: pd.Series, threshold: int):
         self._series = series
-        self._n = len(series)
         self._threshold = threshold
-        self._result = []
-
-    def _zigzag_up(self, begin):
-        # print('finding next up', begin, self._series.iloc[begin])
-        hill = begin
-        for i in range(begin + 1, self._n):
-            value_i = self._series.iloc[i]
-            value_hill = self._series.iloc[hill]
-            if value_i >= value_hill:
-                hill = i
-            else:
-                diff = value_hill - value_i
-                if diff >= self._threshold:
-                    self._emit(1, begin, hill - 1)
-                    return self._zigzag_down, hill
-        self._emit(1, begin, self._n - 1)
-        return None, self._n
-
-    def _zigzag_down(self, begin):
-        # print('finding next down', begin, self._series.iloc[begin])
-        hill = begin
-        for i in range(begin + 1, self._n):
-            value_i = self._series.iloc[i]
-            value_hill = self._series.iloc[hill]
-            if value_i <= value_hill:
-                hill = i
-            else:
-                diff = value_i - value_hill
-                if diff >= self._threshold:
-                    self._emit(-1, begin, hill - 1)
-                    return self._zigzag_up, hill
-        self._emit(-1, begin, self._n - 1)
-        return None, self._n
-
-    def _check_direction(self):
-        value = self._series.iloc[0]
-        for i in range(1, self._n):
-            diff = self._series.iloc[i] - value
-            if np.abs(diff) >= self._threshold:
-                if diff > 0:
-                    return self._zigzag_up
-                else:
-                    return self._zigzag_down
-        return None
-
-    def _emit(self, d, begin, end):
-        tr = EventTimeRange(
-            self._series.index[begin],
-            self._series.index[end] + 1,
-        )
-        self._result.append((d, tr))
 
     def __call__(self):
-        state = self._check_direction()
-        if state is None:
-            self._emit(0, self._n)
-            return self._result
-
-        begin = 0
-        while begin < self._n:
-            state, begin = state(begin)
-
-        return self._result
+        zz = ZigZagStream(self._threshold)
+        return zz.push(self._series) + zz.finish()
 
 
 def find_zigzags(psr: pd.Series, threshold: int) -> List[Tuple[int, EventTimeRange]]:
     return ZigZagImpl(psr, threshold)()
 
 
+def iter_zigzags(
+    chunks: Iterable[pd.Series], threshold: int
+) -> Iterator[Tuple[int, EventTimeRange]]:
+    """
+    Streaming variant of `find_zigzags`: yields segments of series given
+    as consecutive chunks.
+    """
+    zz = ZigZagStream(threshold)
+    for chunk in chunks:
+        yield from zz.push(chunk)
+    yield from zz.finish()
+
+
+def _pair_hills(
+    zigzags: Iterable[Tuple[int, EventTimeRange]]
+) -> Iterator[EventTimeRange]:
+    it = iter(zigzags)
+    for direction, zig in it:
+        if direction != 1:
+            continue
+        zag = next(it, None)
+        if zag is None:
+            break
+        direction, zag = zag
+        if direction != -1:
+            continue
+        yield zig + zag
+
+
 def find_hills(psr: pd.Series, threshold: int = 10 * 1024**3) -> List[EventTimeRange]:
     """
     Returns list of event time ranges denoting discovered hills on given time serie `psr`.
@@ -106,21 +225,20 @@ def find_hills(psr: pd.Series, threshold: int = 10 * 1024**3) -> List[EventTimeR
         find_hills(df_memory_usage['used'])
     ```
     """
-    zz = find_zigzags(psr, threshold)
-    if len(zz) < 2:
-        return []
+    return list(_pair_hills(find_zigzags(psr, threshold)))
 
-    result = []
-    while len(zz) > 0:
-        direction, zig = zz.pop(0)
-        if direction != 1:
-            continue
-        if len(zz) == 0:
-            break
-        direction, zag = zz.pop(0)
-        if direction != -1:
-            continue
 
-        result.append(zig + zag)
+def iter_hills(
+    chunks: Iterable[pd.Series], threshold: int = 10 * 1024**3
+) -> Iterator[EventTimeRange]:
+    """
+    Streaming variant of `find_hills`, the series is given as consecutive
+    chunks, so it never has to be in memory as a whole.
 
-    return result
+    Example:
+    ```
+        chunks = (df['used'] for df in view.iter_memory_usage())
+        hills = list(iter_hills(chunks))
+    ```
+    """
+    return _pair_hills(iter_zigzags(chunks, threshold))
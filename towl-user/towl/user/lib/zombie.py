@@ -63,12 +63,19 @@ def analyze_zombie(
     min_size: int,
     min_zombie: int,
 ) -> ZombieAnalysisResult:
-    df = view.query_buffers_allocs()
-    df = df[df["is_allocation"] == 1]
-    df = df[df["size"] >= min_size]
-    df["zombie"] = df["event_free"] - df["event_last_launch"]
-    df = df[df["zombie"] >= min_zombie]
-    df["zombie%"] = df["zombie"] / (df["event_free"] - df["event_malloc"])
+    def select(df: pd.DataFrame) -> pd.DataFrame:
+        df = df[df["is_allocation"] == 1]
+        df = df[df["size"] >= min_size]
+        df["zombie"] = df["event_free"] - df["event_last_launch"]
+        df = df[df["zombie"] >= min_zombie]
+        df["zombie%"] = df["zombie"] / (df["event_free"] - df["event_malloc"])
+        return df
+
+    # Buffers are filtered chunk by chunk, only the zombies are kept in memory.
+    dfs = [select(df) for df in view.iter_buffers_allocs()]
+    if len(dfs) == 0:
+        dfs = [select(view.query_buffers_allocs())]
+    df = pd.concat(dfs)
 
     result = ZombieAnalysisResult(
         df=df,
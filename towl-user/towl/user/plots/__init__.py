@@ -16,7 +16,7 @@
 
 from . import base
 from .base import MatplotLib, MatplotLibNested
-from .base import plot_memory_usage, plot_shadow, plot_vlines
+from .base import plot_memory_usage, plot_allocator_usage, plot_shadow, plot_vlines
 
 __pdoc__ = {
     "MatplotLib": False,
@@ -29,6 +29,7 @@ __all__ = [
     "MatplotLib",
     "MatplotLibNested",
     "plot_memory_usage",
+    "plot_allocator_usage",
     "plot_shadow",
     "plot_vlines",
 ]
@@ -128,9 +128,14 @@ def _fill_memory_usage_colors(d):
     return r
 
 
+def _figure_pixel_width() -> int:
+    fig = plt.gcf()
+    return max(int(fig.get_size_inches()[0] * fig.dpi), 1)
+
+
 def select_ylim(scenario_view: ScenarioView):
-    df = scenario_view.query_memory_usage()
-    x = df["used"].max() / 1024**3
+    df = scenario_view.query_memory_usage_downsampled(_figure_pixel_width())
+    x = df["used_max"].max() / 1024**3
 
     if x < 32:
         return (0, 32)
@@ -141,6 +146,24 @@ def select_ylim(scenario_view: ScenarioView):
     return (0, x + 1)
 
 
+def _plot_downsampled(df: pd.DataFrame, name: str, *, label: str, color: str):
+    # min/max envelope keeps spikes visible, `last` gives the line itself
+    plt.fill_between(
+        df.index,
+        df[f"{name}_min"] / 1024**3,
+        df[f"{name}_max"] / 1024**3,
+        color=color,
+        alpha=0.3,
+        linewidth=0,
+    )
+    plt.plot(
+        df.index,
+        df[f"{name}_last"] / 1024**3,
+        label=label,
+        color=color,
+    )
+
+
 def plot_memory_usage(
     scenario_view: ScenarioView,
     *,
@@ -157,6 +180,9 @@ def plot_memory_usage(
     * `persistent` - controls if persistent memory should be drawn
     * `workspace` - controls if workspace memory should be drawn
     * `used` - controls if used memory should be drawn
+
+    Long views are drawn from precomputed min/max downsampling levels matching
+    the figure width, so the cost does not grow with the number of events.
     """
     title = f"Memory usage {scenario_view.event_timerange}"
     ylim = select_ylim(scenario_view)
@@ -172,31 +198,61 @@ def plot_memory_usage(
             legend_prefix = ""
         colors = _fill_memory_usage_colors(colors)
 
-        df = scenario_view.query_memory_usage(tag=tag)
+        df = scenario_view.query_memory_usage_downsampled(
+            _figure_pixel_width(), tag=tag
+        )
         if persistent:
-            plt.plot(
-                df.index,
-                df["persistent"] / 1024**3,
+            _plot_downsampled(
+                df,
+                "persistent",
                 label=f"{legend_prefix} persistent",
                 color=colors["persistent"],
             )
         if workspace:
-            plt.plot(
-                df.index,
-                df["workspace"] / 1024**3,
+            _plot_downsampled(
+                df,
+                "workspace",
                 label=f"{legend_prefix} workspace",
                 color=colors["workspace"],
             )
         if used:
-            plt.plot(
-                df.index,
-                df["used"] / 1024**3,
+            _plot_downsampled(
+                df,
+                "used",
                 label=f"{legend_prefix} used",
                 color=colors["used"],
             )
         plt.legend()
 
 
+def plot_allocator_usage(
+    scenario_view: ScenarioView,
+    *,
+    color="black",
+    legend_prefix=None,
+):
+    """
+    Plots live bytes reported by allocations and deallocations
+    (see `ScenarioView.query_allocator_usage`) from given `scenario_view`.
+    """
+    title = f"Allocator usage {scenario_view.event_timerange}"
+    with MatplotLibNested(
+        title=title,
+        xlabel="Events",
+        ylabel="Memory (GiB)",
+    ):
+        if legend_prefix is None:
+            legend_prefix = ""
+        df = scenario_view.query_allocator_usage_downsampled(_figure_pixel_width())
+        _plot_downsampled(
+            df,
+            "live_bytes",
+            label=f"{legend_prefix} live bytes",
+            color=color,
+        )
+        plt.legend()
+
+
 def plot_vlines(timerange: EventTimeRange):
     plt.axvline(timerange.begin)
     plt.axvline(timerange.end)
@@ -16,4 +16,5 @@
 
 from . import file
 from . import strings
+from . import lazy_str
 from .strings import memory_str
@@ -0,0 +1,317 @@
+################################################################################
+# Copyright 2024 Intel Corporation
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+################################################################################
+
+"""
+Human-readable string columns formatted on access.
+
+A `LazyStrArray` keeps the underlying numbers and formats an element only
+when it is read, so DataFrames pay for formatting just the displayed rows.
+"""
+
+from pandas.api.extensions import (
+    ExtensionArray,
+    ExtensionDtype,
+    register_extension_dtype,
+    take,
+)
+from pandas.api.indexers import check_array_indexer
+from .strings import memory_str, to_hex
+from typing import Callable, Dict, Optional, Tuple
+import numpy as np
+import operator
+import pandas as pd
+
+
+def bufname(x: int) -> str:
+    return f"BUF_{x}"
+
+
+FORMATTERS: Dict[str, Callable[[int], str]] = {
+    "memory": memory_str,
+    "hex": to_hex,
+    "bufname": bufname,
+}
+
+
+@register_extension_dtype
+class LazyStrDtype(ExtensionDtype):
+    "Strings formatted from integers with one of `FORMATTERS`"
+
+    type = str
+    kind = "O"
+    na_value = np.nan
+    _metadata = ("formatter",)
+
+    def __init__(self, formatter: str = "memory"):
+        if formatter not in FORMATTERS:
+            raise ValueError(f"Unknown formatter: {formatter}")
+        self.formatter = formatter
+
+    @property
+    def name(self) -> str:
+        return f"lazystr[{self.formatter}]"
+
+    @classmethod
+    def construct_from_string(cls, string: str):
+        if not isinstance(string, str):
+            raise TypeError(f"Expects a string, got {type(string)}")
+        if string.startswith("lazystr[") and string.endswith("]"):
+            return cls(string[len("lazystr[") : -1])
+        raise TypeError(f"Cannot construct a '{cls.__name__}' from '{string}'")
+
+    @classmethod
+    def construct_array_type(cls):
+        return LazyStrArray
+
+
+class LazyStrArray(ExtensionArray):
+    """
+    Strings formatted from integers on access. They behave like an object
+    column of the formatted strings: comparisons, sorting and grouping use
+    the strings. Once any other value than lazy strings of the same dtype or
+    a missing one is set, the strings are kept as they are (`numbers` are
+    no longer meaningful then).
+    """
+
+    def __init__(self, values, dtype: LazyStrDtype, mask=None, strings=None):
+        self._values = np.asarray(values, dtype=np.int64)
+        if mask is None:
+            mask = np.zeros(len(self._values), dtype=bool)
+        self._mask = np.asarray(mask, dtype=bool)
+        self._dtype = dtype
+        self._format = FORMATTERS[dtype.formatter]
+        # formatted strings, only after a value other than a number is set
+        self._strings: Optional[np.ndarray] = strings
+
+    @staticmethod
+    def make(values, formatter: str) -> "LazyStrArray":
+        "Lazy strings of integer `values` (array or Series)"
+        # copied, setting values must not change the source column
+        return LazyStrArray(np.array(values, dtype=np.int64), LazyStrDtype(formatter))
+
+    @classmethod
+    def _from_strings(cls, strings, dtype: LazyStrDtype) -> "LazyStrArray":
+        strings = np.asarray(strings, dtype=object)
+        values = np.zeros(len(strings), dtype=np.int64)
+        return cls(values, dtype, pd.isna(strings), strings)
+
+    @classmethod
+    def _from_sequence(cls, scalars, *, dtype=None, copy=False):
+        if isinstance(scalars, LazyStrArray):
+            return scalars.copy() if copy else scalars
+        if dtype is None:
+            raise TypeError("LazyStrArray needs a formatter")
+        if isinstance(dtype, str):
+            dtype = LazyStrDtype.construct_from_string(dtype)
+        scalars = pd.array(scalars, dtype="Int64")
+        return cls(scalars.to_numpy(na_value=0), dtype, scalars.isna())
+
+    @classmethod
+    def _from_factorized(cls, values, original):
+        return cls._from_strings(values, original.dtype)
+
+    @property
+    def dtype(self) -> LazyStrDtype:
+        return self._dtype
+
+    @property
+    def numbers(self) -> np.ndarray:
+        "Underlying integers"
+        return self._values
+
+    @property
+    def nbytes(self) -> int:
+        nbytes = self._values.nbytes + self._mask.nbytes
+        if self._strings is not None:
+            nbytes += self._strings.nbytes
+        return nbytes
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            if self._strings is not None:
+                return self._strings[item]
+            if self._mask[item]:
+                return self._dtype.na_value
+            return self._format(self._values[item])
+        item = check_array_indexer(self, item)
+        strings = None if self._strings is None else self._strings[item]
+        return LazyStrArray(self._values[item], self._dtype, self._mask[item], strings)
+
+    def __setitem__(self, key, value):
+        key = check_array_indexer(self, key)
+        if self._strings is None:
+            if isinstance(value, LazyStrArray) and value._strings is None:
+                if value.dtype == self._dtype:
+                    self._values[key] = value._values
+                    self._mask[key] = value._mask
+                    return
+            elif pd.api.types.is_scalar(value) and pd.isna(value):
+                self._mask[key] = True
+                return
+            # other values are kept as they are, like in an object column
+            self._strings = np.asarray(self)
+        if pd.api.types.is_list_like(value):
+            value = np.asarray(value, dtype=object)
+        self._strings[key] = value
+        self._mask = pd.isna(self._strings)
+
+    def __array__(self, dtype=None, copy=None):
+        if self._strings is not None:
+            result = self._strings.copy()
+        else:
+            result = np.empty(len(self), dtype=object)
+            result[:] = [
+                self._dtype.na_value if m else self._format(x)
+                for x, m in zip(self._values.tolist(), self._mask.tolist())
+            ]
+        return result if dtype is None else result.astype(dtype)
+
+    def __getattr__(self, name):
+        # `Series.str` methods work on the formatted strings
+        if name.startswith("_str_"):
+            return getattr(pd.array(np.asarray(self), dtype=object), name)
+        raise AttributeError(
+            f"'{type(self).__name__}' object has no attribute '{name}'"
+        )
+
+    def _cmp_method(self, other, op):
+        if isinstance(other, (pd.Series, pd.Index, pd.DataFrame)):
+            return NotImplemented
+        if isinstance(other, LazyStrArray):
+            other = np.asarray(other)
+        result = op(pd.array(np.asarray(self), dtype=object), other)
+        return result.to_numpy(dtype=bool)
+
+    def _arith_method(self, other, op):
+        if isinstance(other, (pd.Series, pd.Index, pd.DataFrame)):
+            return NotImplemented
+        if isinstance(other, LazyStrArray):
+            other = np.asarray(other)
+        return op(pd.array(np.asarray(self), dtype=object), other).to_numpy()
+
+    def __eq__(self, other):
+        return self._cmp_method(other, operator.eq)
+
+    def __ne__(self, other):
+        return self._cmp_method(other, operator.ne)
+
+    def __lt__(self, other):
+        return self._cmp_method(other, operator.lt)
+
+    def __le__(self, other):
+        return self._cmp_method(other, operator.le)
+
+    def __gt__(self, other):
+        return self._cmp_method(other, operator.gt)
+
+    def __ge__(self, other):
+        return self._cmp_method(other, operator.ge)
+
+    def __add__(self, other):
+        return self._arith_method(other, operator.add)
+
+    def __radd__(self, other):
+        return self._arith_method(other, lambda x, y: y + x)
+
+    def __mul__(self, other):
+        return self._arith_method(other, operator.mul)
+
+    def __rmul__(self, other):
+        return self._arith_method(other, lambda x, y: y * x)
+
+    def isna(self) -> np.ndarray:
+        return self._mask.copy()
+
+    def take(self, indices, *, allow_fill=False, fill_value=None):
+        values = take(self._values, indices, allow_fill=allow_fill, fill_value=0)
+        mask = take(self._mask, indices, allow_fill=allow_fill, fill_value=True)
+        strings = None
+        if self._strings is not None:
+            na_value = self._dtype.na_value
+            strings = take(
+                self._strings, indices, allow_fill=allow_fill, fill_value=na_value
+            )
+        return LazyStrArray(values, self._dtype, mask, strings)
+
+    def copy(self):
+        strings = None if self._strings is None else self._strings.copy()
+        return LazyStrArray(
+            self._values.copy(), self._dtype, self._mask.copy(), strings
+        )
+
+    @classmethod
+    def _concat_same_type(cls, to_concat):
+        values = np.concatenate([x._values for x in to_concat])
+        mask = np.concatenate([x._mask for x in to_concat])
+        strings = None
+        if any(x._strings is not None for x in to_concat):
+            strings = np.concatenate([np.asarray(x) for x in to_concat])
+        return cls(values, to_concat[0].dtype, mask, strings)
+
+    def _factorize_strings(self) -> Tuple[np.ndarray, np.ndarray]:
+        # codes (-1 for missing) of distinct formatted strings,
+        # every distinct number is formatted once
+        if self._strings is not None:
+            return pd.factorize(self._strings)
+        codes = np.full(len(self), -1, dtype=np.intp)
+        valid = ~self._mask
+        number_codes, numbers = pd.factorize(self._values[valid])
+        formatted = np.empty(len(numbers), dtype=object)
+        formatted[:] = [self._format(x) for x in numbers.tolist()]
+        string_codes, uniques = pd.factorize(formatted)
+        codes[valid] = string_codes[number_codes]
+        return codes, uniques
+
+    def unique(self) -> "LazyStrArray":
+        return self.factorize(use_na_sentinel=False)[1]
+
+    def value_counts(self, dropna: bool = True) -> pd.Series:
+        return pd.Series(np.asarray(self)).value_counts(dropna=dropna)
+
+    def factorize(self, use_na_sentinel: bool = True):
+        codes, uniques = self._factorize_strings()
+        if not use_na_sentinel and self._mask.any():
+            codes = np.where(codes == -1, len(uniques), codes)
+            uniques = np.append(uniques, self._dtype.na_value)
+        return codes, LazyStrArray._from_strings(uniques, self._dtype)
+
+    def _values_for_factorize(self):
+        codes, uniques = self._factorize_strings()
+        values = np.append(uniques, self._dtype.na_value)[codes]
+        return values, self._dtype.na_value
+
+    def _values_for_argsort(self) -> np.ndarray:
+        # ranks of the formatted strings, missing values are masked by pandas
+        codes, uniques = self._factorize_strings()
+        ranks = np.empty(len(uniques), dtype=np.int64)
+        ranks[np.argsort(uniques, kind="stable")] = np.arange(len(uniques))
+        return np.append(ranks, 0)[codes]
+
+    def _formatter(self, boxed: bool = False):
+        return str
+
+    def astype(self, dtype, copy=True):
+        dtype = pd.api.types.pandas_dtype(dtype)
+        if isinstance(dtype, LazyStrDtype):
+            if dtype == self._dtype:
+                return self.copy() if copy else self
+            return LazyStrArray(self._values, dtype, self._mask, self._strings)
+        if dtype == np.dtype(object):
+            return np.asarray(self)
+        return super().astype(dtype, copy=copy)